@@ -1,113 +1,303 @@
 # Entry point to the application
+#
+# `create_app` builds a configured app. Importing the package (or the models,
+# services, migrations) builds nothing, `app` is the default app, created on
+# first access (`from app import app`).
 import json
 import datetime
 import logging
+import threading
+from typing import Optional
 
-from flask import Flask, jsonify, render_template
+from flask import current_app, Flask, jsonify, render_template
 
 from flask_sqlalchemy import SQLAlchemy
-from flasgger import Swagger
-from flask_jwt_extended import JWTManager
 from flask_socketio import SocketIO
 
 from werkzeug.exceptions import HTTPException
-    
+from werkzeug.local import LocalProxy
 
-# Create Flask app
-app = Flask(__name__)
 
-# Setup the socket connection
-socketio = SocketIO(app)
+# Setup the database, bound to the app by `create_app`
+db = SQLAlchemy()
+
+# socket server of the current app, each app created gets its own
+socketio: SocketIO = LocalProxy(lambda: current_app.extensions['socketio'])
 
 # Configure logging
 logger = logging.getLogger(name='TaskManagement')
 logging.basicConfig(level=logging.ERROR)
 
-# Configure SQLAlchemy to use SQLite database
-app.config['SQLALCHEMY_DATABASE_URI'] = 'sqlite:///task_management.db'
-app.config['SQLALCHEMY_TRACK_MODIFICATIONS'] = False
-db = SQLAlchemy(app)
-
-# Import models so that it can be captured by the create_db call
-from .models import Task
-from .models import User
-
-# Configure Swagger for API documentation
-template = {
-    'swagger': '2.0',
-    'info': {
-        'title': 'Task Management API',
-        'description': 'Task Management API docs.',
-        'version': '1.0'
-    }
-}
-swagger = Swagger(app, template=template)
-
-# Setup the JWT for auth
-app.config['JWT_SECRET_KEY'] = 'task_management_secret_key'
-app.config['JWT_ACCESS_TOKEN_EXPIRES'] = datetime.timedelta(hours=2)
-app.config['JWT_QUERY_STRING_NAME'] = 'token'
-jwt = JWTManager(app)
-
-# route blueprints
-from . import auth_controllers as auth
-from . import task_controllers as tasks
-
-# Configure blueprint controllers for API routes
-app.register_blueprint(auth.bp)
-app.register_blueprint(tasks.bp)
-
-# Import socket handlers so it can be captured by the socketio call
-from . import socket_handlers
-
-
-# Additional routes
-# Define a test route for streaming the task data
-@app.get('/tasks')
-def tasks_index():
-    return render_template('index.html')
-
-# Define a test route for health status
-@app.get('/health')
-def health():
-    """
-    Health status
-    ---
-    tags:
-        -   health
-    responses:
-        200:
-            description: OK Status
-            examples:
-                application/json: {"message": "OK"}
-        400:
-            description: Server error
-            examples:
-                application/json: {"message": "Server error"}
-    """
-
-    return jsonify({'message': 'OK'})
-
-
-# Generic error handling
-@app.errorhandler(Exception)
-def handle_exceptions(e: Exception):
-    logger.error(e)
-
-    # Return server error for all other errors
-    return jsonify({'status': 'Server error'}), 500
-
-
-# Http error handling
-@app.errorhandler(HTTPException)
-def handle_http_exceptions(e: HTTPException):
-    # Process HTTP errors into JSON response
-    response = e.get_response()
-    response.data = json.dumps({
-        'code': e.code,
-        'name': e.name,
-        'description': e.description,
-    })
-    response.content_type = 'application/json'
-
-    return response
+_lock = threading.Lock()
+
+
+def create_app(config: Optional[dict] = None) -> Flask:
+    # Create Flask app
+    app = Flask(__name__)
+
+    # Configure SQLAlchemy to use SQLite database
+    app.config['SQLALCHEMY_DATABASE_URI'] = 'sqlite:///task_management.db'
+    app.config['SQLALCHEMY_TRACK_MODIFICATIONS'] = False
+
+    # Setup the JWT for auth
+    app.config['JWT_SECRET_KEY'] = 'task_management_secret_key'
+    app.config['JWT_ACCESS_TOKEN_EXPIRES'] = datetime.timedelta(hours=2)
+    app.config['JWT_QUERY_STRING_NAME'] = 'token'
+
+    # Allow overriding any setting with `FLASK_` prefixed environment variables,
+    # e.g. FLASK_SQLALCHEMY_DATABASE_URI=sqlite:////tmp/tasks.db, and with `config`
+    app.config.from_prefixed_env()
+    app.config.update(config or {})
+
+    # Setup the SQLite storage profile (WAL, pragmas, connection pool)
+    from . import storage
+    storage.configure(app)
+
+    db.init_app(app)
+    storage.init_app(app, db)
+
+    # Setup the opt-in request/SQL/socket instrumentation (`METRICS_ENABLED`)
+    from . import metrics
+    metrics.init_app(app, db)
+
+    # Setup the JSON serialization (orjson when installed)
+    from . import json_provider
+    json_provider.init_app(app)
+
+    # Setup the socket server, fanning out through a message queue when configured.
+    # The async mode is explicit instead of whichever of eventlet/gevent happens to
+    # be installed, the production server (gunicorn.conf.py) sets it for its workers
+    app.config.setdefault('SOCKETIO_ASYNC_MODE', 'threading')
+    app.config.setdefault('SOCKETIO_PING_INTERVAL', 25)
+    app.config.setdefault('SOCKETIO_PING_TIMEOUT', 20)
+    app.config.setdefault('SOCKETIO_TRANSPORTS', None)  # polling and websocket
+
+    from . import broker, socket_handlers
+    server = SocketIO()
+    socket_handlers.init_app(server)
+    server.init_app(
+        app,
+        async_mode=app.config['SOCKETIO_ASYNC_MODE'],
+        ping_interval=app.config['SOCKETIO_PING_INTERVAL'],
+        ping_timeout=app.config['SOCKETIO_PING_TIMEOUT'],
+        transports=app.config['SOCKETIO_TRANSPORTS'],
+        **broker.socketio_options(app),
+        **json_provider.socketio_options(app),
+    )
+
+    # Setup the registry of connected socket sessions
+    from . import presence
+    presence.init_app(app)
+
+    # Configure Swagger for API documentation, built on the first `/apidocs` hit
+    from . import apidocs
+    apidocs.init_app(app)
+
+    # Setup the background dispatcher for task socket events
+    from . import socket_events
+    socket_events.init_app(app)
+
+    # Setup the writer batching the task writes into group commits (`GROUP_COMMIT_ENABLED`)
+    from . import group_commit
+    group_commit.init_app(app, db)
+
+    # Setup the routing of reads to a read-only engine (`READ_REPLICA_ENABLED`)
+    from . import replica
+    replica.init_app(app, db)
+
+    # Setup the password hashing workers
+    from . import hashing
+    hashing.init_app(app)
+
+    # Setup the caches for verified tokens and user lookups
+    from . import cache
+    cache.init_app(app)
+    cache.CachingJWTManager(app)
+
+    # Setup the rate limits of the login, register and task creation routes (`RATELIMIT_ENABLED`)
+    from . import ratelimit
+    ratelimit.init_app(app)
+
+    # route blueprints
+    from . import auth_controllers as auth
+    from . import task_controllers as tasks
+
+    # Configure blueprint controllers for API routes
+    app.register_blueprint(auth.bp)
+    app.register_blueprint(tasks.bp)
+
+    _register_routes(app)
+
+    return app
+
+
+def _register_routes(app: Flask):
+    from . import cache, group_commit, presence, ratelimit, replica, socket_events
+
+    # Define a test route for streaming the task data
+    @app.get('/tasks')
+    def tasks_index():
+        return render_template('index.html')
+
+    # Define a test route for health status
+    @app.get('/health')
+    def health():
+        """
+        Health status
+        ---
+        tags:
+            -   health
+        responses:
+            200:
+                description: OK Status
+                examples:
+                    application/json: {"message": "OK"}
+            400:
+                description: Server error
+                examples:
+                    application/json: {"message": "Server error"}
+        """
+
+        return jsonify({'message': 'OK'})
+
+    # Define a route exposing the cache counters, used for sizing the caches
+    @app.get('/health/cache')
+    def health_cache():
+        """
+        Cache statistics
+        ---
+        tags:
+            -   health
+        responses:
+            200:
+                description: Hit/miss counters of the in-process caches
+                examples:
+                    application/json: {"token_cache": {"size": 1, "maxsize": 4096, "hits": 10, "misses": 1, "evictions": 0}}
+        """
+
+        return jsonify({
+            'token_cache': cache.token_cache.stats(),
+            'user_cache': cache.user_cache.stats(),
+        })
+
+    # Define a route exposing the socket event dispatcher counters
+    @app.get('/health/events')
+    def health_events():
+        """
+        Socket event dispatcher statistics
+        ---
+        tags:
+            -   health
+        responses:
+            200:
+                description: Queue depth, coalesce/drop counters and failed emits of the dispatcher
+                examples:
+                    application/json: {"queue_depth": 0, "enqueued": 12, "coalesced": 4, "dropped": 0, "frames": 3, "failed": 0}
+        """
+
+        return jsonify(socket_events.dispatcher.stats())
+
+    # Define a route exposing the group commit batch sizes and queue waits
+    @app.get('/health/group-commit')
+    def health_group_commit():
+        """
+        Group commit statistics
+        ---
+        tags:
+            -   health
+        responses:
+            200:
+                description: Writes per commit, time spent waiting for the writer and writes that timed out
+                examples:
+                    application/json: {"enabled": true, "queue_depth": 0, "batches": 40, "operations": 500, "failed": 0, "retried": 0, "timeouts": 0, "mean_batch_size": 12.5, "largest_batch": 50, "mean_wait_ms": 1.8, "max_wait_ms": 6.2}
+        """
+
+        return jsonify(group_commit.writer.stats())
+
+    # Define a route exposing where the reads were routed
+    @app.get('/health/replica')
+    def health_replica():
+        """
+        Read routing statistics
+        ---
+        tags:
+            -   health
+        responses:
+            200:
+                description: Reads served by the replica and by the primary, and users reading their own writes
+                examples:
+                    application/json: {"enabled": true, "replica_reads": 120, "primary_reads": 8, "recent_writers": 2}
+        """
+
+        return jsonify(replica.router.stats())
+
+    # Define a route exposing the rate limit buckets and rejected requests
+    @app.get('/health/ratelimit')
+    def health_ratelimit():
+        """
+        Rate limit statistics
+        ---
+        tags:
+            -   health
+        responses:
+            200:
+                description: Buckets held by the limiter storage, and requests allowed and rejected with 429
+                examples:
+                    application/json: {"enabled": true, "storage": "memory", "buckets": 12, "evictions": 40, "allowed": 900, "limited": 15}
+        """
+
+        return jsonify(ratelimit.limiter.stats())
+
+    # Define a route exposing the number of connected users and sessions
+    @app.get('/health/presence')
+    def health_presence():
+        """
+        Presence statistics
+        ---
+        tags:
+            -   health
+        responses:
+            200:
+                description: Users with at least one connected socket session, and sessions
+                examples:
+                    application/json: {"online_users": 2, "sessions": 5}
+        """
+
+        return jsonify({
+            'online_users': presence.registry.online_count(),
+            'sessions': presence.registry.session_count(),
+        })
+
+    # Generic error handling
+    @app.errorhandler(Exception)
+    def handle_exceptions(e: Exception):
+        logger.error(e)
+
+        # Return server error for all other errors
+        return jsonify({'status': 'Server error'}), 500
+
+    # Http error handling
+    @app.errorhandler(HTTPException)
+    def handle_http_exceptions(e: HTTPException):
+        # Process HTTP errors into JSON response
+        response = e.get_response()
+        response.data = json.dumps({
+            'code': e.code,
+            'name': e.name,
+            'description': e.description,
+        })
+        response.content_type = 'application/json'
+
+        return response
+
+
+def __getattr__(name: str):
+    # `app`: the default app, created once on first access
+    if name != 'app':
+        raise AttributeError(f'module {__name__!r} has no attribute {name!r}')
+
+    with _lock:
+        if 'app' not in globals():
+            globals()['app'] = create_app()
+
+    return globals()['app']
@@ -0,0 +1,95 @@
+# Swagger UI and spec served without importing flasgger at startup
+#
+# Importing flasgger (jsonschema, yaml, mistune, requests) costs more than the
+# rest of the app setup, and the spec is only read by people browsing the docs.
+# The routes of `flasgger.Swagger` are registered up front, flasgger is imported
+# and the docstrings parsed on the first hit. `SWAGGER_SPEC_FILE` names a spec
+# precomputed with `python -m app.apidocs build <file>`, served as is instead.
+import importlib.util
+import json
+import os
+import sys
+import threading
+
+from flask import Blueprint, Flask, current_app, send_file
+
+TEMPLATE = {
+    'swagger': '2.0',
+    'info': {
+        'title': 'Task Management API',
+        'description': 'Task Management API docs.',
+        'version': '1.0'
+    }
+}
+
+# flasgger's defaults, its views generate the URLs from these endpoint names
+ENDPOINT = 'flasgger'
+SPEC_ENDPOINT = 'apispec_1'
+SPECS_ROUTE = '/apidocs/'
+
+_lock = threading.Lock()
+
+
+def _flasgger_path(*parts: str) -> str:
+    # locating the package does not import it
+    return os.path.join(importlib.util.find_spec('flasgger').submodule_search_locations[0], *parts)
+
+
+def _swagger():
+    # the `flasgger.Swagger` of the app, created on first use without its routes
+    app = current_app._get_current_object()
+    with _lock:
+        swagger = app.extensions.get('apidocs')
+        if swagger is None:
+            from flasgger import Swagger
+
+            swagger = Swagger(template=TEMPLATE)
+            swagger.app = app
+            swagger.load_config(app)
+            app.extensions['apidocs'] = swagger
+
+    return swagger
+
+
+def apidocs():
+    from flasgger.base import APIDocsView
+
+    return APIDocsView(view_args={'config': _swagger().config}).get()
+
+
+def apispec():
+    # precomputed spec when configured, built once from the docstrings otherwise
+    path = current_app.config['SWAGGER_SPEC_FILE']
+    if path and os.path.exists(path):
+        return send_file(os.path.abspath(path), mimetype='application/json')
+
+    return current_app.json.response(_swagger().get_apispecs(SPEC_ENDPOINT))
+
+
+def init_app(app: Flask):
+    app.config.setdefault('SWAGGER_SPEC_FILE', None)
+
+    # same routes and static files as `flasgger.Swagger`
+    bp = Blueprint(ENDPOINT, __name__, template_folder=_flasgger_path('ui3', 'templates'),
+                   static_folder=_flasgger_path('ui3', 'static'), static_url_path='/flasgger_static')
+    bp.add_url_rule(SPECS_ROUTE, 'apidocs', apidocs)
+    bp.add_url_rule(f'/{SPEC_ENDPOINT}.json', SPEC_ENDPOINT, apispec)
+    app.register_blueprint(bp)
+
+
+def build(app: Flask, path: str):
+    # write the spec of `app` to `path`, for `SWAGGER_SPEC_FILE`
+    with app.test_request_context():
+        spec = _swagger().get_apispecs(SPEC_ENDPOINT)
+
+    with open(path, 'w') as f:
+        json.dump(spec, f, indent=2, sort_keys=True)
+
+
+if __name__ == '__main__':
+    # `python -m app.apidocs build swagger.json`
+    if len(sys.argv) != 3 or sys.argv[1] != 'build':
+        sys.exit('usage: python -m app.apidocs build <file>')
+
+    from app import create_app
+    build(create_app(), sys.argv[2])
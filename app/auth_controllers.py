@@ -3,8 +3,7 @@
 from flask import request, Blueprint, jsonify
 from flask_jwt_extended import jwt_required, get_jwt_identity
 
-from app import auth_service
-from .models import LoginUserSchema, RegisterUserSchema
+from app import auth_service, validation
 
 bp = Blueprint('auth', __name__, url_prefix='/api/v1/auth')
 
@@ -46,9 +45,7 @@ def register():
     """
 
     # Get the request data
-    data = request.get_json()
-    register_user_schema = RegisterUserSchema()
-    errors = register_user_schema.validate(data)
+    data, errors = validation.register_user.load(request.get_json())
 
     if errors:
         return jsonify(errors), 400
@@ -89,9 +86,7 @@ def login():
     """
 
     # Get the request data
-    data = request.get_json()
-    login_user_schema = LoginUserSchema()
-    errors = login_user_schema.validate(data)
+    data, errors = validation.login_user.load(request.get_json())
 
     if errors:
         return jsonify(errors), 400
@@ -1,26 +1,28 @@
 # business logic for the authentication/profile service
-from typing import Tuple
+from typing import Optional, Tuple
 
-from flask import jsonify, Response
-from werkzeug.security import check_password_hash, generate_password_hash
+from flask import abort, jsonify, Response
 
 from app import db
+from app import hashing
+from app import replica
+from app.cache import user_cache
 from app.models import User
 from flask_jwt_extended import create_access_token
 
 
 def register_user(data: dict) -> Tuple[Response, int]:
     # Extract the username and password from the data
-    username = data.get('username')
-    email = data.get('email')
-    password = data.get('password')
+    username = data['username']
+    email = data['email']
+    password = data['password']
 
     # Check if the username already exists
     if User.query.filter_by(username=username).first() or User.query.filter_by(email=email).first():
         return jsonify({'message': 'Username/email already exists'}), 400
 
     # Create a new user object
-    user = User(username=username, email=email, password=generate_password_hash(password))
+    user = User(username=username, email=email, password=hashing.hash_password(password))
 
     # Add the user to the database
     user.save()
@@ -30,14 +32,18 @@ def register_user(data: dict) -> Tuple[Response, int]:
 
 def login_user(data: dict) -> Tuple[Response, int]:
     # Extract the username and password from the data
-    username = data.get('username')
-    password = data.get('password')
+    username = data['username']
+    password = data['password']
 
     # Find the user in the database
     user: User = User.query.filter_by(username=username).first()
 
     # Check if the user exists and the password is correct
-    if user and check_password_hash(user.password, password):
+    if user and hashing.verify_password(user.password, password):
+
+        # Upgrade hashes created with outdated algorithm/cost settings
+        if hashing.needs_rehash(user.password):
+            user.update(username=user.username, email=user.email, password=hashing.hash_password(password))
 
         # Generate the access token
         access_token = create_access_token(identity=user.id)
@@ -49,6 +55,22 @@ def login_user(data: dict) -> Tuple[Response, int]:
 
 def get_user_profile(user_id: int) -> Tuple[Response, int]:
     # get user details by ID
-    user: User = db.get_or_404(User, user_id)
+    user = load_user(user_id)
+    if not user:
+        abort(404)
+
+    return jsonify({'message': 'User found', 'data': user}), 200
+
+
+def load_user(user_id: int) -> Optional[dict]:
+    # get the serialized user by ID, served from the cache (or the replica) when possible
+    user = user_cache.get(user_id)
+    if user is None:
+        row: User = replica.router.session_for(user_id, db.session).get(User, user_id)
+        if not row:
+            return None
+
+        user = row.serialize()
+        user_cache.set(user_id, user)
 
-    return jsonify({'message': 'User found', 'data': user.serialize()}), 200
+    return user
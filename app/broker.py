@@ -0,0 +1,133 @@
+# Message queue backends for fanning out socket events across processes
+#
+# `SOCKETIO_MESSAGE_QUEUE` selects the backend:
+#   - unset:        single process, events are only delivered to local clients
+#   - sqlite:///…   a shared SQLite file polled by every worker, no extra services
+#   - redis://…     Redis pub/sub (requires the optional `redis` package)
+# Any other URL is handed to Flask-SocketIO as is (kombu, kafka, zmq).
+import os
+import pickle
+import sqlite3
+import threading
+import time
+from typing import Optional
+
+import socketio
+from flask import Flask
+
+
+def sqlite_path(url: str) -> str:
+    # `sqlite:///relative.db` or `sqlite:////absolute.db`
+    return url.split(':///', 1)[1]
+
+
+def connect(path: str) -> sqlite3.Connection:
+    connection = sqlite3.connect(path, timeout=10, isolation_level=None, check_same_thread=False)
+    connection.execute('PRAGMA journal_mode=WAL')
+    connection.execute('PRAGMA synchronous=NORMAL')
+
+    return connection
+
+
+class SharedConnection:
+    """Connection of the process to a SQLite file, used by one caller at a time
+
+    `with shared as connection:` holds the lock until the statements and their
+    fetches are done. A connection per thread would be one per greenlet under
+    gevent, opened (with its pragmas) for every request. A forked process opens
+    its own.
+    """
+
+    def __init__(self, path: str):
+        self.path = path
+        self._connection: Optional[sqlite3.Connection] = None
+        self._pid = None
+        self._lock = threading.RLock()
+
+    def __enter__(self) -> sqlite3.Connection:
+        self._lock.acquire()
+        try:
+            if self._pid != os.getpid():
+                self._connection = connect(self.path)
+                self._pid = os.getpid()
+        except BaseException:
+            self._lock.release()
+            raise
+
+        return self._connection
+
+    def __exit__(self, *exc_info):
+        self._lock.release()
+
+
+class SQLiteManager(socketio.PubSubManager):
+    """Socket.IO client manager publishing through a table in a shared SQLite file"""
+
+    name = 'sqlite'
+
+    def __init__(self, url: str, channel: str = 'flask-socketio', write_only: bool = False, logger=None,
+                 poll_interval: float = 0.02, retention: float = 60.0):
+        super().__init__(channel=channel, write_only=write_only, logger=logger)
+        self.path = sqlite_path(url)
+        self.poll_interval = poll_interval
+        self.retention = retention
+        self._shared = SharedConnection(self.path)
+        # last message read, kept when python-socketio restarts `_listen` after an error
+        self._last_id = None
+
+        connection = connect(self.path)
+        connection.execute(
+            'CREATE TABLE IF NOT EXISTS socketio_message ('
+            'id INTEGER PRIMARY KEY AUTOINCREMENT, channel TEXT NOT NULL, '
+            'payload BLOB NOT NULL, created REAL NOT NULL)'
+        )
+        connection.close()
+
+    def _publish(self, data):
+        with self._shared as connection:
+            connection.execute(
+                'INSERT INTO socketio_message (channel, payload, created) VALUES (?, ?, ?)',
+                (self.channel, pickle.dumps(data), time.time()),
+            )
+
+    def _listen(self):
+        connection = connect(self.path)
+        if self._last_id is None:
+            self._last_id = connection.execute('SELECT coalesce(max(id), 0) FROM socketio_message').fetchone()[0]
+        last_prune = time.monotonic()
+
+        try:
+            while True:
+                rows = connection.execute(
+                    'SELECT id, payload FROM socketio_message WHERE id > ? AND channel = ? ORDER BY id',
+                    (self._last_id, self.channel),
+                ).fetchall()
+                for self._last_id, payload in rows:
+                    yield payload
+
+                # drop messages every worker has had plenty of time to read
+                if time.monotonic() - last_prune > self.retention:
+                    connection.execute('DELETE FROM socketio_message WHERE created < ?', (time.time() - self.retention,))
+                    last_prune = time.monotonic()
+
+                if not rows:
+                    self.server.sleep(self.poll_interval)
+        finally:
+            connection.close()
+
+
+def socketio_options(app: Flask) -> dict:
+    # Build the keyword arguments for `SocketIO.init_app` from the app config
+    app.config.setdefault('SOCKETIO_MESSAGE_QUEUE', None)
+    app.config.setdefault('SOCKETIO_CHANNEL', 'flask-socketio')
+
+    url = app.config['SOCKETIO_MESSAGE_QUEUE']
+    channel = app.config['SOCKETIO_CHANNEL']
+    if not url:
+        return {}
+
+    if url.startswith('sqlite:'):
+        os.makedirs(os.path.dirname(os.path.abspath(sqlite_path(url))), exist_ok=True)
+        return {'client_manager': SQLiteManager(url, channel=channel)}
+
+    return {'message_queue': url, 'channel': channel}
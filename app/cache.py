@@ -0,0 +1,113 @@
+# In-process caches for verified JWT claims and serialized users
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Hashable, Optional
+
+from flask import current_app, Flask
+from flask_jwt_extended import JWTManager
+from werkzeug.local import LocalProxy
+
+from app import metrics
+
+_MISSING = object()
+
+
+class TTLCache:
+    """Bounded LRU cache with per-entry expiry and hit/miss counters"""
+
+    def __init__(self, maxsize: int = 1024, ttl: float = 300.0):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key: Hashable, default: Any = None) -> Any:
+        with self._lock:
+            entry = self._entries.get(key, _MISSING)
+            if entry is not _MISSING:
+                expires_at, value = entry
+                if expires_at > time.monotonic():
+                    self._entries.move_to_end(key)
+                    self.hits += 1
+                    return value
+                del self._entries[key]
+
+            self.misses += 1
+            return default
+
+    def set(self, key: Hashable, value: Any, ttl: Optional[float] = None):
+        if self.maxsize <= 0:
+            return
+
+        ttl = self.ttl if ttl is None else min(ttl, self.ttl)
+        with self._lock:
+            self._entries[key] = (time.monotonic() + ttl, value)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.maxsize:
+                self._entries.popitem(last=False)
+                self.evictions += 1
+
+    def invalidate(self, key: Hashable):
+        with self._lock:
+            self._entries.pop(key, None)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+    def stats(self) -> dict:
+        return {
+            'size': len(self._entries),
+            'maxsize': self.maxsize,
+            'hits': self.hits,
+            'misses': self.misses,
+            'evictions': self.evictions,
+        }
+
+
+# caches of the current app, created by `init_app`
+
+# verified token claims keyed by the encoded token
+token_cache: TTLCache = LocalProxy(lambda: current_app.extensions['token_cache'])
+
+# serialized `User` rows keyed by user ID
+user_cache: TTLCache = LocalProxy(lambda: current_app.extensions['user_cache'])
+
+
+class CachingJWTManager(JWTManager):
+    """JWTManager that skips signature verification for recently verified tokens"""
+
+    def _decode_jwt_from_config(self, encoded_token: str, csrf_value=None, allow_expired: bool = False) -> dict:
+        with metrics.phase('jwt'):
+            return self._decode_cached(encoded_token, csrf_value, allow_expired)
+
+    def _decode_cached(self, encoded_token: str, csrf_value=None, allow_expired: bool = False) -> dict:
+        # CSRF checks and expired-token decoding always take the regular path
+        if csrf_value is not None or allow_expired:
+            return super()._decode_jwt_from_config(encoded_token, csrf_value, allow_expired)
+
+        claims = token_cache.get(encoded_token)
+        if claims is not None and claims.get('exp', float('inf')) > time.time():
+            return claims
+
+        claims = super()._decode_jwt_from_config(encoded_token, csrf_value, allow_expired)
+
+        # never keep a token cached past its expiry
+        ttl = claims['exp'] - time.time() if 'exp' in claims else None
+        token_cache.set(encoded_token, claims, ttl=ttl)
+
+        return claims
+
+
+def init_app(app: Flask):
+    app.config.setdefault('TOKEN_CACHE_SIZE', 4096)
+    app.config.setdefault('TOKEN_CACHE_TTL', 300)
+    app.config.setdefault('USER_CACHE_SIZE', 4096)
+    app.config.setdefault('USER_CACHE_TTL', 300)
+
+    app.extensions['token_cache'] = TTLCache(app.config['TOKEN_CACHE_SIZE'], app.config['TOKEN_CACHE_TTL'])
+    app.extensions['user_cache'] = TTLCache(app.config['USER_CACHE_SIZE'], app.config['USER_CACHE_TTL'])
@@ -0,0 +1,45 @@
+# Conditional GET support: ETag/Last-Modified validators and 304 responses
+#
+# Services compute a cheap version of a resource (e.g. its change sequence) and
+# check it against the request's `If-None-Match`/`If-Modified-Since` headers
+# before loading and serializing the full payload.
+import hashlib
+from datetime import datetime, timezone
+from typing import Optional, Tuple
+
+from flask import current_app, request, Response
+
+
+def make_etag(*parts) -> str:
+    # Strong validator for the representation identified by `parts`
+    return hashlib.blake2b(repr(parts).encode(), digest_size=12).hexdigest()
+
+
+def _utc(value: datetime) -> datetime:
+    # stored timestamps are naive local times
+    return value.astimezone(timezone.utc).replace(microsecond=0)
+
+
+def is_not_modified(etag: str, last_modified: Optional[datetime]) -> bool:
+    # `If-None-Match` takes precedence over `If-Modified-Since` (RFC 9110)
+    if request.if_none_match:
+        return request.if_none_match.contains_weak(etag)
+
+    if request.if_modified_since and last_modified:
+        return _utc(last_modified) <= request.if_modified_since
+
+    return False
+
+
+def add_validators(response: Response, etag: str, last_modified: Optional[datetime]) -> Response:
+    response.set_etag(etag)
+    if last_modified:
+        response.last_modified = _utc(last_modified)
+    # per-user data, caches must revalidate before reusing it
+    response.headers['Cache-Control'] = 'private, no-cache'
+
+    return response
+
+
+def not_modified(etag: str, last_modified: Optional[datetime]) -> Tuple[Response, int]:
+    return add_validators(current_app.response_class(status=304), etag, last_modified), 304
@@ -0,0 +1,177 @@
+# Group commit of the single task writes
+#
+# With `GROUP_COMMIT_ENABLED` the service layer hands its writes to a writer
+# thread instead of committing them itself. The writer runs the writes queued
+# within `GROUP_COMMIT_WINDOW_MS` of the first one (at most
+# `GROUP_COMMIT_MAX_BATCH`) in a single transaction, so concurrent requests share
+# one commit instead of queueing on SQLite's write lock one at a time. Callers
+# wait for that commit before responding, an acknowledged write is as durable
+# as with a commit per request. A write not committed within
+# `GROUP_COMMIT_TIMEOUT` seconds is answered with a 503.
+import queue
+import threading
+import time
+from concurrent.futures import Future, TimeoutError
+from typing import Callable, Optional
+
+from flask import current_app, Flask
+from sqlalchemy.engine import Connection, Engine, make_url
+from werkzeug.exceptions import ServiceUnavailable
+from werkzeug.local import LocalProxy
+
+from app import logger, metrics
+
+# a write: runs its statements on the connection and returns what the caller needs
+Operation = Callable[[Connection], object]
+
+
+class _Write:
+    __slots__ = ('operation', 'future', 'enqueued')
+
+    def __init__(self, operation: Operation):
+        self.operation = operation
+        self.future = Future()
+        self.enqueued = time.perf_counter()
+
+
+class GroupCommitWriter:
+    """Single writer running the queued operations in shared transactions
+
+    When an operation raises, its batch is rolled back and the operations are
+    run again in a transaction each, so only the failing one gets the error.
+    """
+
+    def __init__(self, app: Flask, engine: Engine, enabled: bool, window: float = 0.002, max_batch: int = 100,
+                 timeout: float = 10.0):
+        self.app = app
+        self.enabled = enabled
+        self.window = window
+        self.max_batch = max_batch
+        self.timeout = timeout
+        self.batches = 0
+        self.operations = 0
+        self.failed = 0
+        self.retried = 0
+        self.timeouts = 0
+        self.largest_batch = 0
+        self.wait_seconds = 0.0
+        self.max_wait_seconds = 0.0
+        self._engine = engine
+        self._queue = queue.Queue()
+        self._lock = threading.Lock()
+        self._thread: Optional[threading.Thread] = None
+
+    def submit(self, operation: Operation):
+        # run `operation` in the next group commit, returning its result once
+        # committed or raising its error
+        write = _Write(operation)
+
+        # the thread is started on first use, so it is created in the server's
+        # workers rather than in a process they are forked from, and again if it died
+        with self._lock:
+            if self._thread is None or not self._thread.is_alive():
+                self._thread = threading.Thread(target=self._run, name='group-commit', daemon=True)
+                self._thread.start()
+
+        self._queue.put(write)
+
+        try:
+            return write.future.result(timeout=self.timeout)
+        except TimeoutError:
+            # a write still queued is dropped, one the writer already took may commit
+            write.future.cancel()
+            self.timeouts += 1
+            raise ServiceUnavailable('The write was not committed in time', retry_after=1)
+
+    def _run(self):
+        # the app's context, for its metrics settings
+        with self.app.app_context():
+            while True:
+                batch = [self._queue.get()]
+                deadline = time.perf_counter() + self.window
+                while len(batch) < self.max_batch:
+                    try:
+                        batch.append(self._queue.get(timeout=max(deadline - time.perf_counter(), 0)))
+                    except queue.Empty:
+                        break
+
+                # writes whose caller gave up waiting are not run
+                batch = [write for write in batch if write.future.set_running_or_notify_cancel()]
+                if not batch:
+                    continue
+
+                try:
+                    self._commit(batch)
+                except Exception as e:
+                    # e.g. the metrics failing after the commit, the writer keeps going
+                    logger.error(f'Group commit failed: {e!r}')
+                    for write in batch:
+                        if not write.future.done():
+                            write.future.set_exception(e)
+
+    def _commit(self, batch: list):
+        start = time.perf_counter()
+        waits = [start - write.enqueued for write in batch]
+
+        try:
+            results = self._execute([write.operation for write in batch])
+        except Exception:
+            self.retried += len(batch)
+            for write in batch:
+                try:
+                    write.future.set_result(self._execute([write.operation])[0])
+                except Exception as e:
+                    self.failed += 1
+                    write.future.set_exception(e)
+        else:
+            for write, result in zip(batch, results):
+                write.future.set_result(result)
+
+        self.batches += 1
+        self.operations += len(batch)
+        self.largest_batch = max(self.largest_batch, len(batch))
+        self.wait_seconds += sum(waits)
+        self.max_wait_seconds = max(self.max_wait_seconds, *waits)
+        metrics.observe_group_commit(len(batch), waits)
+
+    def _execute(self, operations: list) -> list:
+        with self._engine.begin() as connection:
+            return [operation(connection) for operation in operations]
+
+    def stats(self) -> dict:
+        return {
+            'enabled': self.enabled,
+            'queue_depth': self._queue.qsize(),
+            'batches': self.batches,
+            'operations': self.operations,
+            'failed': self.failed,
+            'retried': self.retried,
+            'timeouts': self.timeouts,
+            'mean_batch_size': round(self.operations / self.batches, 2) if self.batches else 0,
+            'largest_batch': self.largest_batch,
+            'mean_wait_ms': round(self.wait_seconds / self.operations * 1000, 3) if self.operations else 0,
+            'max_wait_ms': round(self.max_wait_seconds * 1000, 3),
+        }
+
+
+# writer of the current app, created by `init_app`
+writer: GroupCommitWriter = LocalProxy(lambda: current_app.extensions['group_commit'])
+
+
+def init_app(app: Flask, db):
+    app.config.setdefault('GROUP_COMMIT_ENABLED', False)
+    app.config.setdefault('GROUP_COMMIT_WINDOW_MS', 2)
+    app.config.setdefault('GROUP_COMMIT_MAX_BATCH', 100)
+    app.config.setdefault('GROUP_COMMIT_TIMEOUT', 10)
+
+    enabled = bool(app.config['GROUP_COMMIT_ENABLED'])
+
+    # an in-memory database is a single connection shared with the requests
+    url = make_url(app.config['SQLALCHEMY_DATABASE_URI'])
+    if enabled and url.get_backend_name() == 'sqlite' and url.database in (None, '', ':memory:'):
+        raise ValueError('Group commit requires a database file')
+
+    with app.app_context():
+        app.extensions['group_commit'] = GroupCommitWriter(
+            app, db.engine, enabled, app.config['GROUP_COMMIT_WINDOW_MS'] / 1000, app.config['GROUP_COMMIT_MAX_BATCH'],
+            app.config['GROUP_COMMIT_TIMEOUT'])
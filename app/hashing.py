@@ -0,0 +1,105 @@
+# Password hashing dispatched to a worker pool
+#
+# Hashing is deliberately CPU heavy, so running it inline pins the request
+# worker (and, under eventlet, the whole hub). By default the work is sent to a
+# process pool, `PASSWORD_HASH_EXECUTOR` can be set to `thread` or `inline`.
+import multiprocessing
+import os
+import threading
+from concurrent.futures import Executor, ProcessPoolExecutor, ThreadPoolExecutor
+from typing import Optional
+
+from flask import current_app, Flask
+from werkzeug.local import LocalProxy
+from werkzeug.security import check_password_hash, generate_password_hash
+
+EXECUTORS = ('process', 'thread', 'inline')
+
+
+class PasswordHasher:
+    """Hashing settings of an app, and the pool running them"""
+
+    def __init__(self, method: str, executor: str = 'process', workers: Optional[int] = None):
+        if executor not in EXECUTORS:
+            raise ValueError(f'Unknown password hash executor: {executor}')
+
+        self.method = method
+        self.executor = executor
+        self.workers = workers
+        self._pool: Optional[Executor] = None
+        self._method_prefix: Optional[str] = None
+        self._lock = threading.Lock()
+
+    def _get_pool(self) -> Optional[Executor]:
+        # Pools are created on first use so creating the app stays cheap
+        if self.executor == 'inline':
+            return None
+
+        with self._lock:
+            if self._pool is None:
+                workers = self.workers or os.cpu_count() or 1
+                if self.executor == 'process':
+                    # forked children would inherit the server's listening socket
+                    # and outlive it, so start them from a clean interpreter (entry
+                    # scripts need the usual `if __name__ == '__main__'` guard)
+                    method = 'forkserver' if 'forkserver' in multiprocessing.get_all_start_methods() else 'spawn'
+                    self._pool = ProcessPoolExecutor(max_workers=workers, mp_context=multiprocessing.get_context(method))
+                else:
+                    self._pool = ThreadPoolExecutor(max_workers=workers, thread_name_prefix='password-hash')
+
+            return self._pool
+
+    def _run(self, fn, *args):
+        pool = self._get_pool()
+        if pool is None:
+            return fn(*args)
+
+        return pool.submit(fn, *args).result()
+
+    def hash_password(self, password: str) -> str:
+        return self._run(generate_password_hash, password, self.method)
+
+    def verify_password(self, pwhash: str, password: str) -> bool:
+        return self._run(check_password_hash, pwhash, password)
+
+    def needs_rehash(self, pwhash: str) -> bool:
+        # Stored hashes look like `<method>$<salt>$<hash>`, werkzeug expands a bare
+        # method name (e.g. `scrypt`) to its default parameters, so resolve it once
+        if self._method_prefix is None:
+            self._method_prefix = generate_password_hash('', self.method, salt_length=1).split('$', 1)[0]
+
+        return pwhash.split('$', 1)[0] != self._method_prefix
+
+    def shutdown(self):
+        with self._lock:
+            if self._pool is not None:
+                self._pool.shutdown(wait=False)
+            self._pool = None
+
+
+# hasher of the current app, created by `init_app`
+hasher: PasswordHasher = LocalProxy(lambda: current_app.extensions['hashing'])
+
+
+def init_app(app: Flask):
+    app.config.setdefault('PASSWORD_HASH_METHOD', 'scrypt:32768:8:1')
+    app.config.setdefault('PASSWORD_HASH_EXECUTOR', 'process')
+    app.config.setdefault('PASSWORD_HASH_WORKERS', None)
+
+    app.extensions['hashing'] = PasswordHasher(
+        app.config['PASSWORD_HASH_METHOD'],
+        app.config['PASSWORD_HASH_EXECUTOR'],
+        app.config['PASSWORD_HASH_WORKERS'],
+    )
+
+
+def hash_password(password: str) -> str:
+    return hasher.hash_password(password)
+
+
+def verify_password(pwhash: str, password: str) -> bool:
+    return hasher.verify_password(pwhash, password)
+
+
+def needs_rehash(pwhash: str) -> bool:
+    return hasher.needs_rehash(pwhash)
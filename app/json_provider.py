@@ -0,0 +1,83 @@
+# JSON serialization for HTTP responses and socket packets, using orjson when it
+# is installed and falling back to the standard library otherwise
+import typing as t
+
+from flask import Flask
+from flask.json.provider import DefaultJSONProvider
+
+from app import metrics
+
+try:
+    import orjson
+except ImportError:  # optional dependency
+    orjson = None
+
+
+class JSONProvider(DefaultJSONProvider):
+    """Standard library provider, timing the serialization of responses"""
+
+    def response(self, *args: t.Any, **kwargs: t.Any):
+        with metrics.phase('serialize'):
+            return super().response(*args, **kwargs)
+
+
+class OrjsonProvider(DefaultJSONProvider):
+    """Flask JSON provider backed by orjson
+
+    Keeps the behaviour of the default provider (sorted keys, HTTP dates and the
+    other types handled by `default`) while serializing straight to bytes.
+    """
+
+    def _options(self, indent: bool = False) -> int:
+        # datetimes go through `default` to keep Flask's HTTP date format
+        options = orjson.OPT_NON_STR_KEYS | orjson.OPT_PASSTHROUGH_DATETIME
+        if self.sort_keys:
+            options |= orjson.OPT_SORT_KEYS
+        if indent:
+            options |= orjson.OPT_INDENT_2
+
+        return options
+
+    def dumps(self, obj: t.Any, **kwargs: t.Any) -> str:
+        return orjson.dumps(obj, default=self.default, option=self._options('indent' in kwargs)).decode()
+
+    def loads(self, s: t.Union[str, bytes], **kwargs: t.Any) -> t.Any:
+        return orjson.loads(s)
+
+    def response(self, *args: t.Any, **kwargs: t.Any):
+        with metrics.phase('serialize'):
+            obj = self._prepare_response_obj(args, kwargs)
+            indent = (self.compact is None and self._app.debug) or self.compact is False
+            body = orjson.dumps(obj, default=self.default, option=self._options(indent) | orjson.OPT_APPEND_NEWLINE)
+
+            return self._app.response_class(body, mimetype=self.mimetype)
+
+
+class SocketJSON:
+    """orjson backed `json`-like module handed to the Socket.IO server"""
+
+    @staticmethod
+    def dumps(obj: t.Any, **kwargs: t.Any) -> str:
+        return orjson.dumps(obj, option=orjson.OPT_NON_STR_KEYS).decode()
+
+    @staticmethod
+    def loads(s: t.Union[str, bytes], **kwargs: t.Any) -> t.Any:
+        return orjson.loads(s)
+
+
+def init_app(app: Flask):
+    # `JSON_PROVIDER` can force the standard library with `stdlib`
+    app.config.setdefault('JSON_PROVIDER', 'auto')
+
+    if orjson is not None and app.config['JSON_PROVIDER'] != 'stdlib':
+        app.json = OrjsonProvider(app)
+    else:
+        app.json = JSONProvider(app)
+
+
+def socketio_options(app: Flask) -> dict:
+    # keyword arguments for `SocketIO.init_app`, the server defaults to the stdlib
+    if orjson is None or app.config.get('JSON_PROVIDER') == 'stdlib':
+        return {}
+
+    return {'json': SocketJSON}
@@ -0,0 +1,239 @@
+# Opt-in request instrumentation, exposed in the Prometheus text format
+#
+# With `METRICS_ENABLED` every request records its duration, the time spent in
+# named phases (JWT verification, validation, serialization, SQL) and the number
+# of SQL statements, and socket emits are timed per event. The numbers are
+# served at `/metrics` and, for each response, in a `Server-Timing` header.
+# When disabled no hooks are installed and `phase`/`emit_timer` hand out a
+# shared no-op context manager. The setting is per app, the histograms are
+# shared by the apps of the process.
+import threading
+import time
+from bisect import bisect_left
+from contextlib import nullcontext
+
+from flask import current_app, Flask, Response, g, has_app_context, has_request_context, request
+from sqlalchemy import event
+
+# upper bounds of the histogram buckets, in seconds
+DURATION_BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+COUNT_BUCKETS = (0, 1, 2, 5, 10, 20, 50, 100)
+
+_noop = nullcontext()
+
+
+class Histogram:
+    """Thread safe histogram per set of label values"""
+
+    def __init__(self, name: str, documentation: str, labels: tuple, buckets: tuple = DURATION_BUCKETS):
+        self.name = name
+        self.documentation = documentation
+        self.labels = labels
+        self.buckets = buckets
+        self._series = {}
+        self._lock = threading.Lock()
+
+    def observe(self, value: float, *label_values: str):
+        index = bisect_left(self.buckets, value)
+        with self._lock:
+            series = self._series.get(label_values)
+            if series is None:
+                # one counter per bucket plus +Inf, then the sum
+                series = self._series[label_values] = [0] * (len(self.buckets) + 1) + [0.0]
+            series[index] += 1
+            series[-1] += value
+
+    def render(self) -> list:
+        lines = [f'# HELP {self.name} {self.documentation}', f'# TYPE {self.name} histogram']
+        with self._lock:
+            series = {labels: list(values) for labels, values in self._series.items()}
+
+        for label_values, values in sorted(series.items()):
+            labels = ','.join(f'{name}="{_escape(value)}"' for name, value in zip(self.labels, label_values))
+            prefix = labels + ',' if labels else ''
+            cumulative = 0
+            for bound, count in zip(self.buckets + ('+Inf',), values):
+                cumulative += count
+                lines.append(f'{self.name}_bucket{{{prefix}le="{bound}"}} {cumulative}')
+            lines.append(f'{self.name}_sum{{{labels}}} {values[-1]}')
+            lines.append(f'{self.name}_count{{{labels}}} {cumulative}')
+
+        return lines
+
+
+def _escape(value) -> str:
+    return str(value).replace('\\', r'\\').replace('"', r'\"').replace('\n', r'\n')
+
+
+request_duration = Histogram(
+    'task_man_http_request_duration_seconds', 'Duration of HTTP requests.', ('method', 'endpoint', 'status'))
+request_phase = Histogram(
+    'task_man_http_request_phase_seconds', 'Time spent in each phase of HTTP requests.', ('endpoint', 'phase'))
+request_statements = Histogram(
+    'task_man_http_request_sql_statements', 'SQL statements executed per HTTP request.', ('endpoint',), COUNT_BUCKETS)
+sql_duration = Histogram(
+    'task_man_sql_statement_duration_seconds', 'Duration of SQL statements.', ('endpoint',))
+emit_duration = Histogram(
+    'task_man_socket_emit_duration_seconds', 'Duration of socket emits.', ('event',))
+group_commit_size = Histogram(
+    'task_man_group_commit_batch_size', 'Writes committed per group commit.', (), (1, 2, 5, 10, 20, 50, 100, 200))
+group_commit_wait = Histogram(
+    'task_man_group_commit_queue_wait_seconds', 'Time writes wait in the group commit queue.', ())
+
+HISTOGRAMS = (request_duration, request_phase, request_statements, sql_duration, emit_duration,
+              group_commit_size, group_commit_wait)
+
+
+class _Phase:
+    __slots__ = ('name', 'start')
+
+    def __init__(self, name: str):
+        self.name = name
+
+    def __enter__(self):
+        self.start = time.perf_counter()
+
+    def __exit__(self, *exc_info):
+        timings = g.get('timings')
+        if timings is not None:
+            timings[self.name] = timings.get(self.name, 0.0) + time.perf_counter() - self.start
+
+
+class _Timer:
+    __slots__ = ('histogram', 'labels', 'start')
+
+    def __init__(self, histogram: Histogram, *labels: str):
+        self.histogram = histogram
+        self.labels = labels
+
+    def __enter__(self):
+        self.start = time.perf_counter()
+
+    def __exit__(self, *exc_info):
+        self.histogram.observe(time.perf_counter() - self.start, *self.labels)
+
+
+def _enabled() -> bool:
+    # `METRICS_ENABLED` of the current app, off outside of an app context
+    return has_app_context() and current_app.extensions['metrics']
+
+
+def phase(name: str):
+    # Context manager adding its duration to the `name` phase of the request
+    if not has_request_context() or not _enabled():
+        return _noop
+
+    return _Phase(name)
+
+
+def emit_timer(event_name: str):
+    # Context manager timing a socket emit
+    if not _enabled():
+        return _noop
+
+    return _Timer(emit_duration, event_name)
+
+
+def observe_group_commit(size: int, waits: list):
+    # Batch size and queue wait of each write of a group commit
+    if not _enabled():
+        return
+
+    group_commit_size.observe(size)
+    for seconds in waits:
+        group_commit_wait.observe(seconds)
+
+
+def _endpoint() -> str:
+    return (request.endpoint or '') if has_request_context() else ''
+
+
+def _before_request():
+    g.timings = {}
+    g.sql_statements = 0
+    g.request_start = time.perf_counter()
+
+
+def _after_request(response: Response) -> Response:
+    start = g.pop('request_start', None)
+    if start is None:
+        return response
+
+    total = time.perf_counter() - start
+    endpoint = _endpoint()
+    timings = g.pop('timings')
+    statements = g.pop('sql_statements')
+
+    request_duration.observe(total, request.method, endpoint, str(response.status_code))
+    request_statements.observe(statements, endpoint)
+    for name, seconds in timings.items():
+        request_phase.observe(seconds, endpoint, name)
+
+    server_timing = [f'{name};dur={seconds * 1000:.2f}' for name, seconds in timings.items()]
+    if statements:
+        server_timing[list(timings).index('db')] += f';desc="{statements} SQL"'
+    server_timing.append(f'total;dur={total * 1000:.2f}')
+    response.headers['Server-Timing'] = ', '.join(server_timing)
+
+    return response
+
+
+def _before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    # kept on the statement's context, which is dropped with it when it raises
+    if context is not None:
+        context._query_start = time.perf_counter()
+
+
+def _after_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    start = getattr(context, '_query_start', None)
+    if start is None:
+        return
+
+    elapsed = time.perf_counter() - start
+    sql_duration.observe(elapsed, _endpoint())
+
+    # statements run outside of a request (e.g. migrations) have no timings
+    if has_request_context() and 'timings' in g:
+        g.timings['db'] = g.timings.get('db', 0.0) + elapsed
+        g.sql_statements += 1
+
+
+def metrics():
+    """
+    Metrics in the Prometheus text format
+    ---
+    tags:
+        -   health
+    responses:
+        200:
+            description: Request, SQL, socket emit and group commit histograms
+    """
+
+    lines = []
+    for histogram in HISTOGRAMS:
+        lines.extend(histogram.render())
+
+    return Response('\n'.join(lines) + '\n', mimetype='text/plain; version=0.0.4')
+
+
+def init_app(app: Flask, db):
+    app.config.setdefault('METRICS_ENABLED', False)
+    app.extensions['metrics'] = bool(app.config['METRICS_ENABLED'])
+    if not app.extensions['metrics']:
+        return
+
+    app.before_request(_before_request)
+    app.after_request(_after_request)
+    app.add_url_rule('/metrics', 'metrics', metrics)
+
+    with app.app_context():
+        instrument_engine(app, db.engine)
+
+
+def instrument_engine(app: Flask, engine):
+    # Time the SQL statements of an engine of `app`, e.g. the read replica's
+    if not app.extensions['metrics']:
+        return
+
+    event.listen(engine, 'before_cursor_execute', _before_cursor_execute)
+    event.listen(engine, 'after_cursor_execute', _after_cursor_execute)
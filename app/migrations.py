@@ -0,0 +1,128 @@
+# Lightweight in-place schema upgrades for existing databases
+#
+# `db.create_all` only creates missing tables, so anything added to an existing
+# table (indexes, columns, triggers) is applied here. The schema version is kept
+# in SQLite's `PRAGMA user_version` and every step must be idempotent.
+from typing import Optional
+
+from flask import Flask
+
+from app import db, logger
+from app.models import ChangeSequence, Task, TaskTombstone, TASK_SEARCH_DDL, TASK_TRIGGERS
+
+
+def _create_indexes(connection, table, *names):
+    for index in table.indexes:
+        if index.name in names:
+            index.create(bind=connection, checkfirst=True)
+
+
+def _column_exists(connection, table: str, column: str) -> bool:
+    return any(row[1] == column for row in connection.exec_driver_sql(f'PRAGMA table_info({table})'))
+
+
+def _add_task_indexes(connection):
+    _create_indexes(connection, Task.__table__, 'ix_task_user_id_id', 'ix_task_user_id_date_modified')
+
+
+def _add_task_change_tracking(connection):
+    if not _column_exists(connection, 'task', 'change_seq'):
+        connection.exec_driver_sql('ALTER TABLE task ADD COLUMN change_seq INTEGER NOT NULL DEFAULT 0')
+
+    # `create` also fires the DDL listeners seeding the sequence row
+    ChangeSequence.__table__.create(bind=connection, checkfirst=True)
+    TaskTombstone.__table__.create(bind=connection, checkfirst=True)
+
+    # existing tasks are stamped in id order and the sequence continues from there
+    connection.exec_driver_sql('UPDATE task SET change_seq = id WHERE change_seq = 0')
+    connection.exec_driver_sql(
+        'UPDATE change_sequence SET value = max(value, (SELECT coalesce(max(change_seq), 0) FROM task)) WHERE id = 1'
+    )
+
+    _create_indexes(connection, Task.__table__, 'ix_task_user_id_change_seq')
+    for trigger in TASK_TRIGGERS:
+        connection.exec_driver_sql(trigger)
+
+
+def _add_task_search(connection):
+    exists = connection.exec_driver_sql("SELECT 1 FROM sqlite_master WHERE name = 'task_fts'").scalar()
+    for statement in TASK_SEARCH_DDL:
+        connection.exec_driver_sql(statement)
+
+    if not exists:
+        connection.exec_driver_sql(
+            "INSERT INTO task_fts (rowid, title, description, owner) SELECT id, title, description, 'u' || user_id FROM task"
+        )
+
+
+def _add_task_created_index(connection):
+    _create_indexes(connection, Task.__table__, 'ix_task_user_id_date_created')
+
+
+def _add_task_autoincrement(connection):
+    # SQLite hands the highest deleted ID to the next task, which clients then
+    # see both updated and deleted, so the table is rebuilt with AUTOINCREMENT
+    ddl = connection.exec_driver_sql("SELECT sql FROM sqlite_master WHERE type = 'table' AND name = 'task'").scalar()
+    if 'AUTOINCREMENT' in ddl.upper():
+        return
+
+    # the triggers and indexes follow a renamed table, drop them to recreate them on the new one
+    triggers = connection.exec_driver_sql("SELECT name FROM sqlite_master WHERE type = 'trigger' AND tbl_name = 'task'")
+    for name, in triggers.all():
+        connection.exec_driver_sql(f'DROP TRIGGER {name}')
+    for index in Task.__table__.indexes:
+        connection.exec_driver_sql(f'DROP INDEX IF EXISTS {index.name}')
+
+    columns = ', '.join(column.name for column in Task.__table__.columns)
+    connection.exec_driver_sql('ALTER TABLE task RENAME TO task_old')
+    # `CreateTable` skips the DDL listeners, the triggers must not fire for the copied rows
+    connection.execute(db.schema.CreateTable(Task.__table__))
+    connection.exec_driver_sql(f'INSERT INTO task ({columns}) SELECT {columns} FROM task_old')
+    connection.exec_driver_sql('DROP TABLE task_old')
+
+    # new IDs continue after both the remaining and the deleted tasks
+    connection.exec_driver_sql("DELETE FROM sqlite_sequence WHERE name = 'task'")
+    connection.exec_driver_sql(
+        "INSERT INTO sqlite_sequence (name, seq) VALUES ('task', max("
+        "(SELECT coalesce(max(id), 0) FROM task), (SELECT coalesce(max(task_id), 0) FROM task_tombstone)))"
+    )
+
+    _create_indexes(connection, Task.__table__, *(index.name for index in Task.__table__.indexes))
+    for statement in TASK_TRIGGERS + TASK_SEARCH_DDL:
+        connection.exec_driver_sql(statement)
+
+
+# Ordered list of migrations, the position in the list is the schema version
+MIGRATIONS = [
+    _add_task_indexes,
+    _add_task_change_tracking,
+    _add_task_search,
+    _add_task_created_index,
+    _add_task_autoincrement,
+]
+
+
+def create_schema(app: Optional[Flask] = None):
+    # Create missing tables then apply pending migrations, for `app` or the default app
+    if app is None:
+        from app import app
+
+    with app.app_context():
+        db.create_all()
+        upgrade_schema()
+
+
+def upgrade_schema():
+    # Apply pending migrations, must be run within an app context
+    with db.engine.begin() as connection:
+        version = connection.exec_driver_sql('PRAGMA user_version').scalar()
+
+        for number, migration in enumerate(MIGRATIONS[version:], start=version + 1):
+            logger.info(f"Applying schema migration {number}: {migration.__name__}")
+            migration(connection)
+            connection.exec_driver_sql(f'PRAGMA user_version = {number}')
+
+
+if __name__ == '__main__':
+    # `python -m app.migrations`, run by the production server before forking workers
+    create_schema()
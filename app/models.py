@@ -1,6 +1,8 @@
 from datetime import datetime
+from typing import Sequence
+
 from app import db
-from app.socket_events import emit_task
+from app.cache import user_cache
 
 from marshmallow import fields, Schema, validate
 
@@ -27,21 +29,35 @@ class User(db.Model):
     def save(self):
         db.session.add(self)
         db.session.commit()
+        user_cache.invalidate(self.id)
 
     def update(self, username, email, password):
         self.username = username
         self.email = email
         self.password = password
         db.session.commit()
+        user_cache.invalidate(self.id)
 
 
 # Task model
 class Task(db.Model):
+    # Indexes backing the per-user lookups, date filters and sort orders
+    __table_args__ = (
+        db.Index('ix_task_user_id_id', 'user_id', 'id'),
+        db.Index('ix_task_user_id_date_created', 'user_id', 'date_created'),
+        db.Index('ix_task_user_id_date_modified', 'user_id', 'date_modified'),
+        db.Index('ix_task_user_id_change_seq', 'user_id', 'change_seq'),
+        # never reuse the ID of a deleted task, its tombstone still refers to it
+        {'sqlite_autoincrement': True},
+    )
+
     id = db.Column(db.Integer, primary_key=True)
     title = db.Column(db.String(50), nullable=False)
     description = db.Column(db.Text, nullable=True)
-    date_created = db.Column(db.DateTime, nullable=False, default=datetime.now())
-    date_modified = db.Column(db.DateTime, nullable=False, default=datetime.now())
+    date_created = db.Column(db.DateTime, nullable=False, default=datetime.now)
+    date_modified = db.Column(db.DateTime, nullable=False, default=datetime.now)
+    # global, monotonically increasing sequence of the last change, maintained by `TASK_TRIGGERS`
+    change_seq = db.Column(db.Integer, nullable=False, default=0, server_default='0')
 
     user_id = db.Column(db.Integer, db.ForeignKey('user.id'), nullable=False)
 
@@ -60,24 +76,117 @@ class Task(db.Model):
             'date_modified': str(self.date_modified)
         }
 
-    def save(self):
-        db.session.add(self)
-        db.session.commit()
-        emit_task('task_created', self, self.user_id)
-
-    def update(self, title, description):
-        self.title = title
-        self.description = description
-        self.date_modified = datetime.now()
-        db.session.commit()
-        emit_task('task_updated', self, self.user_id)
-
-    def delete(self):
-        user_id = self.user_id # saving `user_id` for the socket event later before deleting the task
+    @staticmethod
+    def serialize_row(row) -> dict:
+        # same output as `serialize` for a row selected with `TASK_COLUMNS`,
+        # used by list queries to skip hydrating ORM objects
+        return {
+            'id': row[0],
+            'title': row[1],
+            'description': row[2],
+            'user_id': row[3],
+            'date_created': str(row[4]),
+            'date_modified': str(row[5])
+        }
 
-        db.session.delete(self)
-        db.session.commit()
-        emit_task('task_removed', self, user_id)
+    @staticmethod
+    def serialize_fields(row, fields: Sequence[str]) -> dict:
+        # `serialize_row` restricted to `fields`, for a row selected with their
+        # `TASK_FIELDS` columns in the same order
+        return {name: str(value) if name in TASK_DATE_FIELDS else value for name, value in zip(fields, row)}
+
+
+# Columns selected by list queries, in the order expected by `Task.serialize_row`
+TASK_COLUMNS = (Task.id, Task.title, Task.description, Task.user_id, Task.date_created, Task.date_modified)
+
+# Columns by output field name, for lists returning a subset of the fields
+TASK_FIELDS = {column.key: column for column in TASK_COLUMNS}
+TASK_DATE_FIELDS = frozenset(('date_created', 'date_modified'))
+
+
+# Record of a deleted task, so syncing clients can drop their copy
+class TaskTombstone(db.Model):
+    __table_args__ = (
+        db.Index('ix_task_tombstone_user_id_change_seq', 'user_id', 'change_seq'),
+    )
+
+    task_id = db.Column(db.Integer, primary_key=True, autoincrement=False)
+    user_id = db.Column(db.Integer, nullable=False)
+    change_seq = db.Column(db.Integer, nullable=False)
+    date_deleted = db.Column(db.DateTime, nullable=False)
+
+
+# Single row holding the last issued task change sequence
+class ChangeSequence(db.Model):
+    id = db.Column(db.Integer, primary_key=True, autoincrement=False)
+    value = db.Column(db.Integer, nullable=False)
+
+
+# SQLite triggers stamping every task write with the next change sequence and
+# recording tombstones for deletes, so that bulk statements are covered as well
+_NEXT_CHANGE_SEQ = 'UPDATE change_sequence SET value = value + 1 WHERE id = 1;'
+_LAST_CHANGE_SEQ = '(SELECT value FROM change_sequence WHERE id = 1)'
+
+TASK_TRIGGERS = [
+    f"""
+    CREATE TRIGGER IF NOT EXISTS task_change_seq_insert AFTER INSERT ON task BEGIN
+        {_NEXT_CHANGE_SEQ}
+        UPDATE task SET change_seq = {_LAST_CHANGE_SEQ} WHERE id = NEW.id;
+    END
+    """,
+    f"""
+    CREATE TRIGGER IF NOT EXISTS task_change_seq_update AFTER UPDATE OF title, description, date_modified ON task BEGIN
+        {_NEXT_CHANGE_SEQ}
+        UPDATE task SET change_seq = {_LAST_CHANGE_SEQ} WHERE id = NEW.id;
+    END
+    """,
+    f"""
+    CREATE TRIGGER IF NOT EXISTS task_tombstone_delete AFTER DELETE ON task BEGIN
+        {_NEXT_CHANGE_SEQ}
+        INSERT OR REPLACE INTO task_tombstone (task_id, user_id, change_seq, date_deleted)
+        VALUES (OLD.id, OLD.user_id, {_LAST_CHANGE_SEQ}, strftime('%Y-%m-%d %H:%M:%f', 'now', 'localtime'));
+    END
+    """,
+]
+
+# Full-text index over task titles and descriptions, the `owner` column holds a
+# `u<user_id>` token so searches are restricted to the user's tasks by the index
+TASK_SEARCH_DDL = [
+    """
+    CREATE VIRTUAL TABLE IF NOT EXISTS task_fts USING fts5(title, description, owner)
+    """,
+    # rank by relevance with matches in the title weighing more, ignoring `owner`
+    """
+    INSERT INTO task_fts (task_fts, rank) VALUES ('rank', 'bm25(10.0, 1.0, 0.0)')
+    """,
+    """
+    CREATE TRIGGER IF NOT EXISTS task_fts_insert AFTER INSERT ON task BEGIN
+        INSERT INTO task_fts (rowid, title, description, owner) VALUES (NEW.id, NEW.title, NEW.description, 'u' || NEW.user_id);
+    END
+    """,
+    """
+    CREATE TRIGGER IF NOT EXISTS task_fts_update AFTER UPDATE OF title, description ON task BEGIN
+        UPDATE task_fts SET title = NEW.title, description = NEW.description WHERE rowid = NEW.id;
+    END
+    """,
+    """
+    CREATE TRIGGER IF NOT EXISTS task_fts_delete AFTER DELETE ON task BEGIN
+        DELETE FROM task_fts WHERE rowid = OLD.id;
+    END
+    """,
+]
+
+# Lightweight construct to query the FTS table, `rowid` is the task ID
+task_fts = db.table('task_fts', db.column('rowid', db.Integer), db.column('rank', db.Float), db.column('task_fts'))
+
+db.event.listen(ChangeSequence.__table__, 'after_create', db.DDL('INSERT INTO change_sequence (id, value) VALUES (1, 0)'))
+for trigger in TASK_TRIGGERS:
+    # `DDL` applies %-formatting to the statement
+    db.event.listen(Task.__table__, 'after_create', db.DDL(trigger.replace('%', '%%')))
+for statement in TASK_SEARCH_DDL:
+    db.event.listen(Task.__table__, 'after_create', db.DDL(statement))
+# the FTS table is not part of the metadata, drop it along with `task`
+db.event.listen(Task.__table__, 'after_drop', db.DDL('DROP TABLE IF EXISTS task_fts'))
 
 
 # Schema definitions for validating request
@@ -95,3 +204,11 @@ class LoginUserSchema(Schema):
 class TaskSchema(Schema):
     title = fields.Str(required=True, validate=validate.Length(min=1, max=100))
     description = fields.Str(required=True, validate=validate.Length(min=10))
+
+
+class TaskBatchUpdateSchema(TaskSchema):
+    id = fields.Int(required=True)
+
+
+class TaskIdsSchema(Schema):
+    ids = fields.List(fields.Int(), required=True, validate=validate.Length(min=1))
@@ -0,0 +1,67 @@
+# Helpers for keyset (cursor) pagination of list queries
+import base64
+import json
+from typing import Any, List, Optional, Sequence, Tuple
+
+DEFAULT_LIMIT = 10
+MAX_LIMIT = 100
+
+# Delta syncs return every change up to this many per round trip
+MAX_SYNC_LIMIT = 1000
+
+
+def encode_cursor(values: Sequence[Any]) -> str:
+    # Pack the sort key of the last row into an opaque url-safe token
+    raw = json.dumps(list(values), separators=(',', ':')).encode()
+    return base64.urlsafe_b64encode(raw).decode().rstrip('=')
+
+
+def decode_cursor(cursor: str) -> List[Any]:
+    # Reverse of `encode_cursor`, raises ValueError for tampered/invalid tokens
+    try:
+        padded = cursor + '=' * (-len(cursor) % 4)
+        values = json.loads(base64.urlsafe_b64decode(padded.encode()))
+    except Exception:
+        raise ValueError('Invalid cursor')
+
+    if not isinstance(values, list) or not values:
+        raise ValueError('Invalid cursor')
+
+    return values
+
+
+def clamp_limit(limit: Optional[int]) -> int:
+    # Keep the page size within sane bounds
+    if not limit or limit < 1:
+        return DEFAULT_LIMIT
+
+    return min(limit, MAX_LIMIT)
+
+
+def clamp_sync_limit(limit: Optional[int]) -> int:
+    if not limit or limit < 1:
+        return MAX_SYNC_LIMIT
+
+    return min(limit, MAX_SYNC_LIMIT)
+
+
+def fetch_page(session, stmt, limit: int, key) -> Tuple[list, Optional[str]]:
+    # Run a statement already filtered past the cursor and ordered by the key,
+    # fetching one extra row to know whether another page exists (no COUNT query)
+    rows = session.execute(stmt.limit(limit + 1)).all()
+
+    next_cursor = None
+    if len(rows) > limit:
+        rows = rows[:limit]
+        next_cursor = encode_cursor(key(rows[-1]))
+
+    return rows, next_cursor
+
+
+def fetch_offset_page(session, stmt, page: int, per_page: int) -> list:
+    # Page/offset listing as done by `db.paginate`, minus its COUNT query which
+    # only served to reject out of range pages (answered with no rows here)
+    if page < 1 or per_page < 1:
+        return []
+
+    return session.execute(stmt.limit(per_page).offset((page - 1) * per_page)).all()
@@ -0,0 +1,290 @@
+# Registry of connected socket sessions, shared between workers when a
+# message queue is configured so any process can tell who is online
+import sqlite3
+import threading
+import time
+import uuid
+from typing import Optional, Set
+
+from flask import current_app, Flask
+from flask_socketio import SocketIO
+from werkzeug.local import LocalProxy
+
+from app import broker, logger
+
+# Room every authenticated session joins, to broadcast to all connected users
+# without going through the registry
+ONLINE_ROOM = 'online'
+
+
+class _Shard:
+    __slots__ = ('lock', 'sessions')
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.sessions = {}  # user_id -> set of sids
+
+
+class LocalPresence:
+    """Sessions of the current process only
+
+    Users are spread over `shards` locks so concurrent joins and leaves of
+    different users rarely wait on each other, the sid -> user_id lookup relies
+    on single dict operations being atomic.
+    """
+
+    def __init__(self, shards: int = 16):
+        self._shards = [_Shard() for _ in range(shards)]
+        self._users = {}  # sid -> user_id
+
+    def _shard(self, user_id: int) -> _Shard:
+        return self._shards[hash(user_id) % len(self._shards)]
+
+    def add(self, user_id: int, sid: str):
+        self._users[sid] = user_id
+        shard = self._shard(user_id)
+        with shard.lock:
+            sessions = shard.sessions.get(user_id)
+            if sessions is None:
+                shard.sessions[user_id] = {sid}
+            else:
+                sessions.add(sid)
+
+    def remove(self, sid: str) -> Optional[int]:
+        user_id = self._users.pop(sid, None)
+        if user_id is None:
+            return None
+
+        shard = self._shard(user_id)
+        with shard.lock:
+            sessions = shard.sessions.get(user_id)
+            if sessions is not None:
+                sessions.discard(sid)
+                if not sessions:
+                    del shard.sessions[user_id]
+
+        return user_id
+
+    def sessions(self, user_id: int) -> Set[str]:
+        shard = self._shard(user_id)
+        with shard.lock:
+            return set(shard.sessions.get(user_id, ()))
+
+    def is_online(self, user_id: int) -> bool:
+        return user_id in self._shard(user_id).sessions
+
+    def online_count(self) -> int:
+        return sum(len(shard.sessions) for shard in self._shards)
+
+    def session_count(self) -> int:
+        return len(self._users)
+
+
+class SQLitePresence:
+    """Sessions of all workers, stored next to the SQLite message queue
+
+    Each worker refreshes a heartbeat, sessions of workers that stopped
+    heartbeating (crashed or killed) are pruned by the surviving ones.
+    """
+
+    def __init__(self, url: str, socketio: SocketIO, heartbeat_interval: float = 5.0):
+        self.path = broker.sqlite_path(url)
+        self.socketio = socketio
+        self.heartbeat_interval = heartbeat_interval
+        self.host_id = uuid.uuid4().hex
+        self._shared = broker.SharedConnection(self.path)
+        self._started = False
+
+        connection = broker.connect(self.path)
+        connection.executescript(
+            'CREATE TABLE IF NOT EXISTS socketio_presence ('
+            'sid TEXT PRIMARY KEY, user_id INTEGER NOT NULL, host_id TEXT NOT NULL);'
+            'CREATE INDEX IF NOT EXISTS ix_socketio_presence_user_id ON socketio_presence (user_id);'
+            'CREATE TABLE IF NOT EXISTS socketio_host (host_id TEXT PRIMARY KEY, last_seen REAL NOT NULL);'
+        )
+        connection.close()
+
+    def add(self, user_id: int, sid: str):
+        if not self._started:
+            self._started = True
+            self._heartbeat()
+            self.socketio.start_background_task(self._run)
+
+        with self._shared as connection:
+            connection.execute(
+                'INSERT OR REPLACE INTO socketio_presence (sid, user_id, host_id) VALUES (?, ?, ?)',
+                (sid, user_id, self.host_id),
+            )
+
+    def remove(self, sid: str) -> Optional[int]:
+        with self._shared as connection:
+            row = connection.execute('DELETE FROM socketio_presence WHERE sid = ? RETURNING user_id', (sid,)).fetchone()
+
+        return row[0] if row else None
+
+    def sessions(self, user_id: int) -> Set[str]:
+        with self._shared as connection:
+            rows = connection.execute('SELECT sid FROM socketio_presence WHERE user_id = ?', (user_id,)).fetchall()
+
+        return {sid for sid, in rows}
+
+    def is_online(self, user_id: int) -> bool:
+        with self._shared as connection:
+            row = connection.execute('SELECT 1 FROM socketio_presence WHERE user_id = ? LIMIT 1', (user_id,)).fetchone()
+
+        return row is not None
+
+    def online_count(self) -> int:
+        with self._shared as connection:
+            return connection.execute('SELECT count(DISTINCT user_id) FROM socketio_presence').fetchone()[0]
+
+    def session_count(self) -> int:
+        with self._shared as connection:
+            return connection.execute('SELECT count(*) FROM socketio_presence').fetchone()[0]
+
+    def _heartbeat(self):
+        now = time.time()
+        expired = now - self.heartbeat_interval * 3
+        with self._shared as connection:
+            connection.execute('INSERT OR REPLACE INTO socketio_host (host_id, last_seen) VALUES (?, ?)', (self.host_id, now))
+
+            # forget the sessions of workers that missed several heartbeats
+            connection.execute(
+                'DELETE FROM socketio_presence WHERE host_id IN (SELECT host_id FROM socketio_host WHERE last_seen < ?)',
+                (expired,),
+            )
+            connection.execute('DELETE FROM socketio_host WHERE last_seen < ?', (expired,))
+
+    def _run(self):
+        while True:
+            self.socketio.sleep(self.heartbeat_interval)
+            try:
+                self._heartbeat()
+            except sqlite3.Error as e:
+                # e.g. `database is locked`, a missed beat must not stop the heartbeat for good
+                logger.error(f'Presence heartbeat failed: {e!r}')
+
+
+# Lua removing a session from all the keys of a `RedisPresence`, the session
+# hash holds the user and the worker of the session
+_REDIS_REMOVE = """
+local function remove(prefix, sid)
+    local session = redis.call('HMGET', prefix .. ':sid:' .. sid, 'user_id', 'host_id')
+    if not session[1] then
+        return false
+    end
+
+    local user_key = prefix .. ':user:' .. session[1]
+    redis.call('DEL', prefix .. ':sid:' .. sid)
+    redis.call('SREM', prefix .. ':host:' .. session[2], sid)
+    redis.call('SREM', user_key, sid)
+    if redis.call('SCARD', user_key) == 0 then
+        redis.call('SREM', prefix .. ':online', session[1])
+    end
+    redis.call('DECR', prefix .. ':sessions')
+    return session[1]
+end
+"""
+
+
+class RedisPresence:
+    """Sessions of all workers, stored in Redis sets (requires the `redis` package)
+
+    Like `SQLitePresence`, each worker refreshes a heartbeat key expiring after
+    several missed beats, the sessions of workers whose key expired are pruned
+    by the surviving ones. Removals run as Lua scripts, so they are atomic.
+    """
+
+    REMOVE = _REDIS_REMOVE + 'return remove(ARGV[1], ARGV[2])'
+
+    # prune the sessions of a worker once its heartbeat expired
+    PRUNE = _REDIS_REMOVE + """
+    local prefix, host_id = ARGV[1], ARGV[2]
+    if redis.call('EXISTS', prefix .. ':alive:' .. host_id) == 1 then
+        return 0
+    end
+
+    local sids = redis.call('SMEMBERS', prefix .. ':host:' .. host_id)
+    for _, sid in ipairs(sids) do
+        remove(prefix, sid)
+    end
+    redis.call('DEL', prefix .. ':host:' .. host_id)
+    redis.call('SREM', prefix .. ':hosts', host_id)
+    return #sids
+    """
+
+    def __init__(self, url: str, socketio: SocketIO, prefix: str = 'presence', heartbeat_interval: float = 5.0):
+        import redis
+
+        self.redis = redis.Redis.from_url(url)
+        self.socketio = socketio
+        self.prefix = prefix
+        self.heartbeat_interval = heartbeat_interval
+        self.host_id = uuid.uuid4().hex
+        self._remove = self.redis.register_script(self.REMOVE)
+        self._prune = self.redis.register_script(self.PRUNE)
+        self._started = False
+
+    def add(self, user_id: int, sid: str):
+        if not self._started:
+            self._started = True
+            self._heartbeat()
+            self.socketio.start_background_task(self._run)
+
+        pipeline = self.redis.pipeline()  # MULTI/EXEC
+        pipeline.hset(f'{self.prefix}:sid:{sid}', mapping={'user_id': user_id, 'host_id': self.host_id})
+        pipeline.sadd(f'{self.prefix}:user:{user_id}', sid)
+        pipeline.sadd(f'{self.prefix}:host:{self.host_id}', sid)
+        pipeline.sadd(f'{self.prefix}:online', user_id)
+        pipeline.incr(f'{self.prefix}:sessions')
+        pipeline.execute()
+
+    def remove(self, sid: str) -> Optional[int]:
+        user_id = self._remove(args=[self.prefix, sid])
+
+        return int(user_id) if user_id is not None else None
+
+    def sessions(self, user_id: int) -> Set[str]:
+        return {sid.decode() for sid in self.redis.smembers(f'{self.prefix}:user:{user_id}')}
+
+    def is_online(self, user_id: int) -> bool:
+        return bool(self.redis.sismember(f'{self.prefix}:online', user_id))
+
+    def online_count(self) -> int:
+        return self.redis.scard(f'{self.prefix}:online')
+
+    def session_count(self) -> int:
+        return int(self.redis.get(f'{self.prefix}:sessions') or 0)
+
+    def _heartbeat(self):
+        pipeline = self.redis.pipeline()
+        pipeline.set(f'{self.prefix}:alive:{self.host_id}', 1, px=int(self.heartbeat_interval * 3000))
+        pipeline.sadd(f'{self.prefix}:hosts', self.host_id)
+        pipeline.execute()
+
+        # forget the sessions of workers that missed several heartbeats
+        for host_id in self.redis.smembers(f'{self.prefix}:hosts'):
+            self._prune(args=[self.prefix, host_id])
+
+    def _run(self):
+        while True:
+            self.socketio.sleep(self.heartbeat_interval)
+            try:
+                self._heartbeat()
+            except Exception as e:
+                # a Redis hiccup must not stop the heartbeat for good
+                logger.error(f'Presence heartbeat failed: {e!r}')
+
+
+# registry of the current app, created by `init_app` according to the message queue
+registry = LocalProxy(lambda: current_app.extensions['presence'])
+
+
+def init_app(app: Flask):
+    url = app.config.get('SOCKETIO_MESSAGE_QUEUE')
+    if url and url.startswith('sqlite:'):
+        app.extensions['presence'] = SQLitePresence(url, app.extensions['socketio'])
+    elif url and url.startswith(('redis://', 'rediss://')):
+        app.extensions['presence'] = RedisPresence(url, app.extensions['socketio'])
+    else:
+        app.extensions['presence'] = LocalPresence()
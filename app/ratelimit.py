@@ -0,0 +1,302 @@
+# Token bucket rate limiting of the API routes
+#
+# `RATELIMIT_LIMITS` maps an endpoint (`auth.login`) or a blueprint (`tasks`) to
+# a limit such as `10/minute` or `20/second burst 100`: a bucket holding `burst`
+# tokens (the count by default), refilled at the given rate, one token taken per
+# request. Routes matching neither use `RATELIMIT_DEFAULT` (unlimited when
+# unset). Requests are counted per JWT identity, or per client address when
+# anonymous. The buckets live in the process unless `RATELIMIT_STORAGE_URI` (or
+# a SQLite/Redis `SOCKETIO_MESSAGE_QUEUE`) names storage shared by the workers.
+import math
+import re
+import threading
+import time
+from typing import Optional, Tuple
+
+from flask import current_app, Flask, Response, g, request
+from flask_jwt_extended import get_jwt_identity, verify_jwt_in_request
+from flask_jwt_extended.exceptions import JWTExtendedException
+from jwt import PyJWTError
+from werkzeug.exceptions import TooManyRequests
+from werkzeug.local import LocalProxy
+
+from app import broker
+
+PERIODS = {'second': 1, 'minute': 60, 'hour': 3600, 'day': 86400}
+
+_LIMIT = re.compile(r'^\s*(\d+)\s*/\s*(second|minute|hour|day)s?(?:\s+burst\s+(\d+))?\s*$')
+
+# result of taking a token: allowed, tokens left, seconds until the next one
+Hit = Tuple[bool, float, float]
+
+
+class Limit:
+    """`count` requests per `period`, in bursts of up to `burst` requests"""
+
+    __slots__ = ('text', 'rate', 'burst')
+
+    def __init__(self, text: str):
+        match = _LIMIT.match(text)
+        if match is None or int(match[1]) <= 0:
+            raise ValueError(f'Invalid rate limit: {text!r}')
+
+        count, period, burst = match.groups()
+        self.text = text
+        self.rate = int(count) / PERIODS[period]  # tokens per second
+        self.burst = int(burst or count)
+
+    def refill(self, tokens: float, elapsed: float) -> float:
+        return min(self.burst, tokens + max(elapsed, 0) * self.rate)
+
+    def full_after(self, tokens: float) -> float:
+        # seconds until a bucket holding `tokens` is full again, same as a new one
+        return (self.burst - tokens) / self.rate
+
+
+class _Shard:
+    __slots__ = ('lock', 'buckets', 'next_sweep')
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.buckets = {}  # key -> (tokens, updated, full_at)
+        self.next_sweep = 0.0
+
+
+class LocalLimiter:
+    """Buckets of the current process
+
+    Keys are spread over `shards` locks like the presence registry. A bucket
+    left idle until full is the same as a missing one, each shard drops those
+    every `sweep_interval` seconds.
+    """
+
+    name = 'memory'
+
+    def __init__(self, shards: int = 16, sweep_interval: float = 60.0):
+        self.sweep_interval = sweep_interval
+        self.evictions = 0
+        self._shards = [_Shard() for _ in range(shards)]
+
+    def hit(self, key: str, limit: Limit) -> Hit:
+        now = time.monotonic()
+        shard = self._shards[hash(key) % len(self._shards)]
+        with shard.lock:
+            bucket = shard.buckets.get(key)
+            tokens = limit.refill(bucket[0], now - bucket[1]) if bucket else limit.burst
+            allowed = tokens >= 1
+            if allowed:
+                tokens -= 1
+            shard.buckets[key] = (tokens, now, now + limit.full_after(tokens))
+
+            if now >= shard.next_sweep:
+                shard.next_sweep = now + self.sweep_interval
+                self._sweep(shard, now)
+
+        return allowed, tokens, 0.0 if allowed else (1 - tokens) / limit.rate
+
+    def _sweep(self, shard: _Shard, now: float):
+        idle = [key for key, (_, _, full_at) in shard.buckets.items() if full_at <= now]
+        for key in idle:
+            del shard.buckets[key]
+        self.evictions += len(idle)
+
+    def size(self) -> int:
+        return sum(len(shard.buckets) for shard in self._shards)
+
+
+class SQLiteLimiter:
+    """Buckets of all workers, in a table of a shared SQLite file
+
+    A request takes its token with a single upsert, so concurrent workers never
+    both spend the last one.
+    """
+
+    name = 'sqlite'
+
+    def __init__(self, url: str, sweep_interval: float = 60.0):
+        self.path = broker.sqlite_path(url)
+        self.sweep_interval = sweep_interval
+        self.evictions = 0
+        self._shared = broker.SharedConnection(self.path)
+        self._next_sweep = 0.0
+
+        connection = broker.connect(self.path)
+        connection.executescript(
+            'CREATE TABLE IF NOT EXISTS ratelimit_bucket ('
+            'key TEXT PRIMARY KEY, tokens REAL NOT NULL, updated REAL NOT NULL, '
+            'full_at REAL NOT NULL, allowed INTEGER NOT NULL) WITHOUT ROWID;'
+            'CREATE INDEX IF NOT EXISTS ix_ratelimit_bucket_full_at ON ratelimit_bucket (full_at);'
+        )
+        connection.close()
+
+    def hit(self, key: str, limit: Limit) -> Hit:
+        now = time.time()
+        # the SET expressions all read the stored row, `refilled` is spelled out
+        refilled = 'min(:burst, tokens + max(:now - updated, 0) * :rate)'
+        with self._shared as connection:
+            tokens, allowed = connection.execute(
+                'INSERT INTO ratelimit_bucket (key, tokens, updated, full_at, allowed) '
+                'VALUES (:key, :burst - 1, :now, :now + 1 / :rate, 1) '
+                'ON CONFLICT (key) DO UPDATE SET '
+                f'tokens = {refilled} - ({refilled} >= 1), '
+                f'full_at = :now + (:burst - ({refilled} - ({refilled} >= 1))) / :rate, '
+                f'allowed = {refilled} >= 1, updated = :now '
+                'RETURNING tokens, allowed',
+                {'key': key, 'burst': limit.burst, 'rate': limit.rate, 'now': now},
+            ).fetchone()
+
+            if now >= self._next_sweep:
+                self._next_sweep = now + self.sweep_interval
+                self.evictions += connection.execute('DELETE FROM ratelimit_bucket WHERE full_at <= ?', (now,)).rowcount
+
+        return bool(allowed), tokens, 0.0 if allowed else (1 - tokens) / limit.rate
+
+    def size(self) -> int:
+        with self._shared as connection:
+            return connection.execute('SELECT count(*) FROM ratelimit_bucket').fetchone()[0]
+
+
+class RedisLimiter:
+    """Buckets of all workers, in Redis hashes expiring once full (requires the `redis` package)"""
+
+    name = 'redis'
+
+    SCRIPT = '''
+    local burst, rate, now = tonumber(ARGV[1]), tonumber(ARGV[2]), tonumber(ARGV[3])
+    local bucket = redis.call('HMGET', KEYS[1], 'tokens', 'updated')
+    local tokens = burst
+    if bucket[1] then
+        tokens = math.min(burst, tonumber(bucket[1]) + math.max(now - tonumber(bucket[2]), 0) * rate)
+    end
+    local allowed = 0
+    if tokens >= 1 then
+        tokens = tokens - 1
+        allowed = 1
+    end
+    redis.call('HSET', KEYS[1], 'tokens', tostring(tokens), 'updated', tostring(now))
+    redis.call('PEXPIRE', KEYS[1], math.ceil((burst - tokens) / rate * 1000) + 1)
+    return {allowed, tostring(tokens)}
+    '''
+
+    def __init__(self, url: str, prefix: str = 'ratelimit'):
+        import redis
+
+        self.redis = redis.Redis.from_url(url)
+        self.prefix = prefix
+        self.evictions = 0  # expired by Redis
+        self._script = self.redis.register_script(self.SCRIPT)
+
+    def hit(self, key: str, limit: Limit) -> Hit:
+        allowed, tokens = self._script(keys=[f'{self.prefix}:{key}'], args=[limit.burst, limit.rate, time.time()])
+        tokens = float(tokens)
+
+        return bool(allowed), tokens, 0.0 if allowed else (1 - tokens) / limit.rate
+
+    def size(self) -> int:
+        return sum(1 for _ in self.redis.scan_iter(f'{self.prefix}:*'))
+
+
+class RateLimiter:
+    """Limits of the endpoints and blueprints, checked before each request"""
+
+    def __init__(self, enabled: bool, storage, limits: dict, default: Optional[str]):
+        self.enabled = enabled
+        self.storage = storage
+        self.limits = {scope: Limit(text) for scope, text in limits.items()}  # endpoint or blueprint -> Limit
+        self.default = Limit(default) if default else None
+        self.allowed = 0
+        self.limited = 0
+
+    def limit_for(self, endpoint: Optional[str], blueprint: Optional[str]) -> Tuple[str, Optional[Limit]]:
+        # the endpoint's own limit, else its blueprint's (a bucket shared by its routes)
+        for scope in (endpoint, blueprint):
+            if scope in self.limits:
+                return scope, self.limits[scope]
+
+        return 'default', self.default
+
+    def check(self):
+        scope, limit = self.limit_for(request.endpoint, request.blueprint)
+        if limit is None or request.method == 'OPTIONS':
+            return
+
+        allowed, tokens, retry_after = self.storage.hit(f'{scope}:{_client()}', limit)
+        g.rate_limit = (limit, tokens)
+        if allowed:
+            self.allowed += 1
+            return
+
+        self.limited += 1
+        raise TooManyRequests(f'Rate limit of {limit.text} exceeded', retry_after=math.ceil(retry_after))
+
+    def stats(self) -> dict:
+        return {
+            'enabled': self.enabled,
+            'storage': self.storage.name,
+            'buckets': self.storage.size(),
+            'evictions': self.storage.evictions,
+            'allowed': self.allowed,
+            'limited': self.limited,
+        }
+
+
+# limiter of the current app, created by `init_app`
+limiter: RateLimiter = LocalProxy(lambda: current_app.extensions['ratelimit'])
+
+
+def _client() -> str:
+    # the user of a valid token, the client address otherwise
+    try:
+        verify_jwt_in_request(optional=True)
+        identity = get_jwt_identity()
+    except (JWTExtendedException, PyJWTError):
+        identity = None
+
+    return f'user:{identity}' if identity is not None else f'ip:{request.remote_addr}'
+
+
+def _headers(response: Response) -> Response:
+    rate_limit = g.pop('rate_limit', None)
+    if rate_limit is not None:
+        limit, tokens = rate_limit
+        response.headers['X-RateLimit-Limit'] = str(limit.burst)
+        response.headers['X-RateLimit-Remaining'] = str(int(tokens))
+
+    return response
+
+
+def storage_for(url: Optional[str]):
+    if url and url.startswith('sqlite:'):
+        return SQLiteLimiter(url)
+    if url and url.startswith(('redis://', 'rediss://')):
+        return RedisLimiter(url)
+    if url in (None, '', 'memory://'):
+        return LocalLimiter()
+
+    raise ValueError(f'Unsupported rate limit storage: {url}')
+
+
+def init_app(app: Flask):
+    app.config.setdefault('RATELIMIT_ENABLED', False)
+    app.config.setdefault('RATELIMIT_LIMITS', {
+        'auth.login': '10/minute',
+        'auth.register': '5/minute',
+        'tasks.create_task': '10/second burst 50',
+    })
+    app.config.setdefault('RATELIMIT_DEFAULT', None)
+    app.config.setdefault('RATELIMIT_STORAGE_URI', None)
+
+    if not app.config['RATELIMIT_ENABLED']:
+        app.extensions['ratelimit'] = RateLimiter(False, LocalLimiter(), {}, None)
+        return
+
+    # shared with the other workers through the message queue's storage unless set
+    url = app.config['RATELIMIT_STORAGE_URI']
+    queue = app.config.get('SOCKETIO_MESSAGE_QUEUE')
+    if url is None and queue and queue.startswith(('sqlite:', 'redis://', 'rediss://')):
+        url = queue
+
+    app.extensions['ratelimit'] = RateLimiter(
+        True, storage_for(url), app.config['RATELIMIT_LIMITS'], app.config['RATELIMIT_DEFAULT'])
+    app.before_request(app.extensions['ratelimit'].check)
+    app.after_request(_headers)
@@ -0,0 +1,100 @@
+# Routing of task and profile reads to a read-only engine
+#
+# With `READ_REPLICA_ENABLED` the list/get reads use a session of their own,
+# bound to `READ_REPLICA_URI` (e.g. a replica of a database server). For a
+# SQLite database file it defaults to a second connection pool opening the same
+# file with `mode=ro`, so reads never hold a connection the writes are waiting
+# for and can never take the write lock. A user who wrote within the last
+# `READ_YOUR_WRITES_SECONDS` reads from the primary, so a replica lagging behind
+# never hides their own changes. The recent writers are tracked per process.
+from typing import Optional
+
+from flask import current_app, Flask
+from flask.globals import app_ctx
+from sqlalchemy import create_engine
+from sqlalchemy.engine import make_url
+from sqlalchemy.orm import Session, scoped_session, sessionmaker
+from werkzeug.local import LocalProxy
+
+from app import metrics, storage
+from app.cache import TTLCache
+
+# pragmas writing to the database file, not applied to read-only connections
+_WRITE_PRAGMAS = ('journal_mode',)
+
+
+class ReadRouter:
+    """Session to read a user's data from, the replica unless they just wrote"""
+
+    def __init__(self, session: Optional[scoped_session], window: float, max_users: int):
+        self.enabled = session is not None
+        self.replica_reads = 0
+        self.primary_reads = 0
+        self.session = session
+        # users who wrote recently, expiring after the read-your-writes window
+        self.recent_writers = TTLCache(max_users, window)
+
+    def record_write(self, user_id: int):
+        if self.enabled:
+            self.recent_writers.set(user_id, True)
+
+    def session_for(self, user_id: int, primary: Session) -> Session:
+        if not self.enabled or self.recent_writers.get(user_id):
+            self.primary_reads += 1
+            return primary
+
+        self.replica_reads += 1
+        return self.session()
+
+    def stats(self) -> dict:
+        return {
+            'enabled': self.enabled,
+            'replica_reads': self.replica_reads,
+            'primary_reads': self.primary_reads,
+            'recent_writers': self.recent_writers.stats()['size'],
+        }
+
+
+# router of the current app, created by `init_app`
+router: ReadRouter = LocalProxy(lambda: current_app.extensions['replica'])
+
+
+def replica_uri(app: Flask, database_uri: str) -> str:
+    # the configured replica, or the SQLite file of the primary opened read-only
+    if app.config['READ_REPLICA_URI']:
+        return app.config['READ_REPLICA_URI']
+
+    url = make_url(database_uri)
+    if url.get_backend_name() != 'sqlite' or url.database in (None, '', ':memory:'):
+        raise ValueError('READ_REPLICA_URI is required unless the database is a SQLite file')
+
+    return f'sqlite:///file:{url.database}?mode=ro&uri=true'
+
+
+def init_app(app: Flask, db):
+    app.config.setdefault('READ_REPLICA_ENABLED', False)
+    app.config.setdefault('READ_REPLICA_URI', None)
+    app.config.setdefault('READ_YOUR_WRITES_SECONDS', 5)
+    app.config.setdefault('READ_YOUR_WRITES_MAX_USERS', 100000)
+
+    if not app.config['READ_REPLICA_ENABLED']:
+        app.extensions['replica'] = ReadRouter(
+            None, app.config['READ_YOUR_WRITES_SECONDS'], app.config['READ_YOUR_WRITES_MAX_USERS'])
+        return
+
+    with app.app_context():
+        # relative SQLite paths are resolved by the primary engine
+        uri = replica_uri(app, db.engine.url.render_as_string(hide_password=False))
+
+    engine = create_engine(uri, **app.config.get('SQLALCHEMY_ENGINE_OPTIONS', {}))
+    if engine.dialect.name == 'sqlite':
+        settings = {name: value for name, value in storage.pragmas(app).items() if name not in _WRITE_PRAGMAS}
+        storage.configure_engine(engine, settings)
+    metrics.instrument_engine(app, engine)
+
+    # one session per application context, as `db.session`
+    session = scoped_session(sessionmaker(bind=engine), scopefunc=lambda: id(app_ctx._get_current_object()))
+    app.teardown_appcontext(lambda exc: session.remove())
+
+    app.extensions['replica'] = ReadRouter(
+        session, app.config['READ_YOUR_WRITES_SECONDS'], app.config['READ_YOUR_WRITES_MAX_USERS'])
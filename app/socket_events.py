@@ -1,7 +1,178 @@
-from app import socketio
+import itertools
+import threading
+from collections import OrderedDict
+from typing import Hashable, Optional
 
+from flask import current_app, Flask
+from werkzeug.local import LocalProxy
 
-# routine to emit single task event to user's room
+from app import logger, metrics, presence, socketio
+
+
+class EventDispatcher:
+    """Queue of task events emitted from a background task instead of the request
+
+    Events queued within the same window are coalesced per task (only the latest
+    state is sent) and each room receives a single frame per flush.
+    """
+
+    def __init__(self, app: Flask, window: float = 0.05, max_pending: int = 10000):
+        self.app = app
+        self.window = window
+        self.max_pending = max_pending
+        self.enqueued = 0
+        self.coalesced = 0
+        self.dropped = 0
+        self.frames = 0
+        self.failed = 0
+        self._pending = OrderedDict()
+        self._sequence = itertools.count()
+        self._lock = threading.Lock()
+        self._started = False
+
+    def dispatch(self, event: str, payload, room: str, key: Optional[Hashable] = None):
+        # A zero window keeps the synchronous behaviour
+        if self.window <= 0:
+            with metrics.emit_timer(event):
+                socketio.emit(event, payload, room=room)
+            return
+
+        # events without a key (e.g. batches) are never coalesced
+        pending_key = (room, key if key is not None else ('seq', next(self._sequence)))
+
+        with self._lock:
+            self.enqueued += 1
+            current = self._pending.get(pending_key)
+            if current is not None:
+                self.coalesced += 1
+                merged = self._merge(current[0], event)
+                if merged is None:
+                    del self._pending[pending_key]
+                else:
+                    # sent after the events queued since, e.g. a batch holding an older state
+                    self._pending[pending_key] = (merged, payload)
+                    self._pending.move_to_end(pending_key)
+            elif len(self._pending) >= self.max_pending:
+                self.dropped += 1
+                return
+            else:
+                self._pending[pending_key] = (event, payload)
+
+            if not self._started:
+                self._started = True
+                socketio.start_background_task(self._run)
+
+    @staticmethod
+    def _merge(previous: str, event: str) -> Optional[str]:
+        # A task created and removed within the window is never announced
+        if previous == 'task_created':
+            return None if event == 'task_removed' else previous
+
+        return event
+
+    def flush(self):
+        with self._lock:
+            pending, self._pending = self._pending, OrderedDict()
+
+        rooms = OrderedDict()
+        for (room, key), message in pending.items():
+            rooms.setdefault(room, []).append((key, message))
+
+        for room, messages in rooms.items():
+            try:
+                self._emit(room, [message for _, message in messages])
+            except Exception as e:
+                # e.g. the message queue is unavailable, the room's events are retried on the next flush
+                logger.error(f'Emitting task events to room {room} failed: {e!r}')
+                self.failed += 1
+                self._requeue(room, messages)
+            else:
+                self.frames += 1
+
+    @staticmethod
+    def _emit(room: str, messages: list):
+        if len(messages) == 1:
+            event, payload = messages[0]
+            with metrics.emit_timer(event):
+                socketio.emit(event, payload, room=room)
+        else:
+            with metrics.emit_timer('task_events'):
+                socketio.emit('task_events', [{'event': event, 'data': payload} for event, payload in messages], room=room)
+
+    def _requeue(self, room: str, messages: list):
+        # put the failed events back ahead of those queued since, merged with
+        # a newer event of the same task like `dispatch` does
+        with self._lock:
+            retried = OrderedDict()
+            for key, (event, payload) in messages:
+                current = self._pending.pop((room, key), None)
+                if current is not None:
+                    merged = self._merge(event, current[0])
+                    if merged is not None:
+                        retried[(room, key)] = (merged, current[1])
+                elif len(self._pending) + len(retried) < self.max_pending:
+                    retried[(room, key)] = (event, payload)
+                else:
+                    self.dropped += 1
+
+            retried.update(self._pending)
+            self._pending = retried
+
+    def _run(self):
+        try:
+            # the app's context, for its metrics settings
+            with self.app.app_context():
+                while True:
+                    socketio.sleep(self.window)
+                    if self._pending:
+                        self.flush()
+        finally:
+            # the next event starts a new loop
+            with self._lock:
+                self._started = False
+
+    def stats(self) -> dict:
+        return {
+            'queue_depth': len(self._pending),
+            'enqueued': self.enqueued,
+            'coalesced': self.coalesced,
+            'dropped': self.dropped,
+            'frames': self.frames,
+            'failed': self.failed,
+        }
+
+
+# dispatcher of the current app, created by `init_app`
+dispatcher: EventDispatcher = LocalProxy(lambda: current_app.extensions['socket_events'])
+
+
+def init_app(app: Flask):
+    app.config.setdefault('SOCKET_EVENT_WINDOW_MS', 50)
+    app.config.setdefault('SOCKET_EVENT_MAX_PENDING', 10000)
+
+    app.extensions['socket_events'] = EventDispatcher(
+        app, app.config['SOCKET_EVENT_WINDOW_MS'] / 1000, app.config['SOCKET_EVENT_MAX_PENDING'])
+
+
+# routine to emit single task event to user's room, `task` being a Task or
+# its serialized dict (e.g. a row returned by UPDATE ... RETURNING)
 def emit_task(event: str, task, user_id: int):
-    socketio.emit(event, task.serialize(), room=str(user_id))
-    
\ No newline at end of file
+    data = task if isinstance(task, dict) else task.serialize()
+    dispatcher.dispatch(event, data, room=str(user_id), key=data['id'])
+
+
+# routine to emit a single event for many task changes to user's room
+def emit_tasks_batch(action: str, tasks: list, user_id: int):
+    dispatcher.dispatch('tasks_batch', {'action': action, 'data': tasks}, room=str(user_id))
+
+
+# routine to emit the progress of a task import to user's room, updates of the
+# same import within the dispatch window are coalesced into the latest
+def emit_import_progress(progress: dict, user_id: int):
+    dispatcher.dispatch('tasks_import', progress, room=str(user_id), key=('import', progress['id']))
+
+
+# routine to emit an event to every connected user, through the room all the
+# authenticated sessions join
+def emit_broadcast(event: str, payload):
+    dispatcher.dispatch(event, payload, room=presence.ONLINE_ROOM)
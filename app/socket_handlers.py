@@ -1,63 +1,91 @@
 # This routine is used to handle socket connections
 
 from flask import request
-from flask_socketio import emit, join_room, leave_room, disconnect
+from flask_socketio import SocketIO, emit, join_room, disconnect
 
 from flask_jwt_extended import get_jwt_identity, verify_jwt_in_request
 
-from werkzeug.exceptions import NotFound
-
 from app import db, logger
-from app.models import Task, User
-from app import socketio
-
+from app.models import Task, TASK_COLUMNS
+from app import auth_service, pagination, presence, replica, task_service
 
-# Local registry of connected users
-# can be used to broadcast messages to all connected users
-connected_users = {}
 
-
-@socketio.on('connect')
 def handle_connect():
     try:
         verify_jwt_in_request(locations='query_string')
         user_id = get_jwt_identity()
-        user = User.query.get(user_id)
+        user = auth_service.load_user(user_id)
         if not user:
             raise Exception('User not found')
         
         join_room(str(user_id))
-        connected_users[user_id] = request.sid
+        # broadcasts to every connected user go to this room
+        join_room(presence.ONLINE_ROOM)
+
+        # Shared registry of connected sessions (several per user for tabs/devices)
+        presence.registry.add(user_id, request.sid)
         logger.info("Client connected")
     except Exception as e:
-        logger.error('Error during connect:', str(e))
+        logger.error(f'Error during connect: {e}')
         emit('unauthorized', {'message': 'Invalid token'})
         disconnect()
 
 
-@socketio.on('disconnect')
 def handle_disconnect():
     try:
-        verify_jwt_in_request()
-        user_id = get_jwt_identity()
-        leave_room(str(user_id))
-        connected_users.pop(user_id)
+        # rooms are left automatically, only the registry needs updating
+        presence.registry.remove(request.sid)
         logger.info('Client disconnected')
     except Exception as e:
-        logger.error('Error during disconnect:', str(e))
+        logger.error(f'Error during disconnect: {e}')
 
 
-@socketio.on('get_tasks')
-def emit_tasks():
+def emit_tasks(data=None):
     verify_jwt_in_request(locations='query_string')
     user_id = get_jwt_identity()
 
-    user_tasks = {}
-    try:
-        user_tasks = db.paginate(db.select(Task).filter_by(user_id=user_id).order_by(Task.id), max_per_page=4)
-    except NotFound:
-        pass
+    data = data if isinstance(data, dict) else {}
+
+    # incremental sync, e.g. `socket.emit('get_tasks', {since: watermark})`, where a
+    # null watermark returns everything along with the watermark to resume from
+    if 'since' in data:
+        try:
+            changes = task_service.get_task_changes(user_id, data.get('since'), data.get('limit'))
+        except (ValueError, TypeError):
+            emit('tasks_error', {'message': 'Invalid watermark'})
+            return
+
+        logger.info(f"User {user_id} requested task changes since {data.get('since')}")
+        emit('tasks_delta', changes)
+        return
+
+    # opt-in keyset pagination, e.g. `socket.emit('get_tasks', {after: cursor, limit: 20})`,
+    # taking the same filters, `sort` and `fields` as the REST listing
+    if 'after' in data or 'limit' in data:
+        filters = {name: data[name] for name in task_service.TASK_FILTERS if name in data}
+        try:
+            result, next_cursor = task_service.get_tasks_page(
+                user_id, data.get('after'), data.get('limit'), filters, data.get('sort', 'id'), data.get('fields'))
+        except (ValueError, TypeError) as e:
+            emit('tasks_error', {'message': str(e) if isinstance(e, ValueError) else 'Invalid cursor'})
+            return
+
+        logger.info(f"User {user_id} requested tasks after {data.get('after')}")
+        # only the requesting session asked for this page
+        emit('tasks', {'data': result, 'next_cursor': next_cursor})
+        return
+
+    # page of the connection's query string (`?page=2`), 4 tasks per page
+    page = request.args.get('page', 1, type=int)
+    stmt = db.select(*TASK_COLUMNS).filter(Task.user_id == user_id).order_by(Task.id)
+    rows = pagination.fetch_offset_page(replica.router.session_for(user_id, db.session), stmt, page, 4)
 
     logger.info(f"User {user_id} requested tasks")
-    result = [task.serialize() for task in user_tasks]
+    result = [Task.serialize_row(row) for row in rows]
     emit('tasks', result, room=str(user_id))
+
+
+def init_app(socketio: SocketIO):
+    socketio.on_event('connect', handle_connect)
+    socketio.on_event('disconnect', handle_disconnect)
+    socketio.on_event('get_tasks', emit_tasks)
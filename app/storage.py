@@ -0,0 +1,68 @@
+# SQLite storage profiles applied to every new database connection
+#
+# `SQLITE_PROFILE` picks one of the `PROFILES` below and `SQLITE_PRAGMAS` can
+# override single pragmas, e.g. FLASK_SQLITE_PRAGMAS='{"mmap_size": 0}'.
+from flask import Flask
+from sqlalchemy import event
+from sqlalchemy.engine import Engine, make_url
+
+PROFILES = {
+    # SQLite defaults: rollback journal, full fsync on every commit
+    'default': {},
+    # WAL lets readers run alongside the writer and commits only fsync the WAL
+    # at checkpoints, `synchronous=NORMAL` stays durable against app crashes
+    'tuned': {
+        'journal_mode': 'WAL',
+        'synchronous': 'NORMAL',
+        'busy_timeout': 5000,
+        'mmap_size': 256 * 1024 * 1024,
+        'cache_size': -64 * 1024,  # KiB
+        'temp_store': 'MEMORY',
+    },
+}
+
+# Connection pool for the threaded/eventlet servers, one connection per
+# concurrent request with some headroom for bursts and background tasks
+POOL_OPTIONS = {
+    'pool_size': 10,
+    'max_overflow': 20,
+    'pool_timeout': 30,
+}
+
+
+def pragmas(app: Flask) -> dict:
+    return {**PROFILES[app.config['SQLITE_PROFILE']], **app.config['SQLITE_PRAGMAS']}
+
+
+def configure_engine(engine: Engine, settings: dict):
+    # Apply the pragmas on every new DBAPI connection of the engine
+    if engine.dialect.name != 'sqlite' or not settings:
+        return
+
+    @event.listens_for(engine, 'connect')
+    def set_pragmas(dbapi_connection, connection_record):
+        cursor = dbapi_connection.cursor()
+        for name, value in settings.items():
+            cursor.execute(f'PRAGMA {name} = {value}')
+        cursor.close()
+
+
+def configure(app: Flask):
+    # Must run before `SQLAlchemy(app)` creates the engines
+    app.config.setdefault('SQLITE_PROFILE', 'tuned')
+    app.config.setdefault('SQLITE_PRAGMAS', {})
+
+    if app.config['SQLITE_PROFILE'] not in PROFILES:
+        raise ValueError(f"Unknown SQLite profile: {app.config['SQLITE_PROFILE']}")
+
+    # in-memory databases use a single connection pool that takes no sizing
+    url = make_url(app.config['SQLALCHEMY_DATABASE_URI'])
+    if url.get_backend_name() == 'sqlite' and url.database not in (None, '', ':memory:'):
+        engine_options = app.config.setdefault('SQLALCHEMY_ENGINE_OPTIONS', {})
+        for name, value in POOL_OPTIONS.items():
+            engine_options.setdefault(name, value)
+
+
+def init_app(app: Flask, db):
+    with app.app_context():
+        configure_engine(db.engine, pragmas(app))
@@ -1,13 +1,17 @@
 # Controller definitions for managing tasks
 
+from typing import Tuple
+
 from flask import request, Blueprint, jsonify
 from flask_jwt_extended import jwt_required, get_jwt_identity
 
-from app import task_service
-from .models import TaskSchema
+from app import task_service, validation
 
 bp = Blueprint('tasks', __name__, url_prefix='/api/v1/tasks')
 
+# Upper bound on the number of tasks in a single batch request
+MAX_BATCH_SIZE = 5000
+
 
 @bp.post('')
 @jwt_required()
@@ -50,10 +54,7 @@ def create_task():
     user_id = get_jwt_identity()
 
     # Get the request data
-    data = request.get_json()
-
-    task_schema = TaskSchema()
-    errors = task_schema.validate(data)
+    data, errors = validation.task.load(request.get_json())
     if errors:
         return jsonify(errors), 400
 
@@ -73,11 +74,65 @@ def get_all_tasks():
             in: header
             required: true
             type: string
+        -   name: If-None-Match
+            in: header
+            required: false
+            type: string
+            description: ETag of a previous response, answered with 304 when unchanged.
+        -   name: after
+            in: query
+            required: false
+            type: string
+            description: Opaque cursor from a previous `next_cursor`, enables keyset pagination.
+        -   name: limit
+            in: query
+            required: false
+            type: integer
+            description: Page size for keyset pagination (max 100).
+        -   name: created_after
+            in: query
+            required: false
+            type: string
+            format: date-time
+            description: Only tasks created after this ISO 8601 date (exclusive), likewise `created_before`, `modified_after` and `modified_before`.
+        -   name: created_before
+            in: query
+            required: false
+            type: string
+            format: date-time
+        -   name: modified_after
+            in: query
+            required: false
+            type: string
+            format: date-time
+        -   name: modified_before
+            in: query
+            required: false
+            type: string
+            format: date-time
+        -   name: sort
+            in: query
+            required: false
+            type: string
+            enum: [id, -id, created, -created, modified, -modified]
+            default: id
+            description: Sort order, `-` for descending (e.g. `-modified` for the recently changed tasks first).
+        -   name: fields
+            in: query
+            required: false
+            type: string
+            description: Comma separated fields to return (e.g. `id,title`), all of them by default.
     responses:
         200:
             description: Tasks fetch successful
             examples:
-                application/json: {"message": "Success", "data": [{"title": "Title", "description": "Description", "user_id": 1}]}
+                application/json: {"message": "Success", "data": [{"title": "Title", "description": "Description", "user_id": 1}], "next_cursor": "WzEwXQ"}
+        304:
+            description: Tasks not modified since the ETag/date of the client's copy
+        400:
+            description: Invalid cursor, filter, sort or fields
+            examples:
+                application/json: {"message": "Invalid cursor"}
         404:
             description: Task not found
             examples:
@@ -87,7 +142,161 @@ def get_all_tasks():
     # Get the current user ID from the access token
     user_id = get_jwt_identity()
 
-    return task_service.get_all_tasks(user_id)
+    # Filters, sort order and fields
+    filters = {name: request.args[name] for name in task_service.TASK_FILTERS if name in request.args}
+    sort = request.args.get('sort', 'id')
+    fields = request.args.get('fields')
+
+    # Page based pagination parameters
+    page = request.args.get('page', 1, type=int)
+    per_page = request.args.get('per_page', 20, type=int)
+
+    # Keyset pagination parameters (optional)
+    after = request.args.get('after')
+    limit = request.args.get('limit', type=int)
+
+    return task_service.get_all_tasks(user_id, after=after, limit=limit, page=page, per_page=per_page,
+                                      filters=filters, sort=sort, fields=fields)
+
+
+@bp.get('/search')
+@jwt_required()
+def search_tasks():
+    """
+    Search tasks by user
+    ---
+    tags:
+        - tasks
+    parameters:
+        -   name: Authorization
+            in: header
+            required: true
+            type: string
+        -   name: q
+            in: query
+            required: true
+            type: string
+            description: Words to look for in the title or description, a trailing `*` matches a word as a prefix (e.g. `mil*`).
+        -   name: after
+            in: query
+            required: false
+            type: string
+            description: Opaque cursor from a previous `next_cursor`.
+        -   name: limit
+            in: query
+            required: false
+            type: integer
+            description: Page size (max 100).
+    responses:
+        200:
+            description: Tasks ordered by relevance
+            examples:
+                application/json: {"message": "Success", "data": [{"title": "Title", "description": "Description", "user_id": 1}], "next_cursor": null}
+        400:
+            description: Missing query or invalid cursor
+            examples:
+                application/json: {"message": "Search query is required"}
+    """
+
+    # Get the current user ID from the access token
+    user_id = get_jwt_identity()
+
+    q = request.args.get('q', '')
+    after = request.args.get('after')
+    limit = request.args.get('limit', type=int)
+
+    return task_service.search_tasks(user_id, q, after=after, limit=limit)
+
+
+@bp.get('/export')
+@jwt_required()
+def export_tasks():
+    """
+    Export all tasks by user
+    ---
+    tags:
+        - tasks
+    produces:
+        - application/x-ndjson
+        - text/csv
+    parameters:
+        -   name: Authorization
+            in: header
+            required: true
+            type: string
+        -   name: format
+            in: query
+            required: false
+            type: string
+            enum: [ndjson, csv]
+            default: ndjson
+            description: One JSON task per line, or CSV with a header row.
+    responses:
+        200:
+            description: Tasks streamed in ID order
+            examples:
+                application/x-ndjson: {"id": 1, "title": "Title", "description": "Description", "user_id": 1}
+        400:
+            description: Unsupported format
+            examples:
+                application/json: {"message": "Unsupported format, expected one of: ndjson, csv"}
+    """
+
+    # Get the current user ID from the access token
+    user_id = get_jwt_identity()
+
+    format = request.args.get('format', 'ndjson')
+
+    return task_service.export_tasks(user_id, format)
+
+
+@bp.post('/import')
+@jwt_required()
+def import_tasks():
+    """
+    Import tasks from NDJSON or CSV
+    ---
+    tags:
+        - tasks
+    consumes:
+        - application/x-ndjson
+        - text/csv
+    parameters:
+        -   name: Authorization
+            in: header
+            required: true
+            type: string
+        -   name: format
+            in: query
+            required: false
+            type: string
+            enum: [ndjson, csv]
+            default: ndjson
+            description: One JSON task per line, or CSV with a header row. Fields other than title and description are ignored, so exports can be imported as they are.
+        -   name: tasks
+            in: body
+            required: true
+            schema:
+                type: string
+                example: '{"title": "Title", "description": "Description"}'
+    responses:
+        201:
+            description: Tasks imported, invalid rows are skipped and listed by line number (first 100). Progress is sent to the user's room as `tasks_import` events
+            examples:
+                application/json: {"message": "Tasks imported", "id": "5f0c...", "status": "done", "rows": 3, "imported": 2, "failed": 1, "errors": [{"line": 2, "errors": {"title": ["Missing data for required field."]}}]}
+        400:
+            description: Unsupported format, empty or unreadable body
+            examples:
+                application/json: {"message": "Unsupported format, expected one of: ndjson, csv"}
+    """
+
+    # Get the current user ID from the access token
+    user_id = get_jwt_identity()
+
+    format = request.args.get('format', 'ndjson')
+
+    # the body is parsed while it is read, not loaded up front
+    return task_service.import_tasks(user_id, request.stream, format)
 
 
 @bp.get('/<int:task_id>')
@@ -103,6 +312,11 @@ def get_task(task_id: int):
             in: header
             required: true
             type: string
+        -   name: If-None-Match
+            in: header
+            required: false
+            type: string
+            description: ETag of a previous response, answered with 304 when unchanged.
         -   name: task_id
             in: path
             required: true
@@ -112,6 +326,8 @@ def get_task(task_id: int):
             description: Task found
             examples:
                 application/json: {"message": "Task found", "data": {"title": "Title", "description": "Description", "user_id": 1}}
+        304:
+            description: Task not modified since the ETag/date of the client's copy
         404:
             description: Task not found
             examples:
@@ -169,16 +385,69 @@ def update_task(task_id):
     user_id = get_jwt_identity()
 
     # Get the request data
-    data = request.get_json()
-
-    task_schema = TaskSchema()
-    errors = task_schema.validate(data)
+    data, errors = validation.task.load(request.get_json())
     if errors:
         return jsonify(errors), 400
 
     return task_service.update_task(user_id, task_id, data)
 
 
+@bp.patch('/<int:task_id>')
+@jwt_required()
+def patch_task(task_id):
+    """
+    Partially update task
+    ---
+    tags:
+        - tasks
+    parameters:
+        -   name: Authorization
+            in: header
+            required: true
+            type: string
+        -   name: task_id
+            in: path
+            required: true
+            type: integer
+        -   name: task
+            in: body
+            required: true
+            schema:
+                properties:
+                    title:
+                        type: string
+                        description: Title of the task.
+                        example: Be a millionaire
+                    description:
+                        type: string
+                        description: Description of the task.
+                        example: Work hard, pray hard, work harder
+    responses:
+        200:
+            description: Task updated, or unchanged when it already had the given values
+            examples:
+                application/json: {"message": "Task updated", "data": {"title": "Title", "description": "Description", "user_id": 1}}
+        400:
+            description: Bad request
+            examples:
+                application/json: {"_schema": ["At least one field is required."]}
+        404:
+            description: Task not found
+            examples:
+                application/json: {"message": "Task not found"}
+    """
+
+    # Get the current user ID from the access token
+    user_id = get_jwt_identity()
+
+    # Get the request data, only the given fields are written
+    data, errors = validation.task_patch.load(request.get_json())
+    if errors:
+        return jsonify(errors), 400
+
+    return task_service.patch_task(user_id, task_id, data)
+
+
 @bp.delete('/<int:task_id>')
 @jwt_required()
 def delete_task(task_id):
@@ -209,3 +478,168 @@ def delete_task(task_id):
     user_id = get_jwt_identity()
 
     return task_service.delete_task(user_id, task_id)
+
+
+@bp.post('/batch')
+@jwt_required()
+def create_tasks():
+    """
+    Create tasks in batch
+    ---
+    tags:
+        - tasks
+    parameters:
+        -   name: Authorization
+            in: header
+            required: true
+            type: string
+        -   name: tasks
+            in: body
+            required: true
+            schema:
+                type: array
+                items:
+                    properties:
+                        title:
+                            type: string
+                            description: Title of the task.
+                            example: Be a millionaire
+                        description:
+                            type: string
+                            description: Description of the task.
+                            example: Work hard, pray hard, work harder
+    responses:
+        201:
+            description: Tasks created
+            examples:
+                application/json: {"message": "Tasks created", "data": [{"id": 1, "title": "Title", "description": "Description", "user_id": 1}]}
+        400:
+            description: Bad request
+            examples:
+                application/json: {"message": "Bad request"}
+    """
+
+    # Get the current user ID from the access token
+    user_id = get_jwt_identity()
+
+    # Get the request data
+    data, errors = _load_batch(validation.tasks, request.get_json())
+    if errors:
+        return jsonify(errors), 400
+
+    return task_service.create_tasks(user_id, data)
+
+
+@bp.patch('/batch')
+@jwt_required()
+def update_tasks():
+    """
+    Update tasks in batch
+    ---
+    tags:
+        - tasks
+    parameters:
+        -   name: Authorization
+            in: header
+            required: true
+            type: string
+        -   name: tasks
+            in: body
+            required: true
+            schema:
+                type: array
+                items:
+                    properties:
+                        id:
+                            type: integer
+                            description: ID of the task.
+                            example: 1
+                        title:
+                            type: string
+                            description: Title of the task.
+                            example: Be a millionaire
+                        description:
+                            type: string
+                            description: Description of the task.
+                            example: Work hard, pray hard, work harder
+    responses:
+        200:
+            description: Tasks updated
+            examples:
+                application/json: {"message": "Tasks updated", "data": [{"id": 1, "title": "Title", "description": "Description", "user_id": 1}]}
+        404:
+            description: Task not found
+            examples:
+                application/json: {"message": "Task not found", "ids": [2]}
+    """
+
+    # Get the current user ID from the access token
+    user_id = get_jwt_identity()
+
+    # Get the request data
+    data, errors = _load_batch(validation.task_updates, request.get_json())
+    if errors:
+        return jsonify(errors), 400
+
+    return task_service.update_tasks(user_id, data)
+
+
+@bp.delete('/batch')
+@jwt_required()
+def delete_tasks():
+    """
+    Delete tasks in batch
+    ---
+    tags:
+        - tasks
+    parameters:
+        -   name: Authorization
+            in: header
+            required: true
+            type: string
+        -   name: tasks
+            in: body
+            required: true
+            schema:
+                properties:
+                    ids:
+                        type: array
+                        items:
+                            type: integer
+                        example: [1, 2, 3]
+    responses:
+        200:
+            description: Tasks removed
+            examples:
+                application/json: {"message": "Tasks removed", "data": [1, 2, 3]}
+        404:
+            description: Task not found
+            examples:
+                application/json: {"message": "Task not found", "ids": [2]}
+    """
+
+    # Get the current user ID from the access token
+    user_id = get_jwt_identity()
+
+    # Get the request data
+    data, errors = validation.task_ids.load(request.get_json())
+    if not errors and len(data['ids']) > MAX_BATCH_SIZE:
+        errors = {'ids': [f'Batch size is limited to {MAX_BATCH_SIZE} tasks.']}
+    if errors:
+        return jsonify(errors), 400
+
+    return task_service.delete_tasks(user_id, data['ids'])
+
+
+def _load_batch(schema, data) -> Tuple[list, dict]:
+    # Validate the whole array at once, returning errors keyed by index
+    data, errors = schema.load(data)
+    if errors:
+        return data, errors
+
+    if not data:
+        return data, {'_schema': ['At least one task is required.']}
+    if len(data) > MAX_BATCH_SIZE:
+        return data, {'_schema': [f'Batch size is limited to {MAX_BATCH_SIZE} tasks.']}
+
+    return data, {}
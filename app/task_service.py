@@ -1,73 +1,619 @@
 # business logic for the task management service
+import codecs
+import csv
 import datetime
-from typing import Tuple
+import functools
+import io
+import itertools
+import uuid
+from typing import BinaryIO, Iterator, Optional, Tuple
 
-from flask import jsonify, Response
-
-from werkzeug.exceptions import NotFound
+from flask import current_app, jsonify, Response, stream_with_context
 
+from app import conditional
 from app import db
-from app.models import Task
+from app import group_commit
+from app import metrics
+from app import pagination
+from app import replica
+from app import validation
+from app.models import Task, TaskTombstone, TASK_COLUMNS, TASK_FIELDS, task_fts
+from app.socket_events import emit_import_progress, emit_task, emit_tasks_batch
 
+# Sort orders of the task lists, each backed by a (user_id, column) index. A `-`
+# prefix sorts in descending order, ties are broken by id in the same direction
+TASK_SORTS = {
+    'id': Task.id,
+    'created': Task.date_created,
+    'modified': Task.date_modified,
+}
 
-def create_task(user_id: int, data: dict) -> Tuple[Response, int]:
-    # Extract the title and description from the data
-    title = data.get('title')
-    description = data.get('description')
+# Date range filters of the task lists (exclusive bounds), backed by the same indexes
+TASK_FILTERS = {
+    'created_after': lambda value: Task.date_created > value,
+    'created_before': lambda value: Task.date_created < value,
+    'modified_after': lambda value: Task.date_modified > value,
+    'modified_before': lambda value: Task.date_modified < value,
+}
+
+# Fields returned when a list does not select any (`fields=id,title`)
+DEFAULT_TASK_FIELDS = tuple(TASK_FIELDS)
+
+# Content types of the export formats
+EXPORT_FORMATS = {
+    'ndjson': 'application/x-ndjson',
+    'csv': 'text/csv',
+}
+
+# Rows fetched from the cursor, and written to the response, at a time
+EXPORT_BATCH_SIZE = 1000
+
+EXPORT_CSV_HEADER = ('id', 'title', 'description', 'user_id', 'date_created', 'date_modified')
+
+# Rows validated and inserted per transaction by the import
+IMPORT_BATCH_SIZE = 1000
+
+# Bytes read from the request body at a time
+IMPORT_READ_SIZE = 64 * 1024
 
-    # Create a new Task object
-    task = Task(title=title, description=description, user_id=user_id)
+# Invalid rows listed in the import response, the rest are only counted
+IMPORT_MAX_ERRORS = 100
 
-    # Add the task to the database
-    task.save()
+# Fields kept from each imported record, the others (e.g. the `id` and dates of
+# an export) are ignored so exports can be imported as they are
+IMPORT_FIELDS = ('title', 'description')
 
-    return jsonify({'message': 'Task created', 'data': task.serialize()}), 201
+
+def create_task(user_id: int, data: dict) -> Tuple[Response, int]:
+    # Insert the task and read it back in a single INSERT ... RETURNING
+    stmt = db.insert(Task).values(title=data['title'], description=data['description'], user_id=user_id)
+    row = _write(user_id, lambda connection: connection.execute(stmt.returning(*TASK_COLUMNS)).first())
+
+    task = Task.serialize_row(row)
+    emit_task('task_created', task, user_id)
+
+    return jsonify({'message': 'Task created', 'data': task}), 201
 
 
 def update_task(user_id: int, task_id: int, data: dict) -> Tuple[Response, int]:
-    # Extract the title and description from the data
-    title = data.get('title')
-    description = data.get('description')
+    # Ownership check, update and result in a single UPDATE ... RETURNING
+    values = {'title': data['title'], 'description': data['description'], 'date_modified': datetime.datetime.now()}
+    stmt = db.update(Task).filter(Task.id == task_id, Task.user_id == user_id).values(values)
 
-    # Find the task in the database
-    task = db.session.execute(db.select(Task).filter_by(id=task_id, user_id=user_id)).scalar_one_or_none()
-    if not task:
+    row = _write(user_id, lambda connection: connection.execute(stmt.returning(*TASK_COLUMNS)).first())
+    if row is None:
         return jsonify({'message': 'Task not found'}), 404
 
-    # Update the task details
-    task.update(title=title, description=description)
+    task = Task.serialize_row(row)
+    emit_task('task_updated', task, user_id)
+
+    return jsonify({'message': 'Task updated', 'data': task}), 201
+
+
+def patch_task(user_id: int, task_id: int, data: dict) -> Tuple[Response, int]:
+    # Partial update writing only the given columns, and nothing at all when
+    # they already hold the given values (no new change sequence or event)
+    if not data:
+        return jsonify({'_schema': ['At least one field is required.']}), 400
+
+    stmt = (
+        db.update(Task)
+        .filter(Task.id == task_id, Task.user_id == user_id)
+        .filter(db.or_(*(getattr(Task, name).is_distinct_from(value) for name, value in data.items())))
+        .values({**data, 'date_modified': datetime.datetime.now()})
+    )
 
-    return jsonify({'message': 'Task updated', 'data': task.serialize()}), 201
+    row = _write(user_id, lambda connection: connection.execute(stmt.returning(*TASK_COLUMNS)).first())
+    if row is None:
+        # unchanged, or not the user's task
+        row = db.session.execute(db.select(*TASK_COLUMNS).filter(Task.id == task_id, Task.user_id == user_id)).first()
+        if row is None:
+            return jsonify({'message': 'Task not found'}), 404
 
+        return jsonify({'message': 'Task unchanged', 'data': Task.serialize_row(row)}), 200
+
+    task = Task.serialize_row(row)
+    emit_task('task_updated', task, user_id)
+
+    return jsonify({'message': 'Task updated', 'data': task}), 200
+
+
+def _write(user_id: int, operation: group_commit.Operation):
+    # Run a single task write (a function of the connection) and commit it, in
+    # the next group commit when enabled. Returns the operation's result
+    if group_commit.writer.enabled:
+        with metrics.phase('commit'):
+            result = group_commit.writer.submit(operation)
+    else:
+        result = operation(db.session.connection())
+        db.session.commit()
+
+    # the user's next reads see the write
+    replica.router.record_write(user_id)
+
+    return result
+
+
+def get_all_tasks(user_id: int, after: Optional[str] = None, limit: Optional[int] = None,
+                  page: int = 1, per_page: int = 10, filters: Optional[dict] = None,
+                  sort: str = 'id', fields: Optional[str] = None) -> Tuple[Response, int]:
+    try:
+        query = TaskListQuery(user_id, filters, sort, fields)
+    except ValueError as e:
+        return jsonify({'message': str(e)}), 400
+
+    # answer 304 from the user's change counter when the client's copy is current
+    change_seq, last_modified = get_tasks_version(user_id, query.session)
+    etag = conditional.make_etag('tasks', user_id, change_seq, after, limit, page, per_page, query.options)
+    if conditional.is_not_modified(etag, last_modified):
+        return conditional.not_modified(etag, last_modified)
+
+    # opt-in keyset pagination when a cursor or page size is supplied
+    if after is not None or limit is not None:
+        try:
+            result, next_cursor = query.page(after, limit)
+        except ValueError as e:
+            return jsonify({'message': str(e)}), 400
+
+        response = jsonify({'message': 'Success', 'data': result, 'next_cursor': next_cursor})
+
+        return conditional.add_validators(response, etag, last_modified), 200
 
-def get_all_tasks(user_id: int) -> Tuple[Response, int]:
     # get all task details created by 'user_id' and paginated
-    user_tasks = {}
+    result = query.offset_page(page, min(per_page, 10))
+    response = jsonify({'message': 'Success', 'data': result})
+
+    return conditional.add_validators(response, etag, last_modified), 200
+
+
+def get_tasks_version(user_id: int, session=None) -> Tuple[int, Optional[datetime.datetime]]:
+    # sequence and time of the latest change (including deletions) to the user's
+    # tasks, read from the (user_id, change_seq) indexes without loading the rows
+    session = session or db.session
+    task = session.execute(
+        db.select(Task.change_seq, Task.date_modified)
+        .filter(Task.user_id == user_id).order_by(Task.change_seq.desc()).limit(1)
+    ).first()
+    tombstone = session.execute(
+        db.select(TaskTombstone.change_seq, TaskTombstone.date_deleted)
+        .filter(TaskTombstone.user_id == user_id).order_by(TaskTombstone.change_seq.desc()).limit(1)
+    ).first()
+
+    latest = max((row for row in (task, tombstone) if row), key=lambda row: row[0], default=None)
+    if latest is None:
+        return 0, None
+
+    return latest[0], latest[1]
+
+
+def get_tasks_page(user_id: int, after: Optional[str], limit: Optional[int], filters: Optional[dict] = None,
+                   sort: str = 'id', fields: Optional[str] = None) -> Tuple[list, Optional[str]]:
+    # get a page of serialized tasks past the cursor, skipping the COUNT/OFFSET of
+    # page based listing
+    return TaskListQuery(user_id, filters, sort, fields).page(after, limit)
+
+
+class TaskListQuery:
+    """The user's tasks within the date `filters`, in `sort` order, limited to `fields`
+
+    Raises ValueError for unknown filters, sorts or fields and invalid dates.
+    """
+
+    def __init__(self, user_id: int, filters: Optional[dict] = None, sort: str = 'id', fields: Optional[str] = None):
+        filters = filters or {}
+        # the replica, unless the user just wrote
+        self.session = replica.router.session_for(user_id, db.session)
+        self.fields = _parse_fields(fields)
+        self.descending = isinstance(sort, str) and sort.startswith('-')
+        self.column = TASK_SORTS.get(sort[1:] if self.descending else sort) if isinstance(sort, str) else None
+        if self.column is None:
+            raise ValueError(f"Invalid sort, expected one of: {', '.join(TASK_SORTS)} (`-` prefix for descending)")
+
+        # the sort value and id follow the selected fields, for the cursor
+        stmt = (
+            db.select(*(TASK_FIELDS[name] for name in self.fields), self.column.label('sort_value'), Task.id.label('sort_id'))
+            .filter(Task.user_id == user_id)
+        )
+        for name, value in sorted(filters.items()):
+            if name not in TASK_FILTERS:
+                raise ValueError(f'Unknown filter: {name}')
+            stmt = stmt.filter(TASK_FILTERS[name](_parse_date(name, value)))
+
+        order = (Task.id,) if self.column is Task.id else (self.column, Task.id)
+        self.stmt = stmt.order_by(*(column.desc() if self.descending else column for column in order))
+
+        # what identifies the representation, for the ETag
+        self.options = (tuple(sorted(filters.items())), sort, self.fields)
+
+    def page(self, after: Optional[str], limit: Optional[int]) -> Tuple[list, Optional[str]]:
+        stmt = self.stmt
+        if after:
+            stmt = stmt.filter(self._past(pagination.decode_cursor(after)))
+
+        rows, next_cursor = pagination.fetch_page(self.session, stmt, pagination.clamp_limit(limit), key=self._key)
+
+        return [self.serialize(row) for row in rows], next_cursor
+
+    def offset_page(self, page: int, per_page: int) -> list:
+        return [self.serialize(row) for row in pagination.fetch_offset_page(self.session, self.stmt, page, per_page)]
+
+    def serialize(self, row) -> dict:
+        if self.fields == DEFAULT_TASK_FIELDS:
+            return Task.serialize_row(row)
+
+        return Task.serialize_fields(row, self.fields)
+
+    def _key(self, row) -> tuple:
+        # ID sorted cursors keep the `[id]` format of the plain listing
+        if self.column is Task.id:
+            return (row.sort_id,)
+
+        return (str(row.sort_value), row.sort_id)
+
+    def _past(self, values: list):
+        # condition selecting the rows after the cursor in the sort order
+        if self.column is Task.id:
+            if len(values) != 1 or not isinstance(values[0], int):
+                raise ValueError('Invalid cursor')
+            key, bound = Task.id, values[0]
+        else:
+            if len(values) != 2 or not isinstance(values[0], str) or not isinstance(values[1], int):
+                raise ValueError('Invalid cursor')
+            try:
+                value = datetime.datetime.fromisoformat(values[0])
+            except ValueError:
+                raise ValueError('Invalid cursor')
+            key, bound = db.tuple_(self.column, Task.id), db.tuple_(value, values[1])
+
+        return key < bound if self.descending else key > bound
+
+
+def _parse_fields(fields: Optional[str]) -> tuple:
+    # `id,title` -> ('id', 'title'), in the order given without duplicates
+    if not fields:
+        return DEFAULT_TASK_FIELDS
+
+    names = tuple(dict.fromkeys(name.strip() for name in fields.split(',') if name.strip())) if isinstance(fields, str) else ()
+    if not names or any(name not in TASK_FIELDS for name in names):
+        raise ValueError(f"Invalid fields, expected some of: {', '.join(TASK_FIELDS)}")
+
+    return names
+
+
+def _parse_date(name: str, value) -> datetime.datetime:
+    # ISO 8601 date or date and time, stored timestamps are naive local times
+    try:
+        date = datetime.datetime.fromisoformat(value)
+    except (TypeError, ValueError):
+        raise ValueError(f'Invalid {name}, expected an ISO 8601 date')
+
+    if date.tzinfo is not None:
+        date = date.astimezone().replace(tzinfo=None)
+
+    return date
+
+
+def get_task_changes(user_id: int, since: Optional[str], limit: Optional[int] = None) -> dict:
+    # get the tasks created/updated and the IDs deleted after the `since` watermark,
+    # ordered by change sequence so a partial page still yields a valid watermark
+    last_seq = 0
+    if since:
+        last_seq, = pagination.decode_cursor(since)
+        if not isinstance(last_seq, int):
+            raise ValueError('Invalid watermark')
+
+    limit = pagination.clamp_sync_limit(limit)
+
+    # the replica, unless the user just wrote
+    session = replica.router.session_for(user_id, db.session)
+    tasks = session.execute(
+        db.select(*TASK_COLUMNS, Task.change_seq)
+        .filter(Task.user_id == user_id, Task.change_seq > last_seq)
+        .order_by(Task.change_seq).limit(limit + 1)
+    ).all()
+    tombstones = session.execute(
+        db.select(TaskTombstone.task_id, TaskTombstone.change_seq)
+        .filter(TaskTombstone.user_id == user_id, TaskTombstone.change_seq > last_seq)
+        .order_by(TaskTombstone.change_seq).limit(limit + 1)
+    ).all()
+
+    # merge both streams by sequence and keep the first `limit` changes
+    changes = sorted(
+        [(row.change_seq, row) for row in tasks] + [(row.change_seq, row.task_id) for row in tombstones],
+        key=lambda change: change[0],
+    )
+    has_more = len(changes) > limit
+    changes = changes[:limit]
+
+    if changes:
+        last_seq = changes[-1][0]
+
+    return {
+        'updated': [Task.serialize_row(change) for _, change in changes if not isinstance(change, int)],
+        'deleted': [change for _, change in changes if isinstance(change, int)],
+        'watermark': pagination.encode_cursor((last_seq,)),
+        'has_more': has_more,
+    }
+
+
+def search_query(user_id: int, q: str) -> str:
+    # Build an FTS5 query matching every word of `q` in the title or description
+    # of the user's tasks, a trailing `*` makes a word match as a prefix. Words
+    # are quoted so the FTS syntax (operators, column filters) cannot be injected
+    words = []
+    for word in q.split():
+        prefix = word.endswith('*')
+        word = word.rstrip('*')
+        if word:
+            words.append('"' + word.replace('"', '""') + '"' + ('*' if prefix else ''))
+    if not words:
+        raise ValueError('Search query is required')
+
+    return f"owner:u{user_id} AND {{title description}}: ({' '.join(words)})"
+
+
+def search_tasks(user_id: int, q: str, after: Optional[str] = None, limit: Optional[int] = None) -> Tuple[Response, int]:
+    # search the user's tasks ordered by relevance, paginated by (rank, id)
+    try:
+        query = search_query(user_id, q or '')
+        limit = pagination.clamp_limit(limit)
+
+        # rank and page in the FTS table alone, joined to `task` afterwards,
+        # otherwise SQLite may scan `task` and evaluate the MATCH row by row
+        hits = db.select(task_fts.c.rowid, task_fts.c.rank).filter(task_fts.c.task_fts.match(query))
+        if after:
+            values = pagination.decode_cursor(after)
+            if len(values) != 2 or not isinstance(values[0], (int, float)) or not isinstance(values[1], int):
+                raise ValueError('Invalid cursor')
+            last_rank, last_id = values
+            hits = hits.filter(db.or_(
+                task_fts.c.rank > last_rank,
+                db.and_(task_fts.c.rank == last_rank, task_fts.c.rowid > last_id),
+            ))
+        hits = hits.order_by(task_fts.c.rank, task_fts.c.rowid).limit(limit + 1).subquery()
+
+        stmt = (
+            db.select(*TASK_COLUMNS, hits.c.rank)
+            .join(hits, hits.c.rowid == Task.id)
+            .order_by(hits.c.rank, Task.id)
+        )
+        rows, next_cursor = pagination.fetch_page(db.session, stmt, limit, key=lambda row: (row.rank, row.id))
+    except ValueError as e:
+        return jsonify({'message': str(e)}), 400
+
+    result = [Task.serialize_row(row) for row in rows]
+
+    return jsonify({'message': 'Success', 'data': result, 'next_cursor': next_cursor}), 200
+
+
+def export_tasks(user_id: int, format: str = 'ndjson') -> Tuple[Response, int]:
+    # stream all of the user's tasks, memory use does not depend on their number
+    mimetype = EXPORT_FORMATS.get(format)
+    if mimetype is None:
+        return jsonify({'message': f"Unsupported format, expected one of: {', '.join(EXPORT_FORMATS)}"}), 400
+
+    # `yield_per` fetches the rows in batches instead of buffering the result
+    stmt = (
+        db.select(*TASK_COLUMNS).filter(Task.user_id == user_id).order_by(Task.id)
+        .execution_options(yield_per=EXPORT_BATCH_SIZE)
+    )
+    write = _export_ndjson if format == 'ndjson' else _export_csv
+
+    # the request context keeps the session (and its cursor) open while streaming
+    response = Response(stream_with_context(write(db.session.execute(stmt).partitions())), mimetype=mimetype)
+    response.headers['Content-Disposition'] = f'attachment; filename=tasks.{format}'
+
+    return response, 200
+
+
+def _export_ndjson(batches) -> Iterator[str]:
+    dumps = current_app.json.dumps
+    for rows in batches:
+        yield ''.join(dumps(Task.serialize_row(row)) + '\n' for row in rows)
+
+
+def _export_csv(batches) -> Iterator[str]:
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+    writer.writerow(EXPORT_CSV_HEADER)
+    for rows in batches:
+        writer.writerows(Task.serialize_row(row).values() for row in rows)
+        yield buffer.getvalue()
+        buffer.seek(0)
+        buffer.truncate()
+
+    # header only when the user has no tasks
+    if buffer.tell():
+        yield buffer.getvalue()
+
+
+def import_tasks(user_id: int, stream: BinaryIO, format: str = 'ndjson') -> Tuple[Response, int]:
+    # insert the tasks of an NDJSON/CSV body while it is read, one transaction per
+    # batch. Invalid rows are skipped and reported by line number, progress is
+    # sent to the user's room instead of an event per task
+    if format not in EXPORT_FORMATS:
+        return jsonify({'message': f"Unsupported format, expected one of: {', '.join(EXPORT_FORMATS)}"}), 400
+
+    read = _import_ndjson if format == 'ndjson' else _import_csv
+    summary = {'id': uuid.uuid4().hex, 'status': 'running', 'rows': 0, 'imported': 0, 'failed': 0}
+    errors = []
+
     try:
-        user_tasks = db.paginate(db.select(Task).filter_by(user_id=user_id).order_by(Task.id), max_per_page=10)
-    except NotFound:
-        pass
+        records = read(_read_lines(stream))
+        while batch := list(itertools.islice(records, IMPORT_BATCH_SIZE)):
+            _import_batch(user_id, batch, summary, errors)
+            emit_import_progress(dict(summary), user_id)
+    except (UnicodeDecodeError, csv.Error) as e:
+        # the batches before the error stay imported
+        summary['status'] = 'failed'
+        emit_import_progress(dict(summary), user_id)
+        return jsonify({'message': f'Invalid {format} body: {e}', **summary, 'errors': errors}), 400
+
+    summary['status'] = 'done'
+    emit_import_progress(dict(summary), user_id)
+    if not summary['rows']:
+        return jsonify({'message': 'No tasks to import', **summary, 'errors': errors}), 400
+
+    return jsonify({'message': 'Tasks imported', **summary, 'errors': errors}), 201
 
-    result = [task.serialize() for task in user_tasks]
 
-    return jsonify({'message': 'Success', 'data': result}), 200
+def _read_lines(stream: BinaryIO) -> Iterator[str]:
+    # decode the body incrementally, splitting on '\n' only since JSON strings
+    # may contain the other line separators
+    pending = ''
+    for text in codecs.iterdecode(iter(functools.partial(stream.read, IMPORT_READ_SIZE), b''), 'utf-8'):
+        lines = (pending + text).split('\n')
+        pending = lines.pop()
+        for line in lines:
+            yield line + '\n'
+
+    if pending:
+        yield pending
+
+
+def _import_ndjson(lines: Iterator[str]) -> Iterator[tuple]:
+    # (line number, record or None when it is not valid JSON)
+    loads = current_app.json.loads
+    for number, line in enumerate(lines, 1):
+        if not line.strip():
+            continue
+        try:
+            yield number, loads(line)
+        except ValueError:
+            yield number, None
+
+
+def _import_csv(lines: Iterator[str]) -> Iterator[tuple]:
+    # (line number, record), the first line holds the column names
+    reader = csv.DictReader(lines)
+    for row in reader:
+        yield reader.line_num, row
+
+
+def _import_batch(user_id: int, batch: list, summary: dict, errors: list):
+    records = []
+    for number, record in batch:
+        if record is None:
+            _import_error(summary, errors, number, {'_schema': ['Invalid JSON.']})
+        elif isinstance(record, dict):
+            records.append((number, {key: record[key] for key in IMPORT_FIELDS if key in record}))
+        else:
+            records.append((number, record))
+    summary['rows'] += len(batch)
+
+    # validate the whole batch at once, errors are keyed by index
+    _, messages = validation.tasks.load([record for _, record in records])
+    now = datetime.datetime.now()
+    rows = []
+    for index, (number, record) in enumerate(records):
+        if index in messages:
+            _import_error(summary, errors, number, messages[index])
+        else:
+            rows.append({**record, 'user_id': user_id, 'date_created': now, 'date_modified': now})
+
+    if rows:
+        db.session.execute(db.insert(Task), rows)
+        db.session.commit()
+        replica.router.record_write(user_id)
+        summary['imported'] += len(rows)
+
+
+def _import_error(summary: dict, errors: list, line: int, messages: dict):
+    summary['failed'] += 1
+    if len(errors) < IMPORT_MAX_ERRORS:
+        errors.append({'line': line, 'errors': messages})
 
 
 def get_task(user_id: int, task_id: int) -> Tuple[Response, int]:
-    # get task details by ID
-    task = db.session.execute(db.select(Task).filter_by(id=task_id, user_id=user_id)).scalar_one_or_none()
-    if not task:
+    # get task details by ID, from the replica unless the user just wrote
+    row = replica.router.session_for(user_id, db.session).execute(
+        db.select(*TASK_COLUMNS, Task.change_seq).filter(Task.id == task_id, Task.user_id == user_id)
+    ).first()
+    if not row:
         return jsonify({'message': 'Task not found'}), 404
 
-    return jsonify({'message': 'Task found', 'data': task.serialize()}), 200
+    # every change to the task bumps its change sequence
+    etag = conditional.make_etag('task', row.id, row.change_seq)
+    if conditional.is_not_modified(etag, row.date_modified):
+        return conditional.not_modified(etag, row.date_modified)
+
+    response = jsonify({'message': 'Task found', 'data': Task.serialize_row(row)})
+
+    return conditional.add_validators(response, etag, row.date_modified), 200
 
 
 def delete_task(user_id: int, task_id: int) -> Tuple[Response, int]:
-    # get task details by ID
-    task = db.session.execute(db.select(Task).filter_by(id=task_id, user_id=user_id)).scalar_one_or_none()
-    if not task:
+    # Ownership check and delete in a single DELETE ... RETURNING
+    stmt = db.delete(Task).filter(Task.id == task_id, Task.user_id == user_id).returning(*TASK_COLUMNS)
+
+    row = _write(user_id, lambda connection: connection.execute(stmt).first())
+    if row is None:
         return jsonify({'message': 'Task not found'}), 404
 
-    task.delete()
+    emit_task('task_removed', Task.serialize_row(row), user_id)
 
     return jsonify({'message': 'Task removed'}), 204
+
+
+def create_tasks(user_id: int, data: list) -> Tuple[Response, int]:
+    # Insert all the tasks with a single executemany in one transaction
+    rows = [
+        {'title': item['title'], 'description': item['description'], 'user_id': user_id}
+        for item in data
+    ]
+    tasks = db.session.scalars(db.insert(Task).returning(Task), rows).all()
+
+    # serialize before the commit expires the loaded attributes
+    result = [task.serialize() for task in tasks]
+    db.session.commit()
+    replica.router.record_write(user_id)
+
+    emit_tasks_batch('created', result, user_id)
+
+    return jsonify({'message': 'Tasks created', 'data': result}), 201
+
+
+def update_tasks(user_id: int, data: list) -> Tuple[Response, int]:
+    # All tasks must belong to the user, otherwise nothing is updated
+    task_ids = {item['id'] for item in data}
+    found = set(db.session.scalars(db.select(Task.id).filter(Task.user_id == user_id, Task.id.in_(task_ids))))
+    missing = sorted(task_ids - found)
+    if missing:
+        return jsonify({'message': 'Task not found', 'ids': missing}), 404
+
+    # Bulk update by primary key, executed as a single executemany
+    now = datetime.datetime.now()
+    rows = [
+        {'id': item['id'], 'title': item['title'], 'description': item['description'], 'date_modified': now}
+        for item in data
+    ]
+    db.session.execute(db.update(Task), rows)
+
+    tasks = db.session.scalars(db.select(Task).filter(Task.id.in_(task_ids)).order_by(Task.id))
+    result = [task.serialize() for task in tasks]
+    db.session.commit()
+    replica.router.record_write(user_id)
+
+    emit_tasks_batch('updated', result, user_id)
+
+    return jsonify({'message': 'Tasks updated', 'data': result}), 200
+
+
+def delete_tasks(user_id: int, task_ids: list) -> Tuple[Response, int]:
+    # Delete in one statement, rolling back if any of the tasks is not the user's
+    task_ids = set(task_ids)
+    stmt = db.delete(Task).filter(Task.user_id == user_id, Task.id.in_(task_ids)).returning(Task.id)
+    deleted = set(db.session.scalars(stmt))
+
+    missing = sorted(task_ids - deleted)
+    if missing:
+        db.session.rollback()
+        return jsonify({'message': 'Task not found', 'ids': missing}), 404
+
+    db.session.commit()
+    replica.router.record_write(user_id)
+
+    result = sorted(deleted)
+    emit_tasks_batch('removed', [{'id': task_id} for task_id in result], user_id)
+
+    return jsonify({'message': 'Tasks removed', 'data': result}), 200
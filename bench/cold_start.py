@@ -0,0 +1,69 @@
+# Cold start of a worker: importing and creating the app, the first request
+# and the first `/apispec_1.json`, with the spec built from the docstrings
+# versus precomputed with `python -m app.apidocs build`
+#
+# Every run is a fresh interpreter, as a new server worker or CLI invocation.
+#
+# Usage: python -m bench.cold_start [--runs 5]
+import argparse
+import json
+import os
+import subprocess
+import sys
+import tempfile
+import time
+
+
+def child() -> dict:
+    # runs in a fresh process, configured from the environment
+    start = time.perf_counter()
+    from app import app
+    created = time.perf_counter()
+
+    client = app.test_client()
+    assert client.get('/health').status_code == 200
+    first_request = time.perf_counter()
+
+    modules = len(sys.modules)
+    assert client.get('/apispec_1.json').status_code == 200
+    apispec = time.perf_counter()
+
+    return {
+        'create_ms': (created - start) * 1000,
+        'first_request_ms': (first_request - created) * 1000,
+        'apispec_ms': (apispec - first_request) * 1000,
+        'modules': modules,
+    }
+
+
+def run(env: dict, runs: int) -> dict:
+    results = []
+    for _ in range(runs):
+        output = subprocess.run([sys.executable, '-m', 'bench.cold_start', '--child'],
+                                env=env, check=True, capture_output=True, text=True).stdout
+        results.append(json.loads(output.splitlines()[-1]))
+
+    # medians, the first run also pays for cold OS file caches
+    return {key: sorted(result[key] for result in results)[runs // 2] for key in results[0]}
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--runs', type=int, default=5, help='processes per configuration, the median is shown')
+    parser.add_argument('--child', action='store_true', help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.child:
+        print(json.dumps(child()))
+        sys.exit()
+
+    with tempfile.TemporaryDirectory() as directory:
+        env = dict(os.environ, FLASK_SQLALCHEMY_DATABASE_URI=f"sqlite:///{os.path.join(directory, 'bench.db')}")
+        spec = os.path.join(directory, 'swagger.json')
+        subprocess.run([sys.executable, '-m', 'app.apidocs', 'build', spec], env=env, check=True)
+
+        print(f"{'spec':<14}{'create ms':>11}{'first request ms':>18}{'apispec ms':>12}{'modules':>9}")
+        for name, extra in (('docstrings', {}), ('precomputed', {'FLASK_SWAGGER_SPEC_FILE': spec})):
+            r = run(dict(env, **extra), args.runs)
+            print(f"{name:<14}{r['create_ms']:>11.1f}{r['first_request_ms']:>18.1f}{r['apispec_ms']:>12.1f}"
+                  f"{r['modules']:>9}", flush=True)
@@ -0,0 +1,61 @@
+# Polling cost of the task reads with and without conditional requests
+#
+# Usage: python -m bench.conditional_get [--tasks 1000] [--repeat 500]
+import argparse
+import os
+import tempfile
+import time
+
+_directory = tempfile.TemporaryDirectory()
+os.environ.setdefault('FLASK_SQLALCHEMY_DATABASE_URI', f"sqlite:///{os.path.join(_directory.name, 'bench.db')}")
+os.environ.setdefault('FLASK_PASSWORD_HASH_EXECUTOR', 'inline')
+
+from app import app, db  # noqa: E402
+from app.models import Task  # noqa: E402
+
+USER = {'username': 'bench_user', 'email': 'bench@bench.local', 'password': 'bench_password'}
+
+PATHS = {
+    'get_all_tasks': '/api/v1/tasks?page=1&per_page=10',
+    'get_all_tasks_cursor': '/api/v1/tasks?limit=100',
+    'get_task': '/api/v1/tasks/1',
+}
+
+
+def poll(client, path: str, headers: dict, repeat: int):
+    start = time.perf_counter()
+    for _ in range(repeat):
+        response = client.get(path, headers=headers)
+    elapsed = (time.perf_counter() - start) / repeat * 1000
+
+    return elapsed, response.status_code, len(response.get_data())
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--tasks', type=int, default=1000)
+    parser.add_argument('--repeat', type=int, default=500)
+    args = parser.parse_args()
+
+    with app.app_context():
+        db.create_all()
+    client = app.test_client()
+    client.post('/api/v1/auth/register', json=USER)
+    token = client.post('/api/v1/auth/login', json={'username': USER['username'], 'password': USER['password']}).json['access_token']
+    headers = {'Authorization': f'Bearer {token}'}
+
+    with app.app_context():
+        db.session.execute(db.insert(Task), [
+            {'title': f'Task {i}', 'description': 'Benchmark task description', 'user_id': 1}
+            for i in range(args.tasks)
+        ])
+        db.session.commit()
+
+    print(f'{args.tasks} tasks, mean of {args.repeat} polls')
+    print(f"{'endpoint':<24}{'full ms':>10}{'bytes':>8}{'304 ms':>10}{'bytes':>8}{'speedup':>10}")
+    for name, path in PATHS.items():
+        etag = client.get(path, headers=headers).headers['ETag']
+        full, status, size = poll(client, path, headers, args.repeat)
+        conditional, status_304, size_304 = poll(client, path, {**headers, 'If-None-Match': etag}, args.repeat)
+        assert (status, status_304) == (200, 304)
+        print(f'{name:<24}{full:>10.3f}{size:>8}{conditional:>10.3f}{size_304:>8}{full / conditional:>9.1f}x')
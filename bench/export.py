@@ -0,0 +1,135 @@
+# Exporting all of a user's tasks: the paginated list (offset pages, keyset
+# pages) versus the streaming NDJSON/CSV export
+#
+# Every run is a fresh process reading a seeded database, the peak RSS growth is
+# its high water mark minus its RSS before the first request. RSS includes the
+# pages SQLite maps or caches (bounded by `mmap_size`/`cache_size`), so a second
+# pass reports the peak of the Python heap alone with tracemalloc.
+#
+# Usage: python -m bench.export [--sizes 10000,100000,1000000] [--methods pages,cursor,ndjson,csv]
+import argparse
+import json
+import os
+import subprocess
+import sys
+import tempfile
+import time
+import tracemalloc
+from datetime import datetime
+
+# offset pages are capped at 10 tasks and re-count the tasks on every page,
+# they are skipped for larger sizes (quadratic)
+PAGES_MAX_SIZE = 10000
+
+
+def memory_kb(field: str) -> int:
+    with open('/proc/self/status') as f:
+        return next(int(line.split()[1]) for line in f if line.startswith(field))
+
+
+def seed(path: str, size: int):
+    from sqlalchemy import create_engine, insert
+
+    from app import db
+    from app.models import Task, User
+
+    engine = create_engine(f'sqlite:///{path}')
+    db.metadata.create_all(engine)
+    now = datetime.now()
+    with engine.begin() as connection:
+        connection.execute(insert(User), [{'id': 1, 'username': 'bench_user', 'email': 'bench@bench.local', 'password': 'x'}])
+        chunk = 50_000
+        for start in range(0, size, chunk):
+            connection.execute(insert(Task), [
+                {'title': f'Task {i}', 'description': 'Benchmark task description ' * 4, 'user_id': 1,
+                 'date_created': now, 'date_modified': now}
+                for i in range(start, min(start + chunk, size))
+            ])
+    engine.dispose()
+
+
+def export(client, headers: dict, method: str) -> tuple:
+    rows = requests = 0
+    if method == 'pages':
+        page = 1
+        while True:
+            data = client.get(f'/api/v1/tasks?page={page}&per_page=10', headers=headers).get_json()['data']
+            requests += 1
+            if not data:
+                break
+            rows += len(data)
+            page += 1
+    elif method == 'cursor':
+        after = ''
+        while after is not None:
+            body = client.get(f'/api/v1/tasks?limit=100&after={after}', headers=headers).get_json()
+            requests += 1
+            rows += len(body['data'])
+            after = body['next_cursor']
+    else:
+        # consume the stream chunk by chunk, as a client writing it to disk
+        response = client.get(f'/api/v1/tasks/export?format={method}', headers=headers, buffered=False)
+        requests += 1
+        for chunk in response.response:
+            rows += chunk.count(b'\n')
+        response.close()
+        if method == 'csv':
+            rows -= 1
+
+    return rows, requests
+
+
+def child(method: str) -> dict:
+    # runs in a fresh process, against the database from the environment
+    from flask_jwt_extended import create_access_token
+
+    from app import app
+
+    client = app.test_client()
+    with app.app_context():
+        headers = {'Authorization': f'Bearer {create_access_token(identity=1)}'}
+    client.get('/api/v1/tasks?limit=1', headers=headers)
+
+    rss = memory_kb('VmRSS')
+    start = time.perf_counter()
+    rows, requests = export(client, headers, method)
+    seconds = time.perf_counter() - start
+    growth_mb = (memory_kb('VmHWM') - rss) / 1024
+
+    tracemalloc.start()
+    export(client, headers, method)
+    heap_mb = tracemalloc.get_traced_memory()[1] / 1024 / 1024
+
+    return {'rows': rows, 'requests': requests, 'seconds': seconds, 'growth_mb': growth_mb, 'heap_mb': heap_mb}
+
+
+def run(path: str, method: str) -> dict:
+    env = dict(os.environ, FLASK_SQLALCHEMY_DATABASE_URI=f'sqlite:///{path}')
+    output = subprocess.run([sys.executable, '-m', 'bench.export', '--child', method], env=env,
+                            check=True, capture_output=True, text=True).stdout
+
+    return json.loads(output.splitlines()[-1])
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--sizes', default='10000,100000,1000000')
+    parser.add_argument('--methods', default='pages,cursor,ndjson,csv')
+    parser.add_argument('--child', help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.child:
+        print(json.dumps(child(args.child)))
+        sys.exit()
+
+    print(f"{'tasks':>9}  {'method':<8}{'rows':>9}{'requests':>10}{'seconds':>9}{'rows/s':>10}{'peak RSS +MB':>14}{'peak heap MB':>14}")
+    for size in map(int, args.sizes.split(',')):
+        with tempfile.TemporaryDirectory() as directory:
+            path = os.path.join(directory, 'bench.db')
+            seed(path, size)
+            for method in args.methods.split(','):
+                if method == 'pages' and size > PAGES_MAX_SIZE:
+                    continue
+                r = run(path, method)
+                print(f"{size:>9}  {method:<8}{r['rows']:>9}{r['requests']:>10}{r['seconds']:>9.2f}"
+                      f"{r['rows'] / r['seconds']:>10.0f}{r['growth_mb']:>14.1f}{r['heap_mb']:>14.1f}", flush=True)
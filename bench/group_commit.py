@@ -0,0 +1,116 @@
+# Task creation by concurrent writers with a commit per request versus group
+# commits, for each SQLite storage profile
+#
+# Every configuration runs in a fresh process against an empty database, the
+# writers are threads sending `POST /api/v1/tasks` through the test client. The
+# `default` profile fsyncs every commit (rollback journal), `tuned` only at WAL
+# checkpoints.
+#
+# Usage: python -m bench.group_commit [--writers 50] [--tasks 100] [--profiles default,tuned] [--windows 0,2]
+import argparse
+import json
+import os
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+
+TASK = {'title': 'Benchmark task', 'description': 'Benchmark task description'}
+
+
+def percentile(values: list, fraction: float) -> float:
+    if not values:
+        return 0.0
+
+    values = sorted(values)
+    return values[min(int(len(values) * fraction), len(values) - 1)]
+
+
+def child(writers: int, tasks: int) -> dict:
+    # runs in a fresh process, configured from the environment
+    from flask_jwt_extended import create_access_token
+
+    from app import app, db
+    from app.migrations import create_schema
+    from app.models import User
+
+    create_schema()
+    with app.app_context():
+        db.session.add(User(username='bench_user', email='bench@bench.local', password='x'))
+        db.session.commit()
+        headers = {'Authorization': f'Bearer {create_access_token(identity=1)}'}
+
+    client = app.test_client()
+    latencies = []
+    errors = []
+    barrier = threading.Barrier(writers + 1)
+
+    def write():
+        times = []
+        barrier.wait()
+        for _ in range(tasks):
+            start = time.perf_counter()
+            response = client.post('/api/v1/tasks', json=TASK, headers=headers)
+            times.append(time.perf_counter() - start)
+            if response.status_code != 201:
+                errors.append(response.status_code)
+        latencies.extend(times)
+
+    threads = [threading.Thread(target=write) for _ in range(writers)]
+    for thread in threads:
+        thread.start()
+    barrier.wait()
+    start = time.perf_counter()
+    for thread in threads:
+        thread.join()
+    seconds = time.perf_counter() - start
+
+    with app.app_context():
+        count = db.session.execute(db.text('SELECT count(*) FROM task')).scalar()
+    assert count == writers * tasks and not errors, (count, errors[:10])
+
+    return {
+        'seconds': seconds,
+        'p50_ms': percentile(latencies, 0.5) * 1000,
+        'p99_ms': percentile(latencies, 0.99) * 1000,
+        'stats': app.extensions['group_commit'].stats(),
+    }
+
+
+def run(profile: str, window, writers: int, tasks: int) -> dict:
+    # `window` None commits per request
+    with tempfile.TemporaryDirectory() as directory:
+        env = dict(os.environ, FLASK_SQLALCHEMY_DATABASE_URI=f"sqlite:///{os.path.join(directory, 'bench.db')}",
+                   FLASK_SQLITE_PROFILE=profile, FLASK_GROUP_COMMIT_ENABLED='true' if window is not None else 'false',
+                   FLASK_GROUP_COMMIT_WINDOW_MS=str(window or 0), FLASK_SOCKET_EVENT_WINDOW_MS='0')
+        output = subprocess.run(
+            [sys.executable, '-m', 'bench.group_commit', '--child', '--writers', str(writers), '--tasks', str(tasks)],
+            env=env, check=True, capture_output=True, text=True,
+        ).stdout
+
+    return json.loads(output.splitlines()[-1])
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--writers', type=int, default=50)
+    parser.add_argument('--tasks', type=int, default=100, help='tasks created by each writer')
+    parser.add_argument('--profiles', default='default,tuned')
+    parser.add_argument('--windows', default='0,2', help='group commit windows in ms')
+    parser.add_argument('--child', action='store_true', help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.child:
+        print(json.dumps(child(args.writers, args.tasks)))
+        sys.exit()
+
+    print(f'{args.writers} writers, {args.tasks} tasks each')
+    print(f"{'profile':<9}{'commit':<16}{'writes/s':>10}{'p50 ms':>9}{'p99 ms':>9}{'batch mean':>12}{'batch max':>11}{'wait ms':>9}")
+    for profile in args.profiles.split(','):
+        for window in [None] + [float(window) for window in args.windows.split(',')]:
+            r = run(profile, window, args.writers, args.tasks)
+            stats = r['stats']
+            name = 'per request' if window is None else f'group {window:g} ms'
+            print(f"{profile:<9}{name:<16}{args.writers * args.tasks / r['seconds']:>10.0f}{r['p50_ms']:>9.2f}{r['p99_ms']:>9.2f}"
+                  f"{stats['mean_batch_size']:>12.1f}{stats['largest_batch']:>11}{stats['mean_wait_ms']:>9.2f}", flush=True)
@@ -0,0 +1,288 @@
+# Load generation over the REST endpoints and socket events
+#
+# `run` seeds a dataset, drives the Flask test client and the Socket.IO test
+# client from concurrent threads for a fixed duration and writes the latency
+# percentiles and throughput of every endpoint and socket event as JSON.
+# `compare` reports the differences between two result files and exits with a
+# non-zero status when a metric regressed by more than the threshold.
+#
+# Usage: python -m bench.harness run [--users 10] [--tasks 200] [--clients 4] [--sockets 2]
+#                                    [--duration 10] [--output results.json]
+#        python -m bench.harness compare baseline.json results.json [--threshold 0.1]
+import argparse
+import json
+import os
+import platform
+import random
+import sqlite3
+import sys
+import tempfile
+import threading
+import time
+from collections import defaultdict
+from datetime import datetime
+
+PASSWORD = 'bench_password'
+
+# relative weight of each REST operation in the request mix
+REST_MIX = {
+    'get_all_tasks': 30,
+    'get_tasks_cursor': 20,
+    'get_task': 20,
+    'search_tasks': 10,
+    'create_task': 10,
+    'update_task': 8,
+    'login': 2,
+}
+
+# metrics compared by `compare`, with the direction that counts as worse
+HIGHER_IS_WORSE = ('p50_ms', 'p95_ms', 'p99_ms')
+LOWER_IS_WORSE = ('throughput',)
+
+
+class Recorder:
+    """Thread safe collection of latencies and errors per metric name"""
+
+    def __init__(self):
+        self.latencies = defaultdict(list)
+        self.errors = defaultdict(int)
+        self._lock = threading.Lock()
+
+    def add(self, name: str, seconds: float, ok: bool = True):
+        with self._lock:
+            self.latencies[name].append(seconds)
+            if not ok:
+                self.errors[name] += 1
+
+    def summary(self, duration: float) -> dict:
+        return {
+            name: {
+                'count': len(values),
+                'errors': self.errors[name],
+                'throughput': len(values) / duration,
+                'mean_ms': sum(values) / len(values) * 1000,
+                'p50_ms': percentile(values, 0.50) * 1000,
+                'p95_ms': percentile(values, 0.95) * 1000,
+                'p99_ms': percentile(values, 0.99) * 1000,
+            }
+            for name, values in sorted(self.latencies.items()) if values
+        }
+
+
+def percentile(values: list, q: float) -> float:
+    values = sorted(values)
+    return values[min(len(values) - 1, int(len(values) * q))] if values else float('nan')
+
+
+def seed(app, db, users: int, tasks: int) -> list:
+    # users share one password hash so seeding does not pay for `users` hashes
+    from app import hashing
+    from app.models import Task, User
+
+    with app.app_context():
+        db.create_all()
+        password = hashing.hash_password(PASSWORD)
+        db.session.execute(db.insert(User), [
+            {'id': i, 'username': f'bench_user_{i}', 'email': f'bench_{i}@bench.local', 'password': password}
+            for i in range(1, users + 1)
+        ])
+        rng = random.Random(42)
+        words = ['report', 'groceries', 'meeting', 'invoice', 'garden', 'release', 'dentist', 'travel']
+        db.session.execute(db.insert(Task), [
+            {
+                'title': f'{rng.choice(words)} {i}',
+                'description': ' '.join(rng.choice(words) for _ in range(8)),
+                'user_id': user_id,
+            }
+            for user_id in range(1, users + 1) for i in range(tasks)
+        ])
+        db.session.commit()
+
+    return [f'bench_user_{i}' for i in range(1, users + 1)]
+
+
+def rest_worker(app, username: str, recorder: Recorder, sent: dict, stop: threading.Event, seed_value: int):
+    client = app.test_client()
+    rng = random.Random(seed_value)
+    credentials = {'username': username, 'password': PASSWORD}
+    headers = {'Authorization': f"Bearer {client.post('/api/v1/auth/login', json=credentials).json['access_token']}"}
+    task_ids = [task['id'] for task in client.get('/api/v1/tasks?limit=100', headers=headers).json['data']]
+    names, weights = zip(*REST_MIX.items())
+    counter = 0
+
+    while not stop.is_set():
+        name = rng.choices(names, weights)[0]
+        counter += 1
+        start = time.perf_counter()
+
+        if name == 'login':
+            response = client.post('/api/v1/auth/login', json=credentials)
+        elif name == 'get_all_tasks':
+            response = client.get(f'/api/v1/tasks?page={rng.randint(1, 5)}', headers=headers)
+        elif name == 'get_tasks_cursor':
+            response = client.get('/api/v1/tasks?limit=20', headers=headers)
+        elif name == 'get_task':
+            response = client.get(f'/api/v1/tasks/{rng.choice(task_ids)}', headers=headers)
+        elif name == 'search_tasks':
+            response = client.get(f"/api/v1/tasks/search?q={rng.choice(['report', 'meeting', 'gard*'])}", headers=headers)
+        elif name == 'update_task':
+            data = {'title': f'updated {counter}', 'description': 'Updated by the benchmark harness'}
+            response = client.put(f'/api/v1/tasks/{rng.choice(task_ids)}', json=data, headers=headers)
+        else:
+            title = f'{username} task {counter}'
+            sent[title] = start
+            response = client.post('/api/v1/tasks', json={'title': title, 'description': 'Created by the benchmark harness'}, headers=headers)
+
+        recorder.add(f'rest.{name}', time.perf_counter() - start, response.status_code < 400)
+
+
+def socket_worker(app, socketio, token: str, recorder: Recorder, stop: threading.Event):
+    client = socketio.test_client(app, query_string=f'token={token}')
+    watermark = None
+
+    while not stop.is_set():
+        # handlers run synchronously in the test client, so the reply is
+        # queued by the time `emit` returns
+        for name, event, data in (
+            ('get_tasks', 'tasks', {'limit': 20}),
+            ('get_tasks_delta', 'tasks_delta', {'since': watermark} if watermark else {'since': ''}),
+        ):
+            start = time.perf_counter()
+            client.emit('get_tasks', data)
+            replies = [message for message in client.get_received() if message['name'] in (event, 'tasks_error')]
+            ok = bool(replies) and replies[-1]['name'] == event
+            recorder.add(f'socket.{name}', time.perf_counter() - start, ok)
+            if ok and event == 'tasks_delta':
+                watermark = replies[-1]['args'][0]['watermark']
+
+    client.disconnect()
+
+
+def listener(app, socketio, tokens: list, recorder: Recorder, sent: dict, stop: threading.Event):
+    # one client per user in its room, timing the `task_created` fan-out from
+    # the start of the create request to the arrival of the (coalesced) event
+    clients = [socketio.test_client(app, query_string=f'token={token}') for token in tokens]
+
+    def created(messages):
+        for message in messages:
+            if message['name'] == 'task_created':
+                yield message['args'][0]
+            elif message['name'] == 'task_events':
+                yield from (item['data'] for item in message['args'][0] if item['event'] == 'task_created')
+
+    while not stop.is_set():
+        for client in clients:
+            received = client.get_received()
+            now = time.perf_counter()
+            for task in created(received):
+                if task['title'] in sent:
+                    recorder.add('socket.task_created', now - sent[task['title']])
+        time.sleep(0.002)
+
+    for client in clients:
+        client.disconnect()
+
+
+def run(args):
+    directory = tempfile.mkdtemp()
+    os.environ.setdefault('FLASK_SQLALCHEMY_DATABASE_URI', f"sqlite:///{os.path.join(directory, 'bench.db')}")
+
+    from app import app, db
+
+    socketio = app.extensions['socketio']
+
+    usernames = seed(app, db, args.users, args.tasks)
+    tokens = [
+        app.test_client().post('/api/v1/auth/login', json={'username': username, 'password': PASSWORD}).json['access_token']
+        for username in usernames
+    ]
+
+    recorder = Recorder()
+    sent = {}
+    stop = threading.Event()
+    threads = [threading.Thread(target=listener, args=(app, socketio, tokens, recorder, sent, stop))]
+    threads += [
+        threading.Thread(target=rest_worker, args=(app, usernames[i % len(usernames)], recorder, sent, stop, i))
+        for i in range(args.clients)
+    ]
+    threads += [
+        threading.Thread(target=socket_worker, args=(app, socketio, tokens[i % len(tokens)], recorder, stop))
+        for i in range(args.sockets)
+    ]
+
+    start = time.perf_counter()
+    for thread in threads:
+        thread.start()
+    time.sleep(args.duration)
+    stop.set()
+    for thread in threads:
+        thread.join()
+    duration = time.perf_counter() - start
+
+    results = {
+        'meta': {
+            'date': datetime.now().isoformat(timespec='seconds'),
+            'python': platform.python_version(),
+            'sqlite': sqlite3.sqlite_version,
+            'duration': duration,
+            **{name: getattr(args, name) for name in ('users', 'tasks', 'clients', 'sockets')},
+        },
+        'results': recorder.summary(duration),
+    }
+
+    print(f"{'metric':<26}{'count':>8}{'errors':>8}{'req/s':>10}{'p50 ms':>10}{'p95 ms':>10}{'p99 ms':>10}")
+    for name, result in results['results'].items():
+        print(f"{name:<26}{result['count']:>8}{result['errors']:>8}{result['throughput']:>10.1f}"
+              f"{result['p50_ms']:>10.2f}{result['p95_ms']:>10.2f}{result['p99_ms']:>10.2f}")
+
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump(results, f, indent=2)
+        print(f'results written to {args.output}')
+
+
+def compare(args) -> int:
+    with open(args.baseline) as f:
+        baseline = json.load(f)['results']
+    with open(args.current) as f:
+        current = json.load(f)['results']
+
+    regressions = 0
+    print(f"{'metric':<26}{'value':<12}{'baseline':>10}{'current':>10}{'change':>9}")
+    for name in sorted(baseline.keys() & current.keys()):
+        for key in HIGHER_IS_WORSE + LOWER_IS_WORSE:
+            before, after = baseline[name][key], current[name][key]
+            change = (after - before) / before if before else 0.0
+            worse = change > args.threshold if key in HIGHER_IS_WORSE else change < -args.threshold
+            regressions += worse
+            print(f"{name:<26}{key:<12}{before:>10.2f}{after:>10.2f}{change:>+8.0%}{'  REGRESSION' if worse else ''}")
+
+    for name in sorted(baseline.keys() ^ current.keys()):
+        print(f"{name:<26}only in {'baseline' if name in baseline else 'current'}")
+
+    print(f'{regressions} regression(s) above {args.threshold:.0%}')
+    return 1 if regressions else 0
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    commands = parser.add_subparsers(dest='command', required=True)
+
+    run_parser = commands.add_parser('run', help='seed a database and generate load')
+    run_parser.add_argument('--users', type=int, default=10)
+    run_parser.add_argument('--tasks', type=int, default=200, help='tasks seeded per user')
+    run_parser.add_argument('--clients', type=int, default=4, help='concurrent REST clients')
+    run_parser.add_argument('--sockets', type=int, default=2, help='concurrent socket clients')
+    run_parser.add_argument('--duration', type=float, default=10, help='seconds')
+    run_parser.add_argument('--output', help='JSON results file')
+
+    compare_parser = commands.add_parser('compare', help='compare two results files')
+    compare_parser.add_argument('baseline')
+    compare_parser.add_argument('current')
+    compare_parser.add_argument('--threshold', type=float, default=0.1, help='relative change flagged as a regression')
+
+    args = parser.parse_args()
+    if args.command == 'run':
+        run(args)
+    else:
+        sys.exit(compare(args))
@@ -0,0 +1,107 @@
+# Loading tasks into an account: one POST per task, POST /batch, and the
+# streaming NDJSON/CSV import
+#
+# Every method runs in a fresh process against an empty database. One POST per
+# task is too slow for the full size, it runs on a sample and the time for all
+# the rows is extrapolated.
+#
+# Usage: python -m bench.import_tasks [--rows 100000] [--methods single,batch,ndjson,csv] [--sample 2000]
+import argparse
+import csv
+import io
+import json
+import os
+import subprocess
+import sys
+import tempfile
+import time
+
+USER = {'username': 'bench_user', 'email': 'bench@bench.local', 'password': 'bench_password'}
+
+# the largest batch accepted by POST /api/v1/tasks/batch
+BATCH_SIZE = 5000
+
+
+def tasks(count: int) -> list:
+    return [{'title': f'Task {i}', 'description': f'Imported benchmark task description {i}'} for i in range(count)]
+
+
+def load(client, headers: dict, method: str, rows: int, sample: int) -> int:
+    # returns the number of tasks sent
+    if method == 'single':
+        for task in tasks(min(rows, sample)):
+            client.post('/api/v1/tasks', json=task, headers=headers)
+        return min(rows, sample)
+
+    if method == 'batch':
+        data = tasks(rows)
+        for start in range(0, rows, BATCH_SIZE):
+            client.post('/api/v1/tasks/batch', json=data[start:start + BATCH_SIZE], headers=headers)
+        return rows
+
+    if method == 'ndjson':
+        body = ''.join(json.dumps(task) + '\n' for task in tasks(rows))
+    else:
+        buffer = io.StringIO()
+        writer = csv.DictWriter(buffer, ('title', 'description'))
+        writer.writeheader()
+        writer.writerows(tasks(rows))
+        body = buffer.getvalue()
+
+    response = client.post(f'/api/v1/tasks/import?format={method}', data=body.encode(), headers=headers)
+    assert response.json['imported'] == rows, response.json
+
+    return rows
+
+
+def child(method: str, rows: int, sample: int) -> dict:
+    # runs in a fresh process, against the database from the environment
+    from app import app, db
+    from app.migrations import create_schema
+
+    create_schema()
+    client = app.test_client()
+    client.post('/api/v1/auth/register', json=USER)
+    token = client.post('/api/v1/auth/login', json={'username': USER['username'], 'password': USER['password']}).json['access_token']
+    headers = {'Authorization': f'Bearer {token}'}
+
+    start = time.perf_counter()
+    sent = load(client, headers, method, rows, sample)
+    seconds = time.perf_counter() - start
+
+    with app.app_context():
+        count = db.session.execute(db.text('SELECT count(*) FROM task')).scalar()
+    assert count == sent, (count, sent)
+
+    return {'sent': sent, 'seconds': seconds}
+
+
+def run(method: str, rows: int, sample: int) -> dict:
+    with tempfile.TemporaryDirectory() as directory:
+        env = dict(os.environ, FLASK_SQLALCHEMY_DATABASE_URI=f"sqlite:///{os.path.join(directory, 'bench.db')}",
+                   FLASK_PASSWORD_HASH_EXECUTOR='inline')
+        output = subprocess.run(
+            [sys.executable, '-m', 'bench.import_tasks', '--child', method, '--rows', str(rows), '--sample', str(sample)],
+            env=env, check=True, capture_output=True, text=True,
+        ).stdout
+
+    return json.loads(output.splitlines()[-1])
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--rows', type=int, default=100000)
+    parser.add_argument('--methods', default='single,batch,ndjson,csv')
+    parser.add_argument('--sample', type=int, default=2000, help='tasks sent one POST at a time')
+    parser.add_argument('--child', help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.child:
+        print(json.dumps(child(args.child, args.rows, args.sample)))
+        sys.exit()
+
+    print(f"{'method':<8}{'tasks sent':>12}{'seconds':>9}{'rows/s':>10}{f'{args.rows} rows s':>16}")
+    for method in args.methods.split(','):
+        r = run(method, args.rows, args.sample)
+        rate = r['sent'] / r['seconds']
+        print(f"{method:<8}{r['sent']:>12}{r['seconds']:>9.2f}{rate:>10.0f}{args.rows / rate:>16.1f}", flush=True)
@@ -0,0 +1,114 @@
+# Benchmark of the per-user task queries with and without the Task indexes
+#
+# Usage: python -m bench.index_queries [--sizes 1000,100000,1000000] [--users 1000]
+import argparse
+import os
+import random
+import tempfile
+import time
+from datetime import datetime, timedelta
+
+from sqlalchemy import create_engine, insert, text
+
+from app import db
+from app.models import Task, User
+
+QUERIES = {
+    'get_task': 'SELECT * FROM task WHERE id = :task_id AND user_id = :user_id',
+    'count_tasks': 'SELECT count(*) FROM task WHERE user_id = :user_id',
+    'list_tasks': 'SELECT * FROM task WHERE user_id = :user_id ORDER BY id LIMIT 10',
+    'list_tasks_after': 'SELECT * FROM task WHERE user_id = :user_id AND id > :task_id ORDER BY id LIMIT 10',
+    'recently_modified': 'SELECT * FROM task WHERE user_id = :user_id ORDER BY date_modified DESC LIMIT 10',
+    # filters and sort orders of `GET /api/v1/tasks`
+    'created_range': 'SELECT * FROM task WHERE user_id = :user_id AND date_created > :since AND date_created < :until '
+                     'ORDER BY id LIMIT 10',
+    'modified_range': 'SELECT * FROM task WHERE user_id = :user_id AND date_modified > :since AND date_modified < :until '
+                      'ORDER BY id LIMIT 10',
+    'sort_created_desc': 'SELECT * FROM task WHERE user_id = :user_id ORDER BY date_created DESC, id DESC LIMIT 10',
+    'sort_modified_after': 'SELECT * FROM task WHERE user_id = :user_id AND (date_modified, id) > (:since, :task_id) '
+                           'ORDER BY date_modified, id LIMIT 10',
+}
+
+# width of the date ranges, the dates are spread over 10**6 seconds
+RANGE = timedelta(days=1)
+
+
+def seed(engine, size: int, users: int):
+    db.metadata.create_all(engine)
+    now = datetime.now()
+
+    with engine.begin() as connection:
+        connection.execute(insert(User), [
+            {'id': i, 'username': f'user_{i}', 'email': f'user_{i}@bench.local', 'password': 'x'}
+            for i in range(1, users + 1)
+        ])
+
+        chunk = 50_000
+        for start in range(0, size, chunk):
+            connection.execute(insert(Task), [
+                {
+                    'title': f'Task {i}',
+                    'description': 'Benchmark task description',
+                    'user_id': random.randint(1, users),
+                    'date_created': now - timedelta(seconds=random.randint(0, 10**6)),
+                    'date_modified': now - timedelta(seconds=random.randint(0, 10**6)),
+                }
+                for i in range(start, min(start + chunk, size))
+            ])
+
+
+def run_queries(engine, size: int, users: int, repeat: int) -> dict:
+    rng = random.Random(42)
+    now = datetime.now()
+    params = []
+    for _ in range(repeat):
+        since = now - timedelta(seconds=rng.randint(0, 10**6))
+        params.append({'user_id': rng.randint(1, users), 'task_id': rng.randint(1, size),
+                       'since': str(since), 'until': str(since + RANGE)})
+
+    timings = {}
+    with engine.connect() as connection:
+        for name, sql in QUERIES.items():
+            statement = text(sql)
+            start = time.perf_counter()
+            for param in params:
+                connection.execute(statement, param).fetchall()
+            timings[name] = (time.perf_counter() - start) / repeat * 1000
+
+    return timings
+
+
+def bench(size: int, users: int, repeat: int):
+    with tempfile.TemporaryDirectory() as directory:
+        engine = create_engine(f"sqlite:///{os.path.join(directory, 'bench.db')}")
+        seed(engine, size, users)
+
+        # before: drop the indexes declared on the Task model
+        for index in Task.__table__.indexes:
+            index.drop(bind=engine)
+        before = run_queries(engine, size, users, repeat)
+
+        # after: recreate them as the migration would
+        for index in Task.__table__.indexes:
+            index.create(bind=engine)
+        with engine.begin() as connection:
+            connection.exec_driver_sql('ANALYZE')
+        after = run_queries(engine, size, users, repeat)
+
+        engine.dispose()
+
+    print(f'\n{size} tasks, {users} users (ms/query, mean of {repeat})')
+    print(f"{'query':<20}{'before':>12}{'after':>12}{'speedup':>10}")
+    for name in QUERIES:
+        print(f'{name:<20}{before[name]:>12.3f}{after[name]:>12.3f}{before[name] / after[name]:>9.1f}x')
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--sizes', default='1000,100000,1000000')
+    parser.add_argument('--users', type=int, default=1000)
+    parser.add_argument('--repeat', type=int, default=200)
+    args = parser.parse_args()
+
+    for size in map(int, args.sizes.split(',')):
+        bench(size, args.users, args.repeat)
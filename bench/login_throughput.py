@@ -0,0 +1,73 @@
+# Login throughput under concurrent clients for each password hash executor
+#
+# Usage: python -m bench.login_throughput [--clients 16] [--logins 10]
+import argparse
+import os
+import tempfile
+import threading
+import time
+
+_directory = tempfile.TemporaryDirectory()
+os.environ.setdefault('FLASK_SQLALCHEMY_DATABASE_URI', f"sqlite:///{os.path.join(_directory.name, 'bench.db')}")
+
+from app import app, db, hashing  # noqa: E402
+
+USER = {'username': 'bench_user', 'email': 'bench@bench.local', 'password': 'bench_password'}
+CREDENTIALS = {'username': USER['username'], 'password': USER['password']}
+
+
+def run(executor: str, clients: int, logins: int) -> dict:
+    # the app's hasher, swapped for one using `executor`
+    previous = app.extensions['hashing']
+    app.extensions['hashing'] = hashing.PasswordHasher(
+        app.config['PASSWORD_HASH_METHOD'], executor, app.config['PASSWORD_HASH_WORKERS'])
+    previous.shutdown()
+
+    # warm up the pool so worker start-up is not measured
+    app.test_client().post('/api/v1/auth/login', json=CREDENTIALS)
+
+    latencies = []
+    lock = threading.Lock()
+
+    def client():
+        test_client = app.test_client()
+        for _ in range(logins):
+            start = time.perf_counter()
+            response = test_client.post('/api/v1/auth/login', json=CREDENTIALS)
+            elapsed = time.perf_counter() - start
+            assert response.status_code == 200, response.json
+            with lock:
+                latencies.append(elapsed)
+
+    threads = [threading.Thread(target=client) for _ in range(clients)]
+    start = time.perf_counter()
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    duration = time.perf_counter() - start
+
+    latencies.sort()
+    return {
+        'executor': executor,
+        'logins_per_sec': len(latencies) / duration,
+        'p50_ms': latencies[len(latencies) // 2] * 1000,
+        'p95_ms': latencies[int(len(latencies) * 0.95) - 1] * 1000,
+    }
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--clients', type=int, default=16)
+    parser.add_argument('--logins', type=int, default=10)
+    args = parser.parse_args()
+
+    with app.app_context():
+        db.create_all()
+    app.test_client().post('/api/v1/auth/register', json=USER)
+
+    print(f"{args.clients} clients x {args.logins} logins, method {app.config['PASSWORD_HASH_METHOD']}")
+    print(f"{'executor':<10}{'logins/s':>10}{'p50 ms':>10}{'p95 ms':>10}")
+    for executor in hashing.EXECUTORS[::-1]:
+        result = run(executor, args.clients, args.logins)
+        print(f"{executor:<10}{result['logins_per_sec']:>10.1f}{result['p50_ms']:>10.1f}{result['p95_ms']:>10.1f}")
@@ -0,0 +1,110 @@
+# Presence tracking at 10k concurrent socket sessions
+#
+# Memory: sessions are registered the way the connect handler does it (the
+# registry plus the Socket.IO rooms: the session's own, the user's and the
+# online room), measured with tracemalloc per connection.
+# Churn: threads join and leave sessions concurrently, comparing a single lock
+# (`--shards 1`) with the sharded registry.
+#
+# Usage: python -m bench.presence [--sessions 10000] [--tabs 1,4] [--threads 8] [--shards 1,16]
+import argparse
+import threading
+import time
+import tracemalloc
+
+from app import app
+from app.presence import LocalPresence, ONLINE_ROOM
+
+NAMESPACE = '/'
+
+
+def memory(sessions: int, tabs: int) -> dict:
+    # bytes per connection of the registry and of the room bookkeeping
+    manager = app.extensions['socketio'].server.manager
+    users = [index // tabs + 1 for index in range(sessions)]
+    eio_sids = [f'eio-{index}' for index in range(sessions)]
+
+    tracemalloc.start()
+    start = tracemalloc.get_traced_memory()[0]
+    sids = []
+    for eio_sid, user_id in zip(eio_sids, users):
+        sid = manager.connect(eio_sid, NAMESPACE)
+        manager.enter_room(sid, NAMESPACE, str(user_id))
+        manager.enter_room(sid, NAMESPACE, ONLINE_ROOM)
+        sids.append(sid)
+    rooms = tracemalloc.get_traced_memory()[0] - start
+
+    start = tracemalloc.get_traced_memory()[0]
+    registry = LocalPresence()
+    for sid, user_id in zip(sids, users):
+        registry.add(user_id, sid)
+    registered = tracemalloc.get_traced_memory()[0] - start
+
+    # counting and reaching everyone online
+    start_time = time.perf_counter()
+    online = registry.online_count()
+    count_us = (time.perf_counter() - start_time) * 1e6
+    start_time = time.perf_counter()
+    participants = sum(1 for _ in manager.get_participants(NAMESPACE, ONLINE_ROOM))
+    participants_ms = (time.perf_counter() - start_time) * 1000
+    tracemalloc.stop()
+
+    for sid in sids:
+        registry.remove(sid)
+        manager.disconnect(sid, NAMESPACE)
+    assert registry.online_count() == 0 and registry.session_count() == 0
+
+    return {
+        'online': online,
+        'participants': participants,
+        'registry_bytes': registered / sessions,
+        'rooms_bytes': rooms / sessions,
+        'count_us': count_us,
+        'participants_ms': participants_ms,
+    }
+
+
+def churn(sessions: int, threads: int, shards: int, rounds: int) -> float:
+    # join/leave operations per second, every thread owns a slice of the users
+    registry = LocalPresence(shards=shards)
+    per_thread = sessions // threads
+
+    def work(offset: int):
+        sids = [(offset + index // 4 + 1, f'sid-{offset + index}') for index in range(per_thread)]
+        for _ in range(rounds):
+            for user_id, sid in sids:
+                registry.add(user_id, sid)
+            for _, sid in sids:
+                registry.remove(sid)
+
+    workers = [threading.Thread(target=work, args=(index * per_thread,)) for index in range(threads)]
+    start = time.perf_counter()
+    for worker in workers:
+        worker.start()
+    for worker in workers:
+        worker.join()
+
+    return per_thread * threads * rounds * 2 / (time.perf_counter() - start)
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--sessions', type=int, default=10000)
+    parser.add_argument('--tabs', default='1,4', help='sessions per user')
+    parser.add_argument('--threads', type=int, default=8)
+    parser.add_argument('--shards', default='1,16')
+    parser.add_argument('--rounds', type=int, default=20)
+    args = parser.parse_args()
+
+    print(f'{args.sessions} sessions')
+    print(f"{'tabs':>5}{'online':>8}{'registry B/conn':>17}{'rooms B/conn':>14}{'count us':>10}{'online room ms':>16}")
+    for tabs in map(int, args.tabs.split(',')):
+        r = memory(args.sessions, tabs)
+        assert r['participants'] == args.sessions
+        print(f"{tabs:>5}{r['online']:>8}{r['registry_bytes']:>17.0f}{r['rooms_bytes']:>14.0f}"
+              f"{r['count_us']:>10.1f}{r['participants_ms']:>16.2f}")
+
+    print(f'\njoin/leave churn, {args.threads} threads')
+    print(f"{'shards':>7}{'ops/s':>12}")
+    for shards in map(int, args.shards.split(',')):
+        print(f'{shards:>7}{churn(args.sessions, args.threads, shards, args.rounds):>12.0f}')
@@ -0,0 +1,130 @@
+# Login latency of regular users while one client floods `POST /auth/login`,
+# without and with rate limits, and the cost of a rate limit check per storage
+#
+# Each flood configuration runs in a fresh process. Attacker threads send wrong
+# passwords from one address, `--rate` attempts per second between them (more
+# than the server can hash), a user from another address logs in with the right
+# one every `--interval` seconds. Without limits every attempt costs a password
+# hash, with them the attacker gets `429`s after the burst.
+#
+# Usage: python -m bench.ratelimit [--attackers 8] [--rate 50] [--duration 10] [--interval 0.1] [--buckets 1000,100000]
+import argparse
+import json
+import os
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+
+from bench.group_commit import percentile
+
+
+def child(attackers: int, rate: float, duration: float, interval: float) -> dict:
+    # runs in a fresh process, configured from the environment
+    from app import app
+    from app.migrations import create_schema
+
+    create_schema()
+    client = app.test_client()
+    user = {'username': 'bench_user', 'email': 'bench@bench.local', 'password': 'bench_password'}
+    client.post('/api/v1/auth/register', json=user, environ_base={'REMOTE_ADDR': '10.0.0.1'})
+
+    stop = threading.Event()
+    attempts, latencies = [], []
+
+    def attack():
+        count = 0
+        login = {'username': user['username'], 'password': 'wrong_password'}
+        next_attempt = time.perf_counter()
+        while not stop.is_set():
+            client.post('/api/v1/auth/login', json=login, environ_base={'REMOTE_ADDR': '10.0.0.2'})
+            count += 1
+            # paced like a remote client, a thread stuck on a slow response catches up
+            next_attempt += attackers / rate
+            stop.wait(max(next_attempt - time.perf_counter(), 0))
+        attempts.append(count)
+
+    threads = [threading.Thread(target=attack) for _ in range(attackers)]
+    for thread in threads:
+        thread.start()
+
+    login = {'username': user['username'], 'password': user['password']}
+    deadline = time.perf_counter() + duration
+    while time.perf_counter() < deadline:
+        start = time.perf_counter()
+        response = client.post('/api/v1/auth/login', json=login, environ_base={'REMOTE_ADDR': '10.0.0.3'})
+        latencies.append(time.perf_counter() - start)
+        assert response.status_code == 200, response.status_code
+        time.sleep(interval)
+
+    stop.set()
+    for thread in threads:
+        thread.join()
+
+    return {
+        'p50_ms': percentile(latencies, 0.5) * 1000,
+        'p99_ms': percentile(latencies, 0.99) * 1000,
+        'logins': len(latencies),
+        'attempts_per_second': sum(attempts) / duration,
+        'limited': app.extensions['ratelimit'].limited,
+    }
+
+
+def flood(enabled: bool, args) -> dict:
+    with tempfile.TemporaryDirectory() as directory:
+        env = dict(os.environ, FLASK_SQLALCHEMY_DATABASE_URI=f"sqlite:///{os.path.join(directory, 'bench.db')}",
+                   FLASK_RATELIMIT_ENABLED='true' if enabled else 'false')
+        output = subprocess.run(
+            [sys.executable, '-m', 'bench.ratelimit', '--child', '--attackers', str(args.attackers), '--rate', str(args.rate),
+             '--duration', str(args.duration), '--interval', str(args.interval)],
+            env=env, check=True, capture_output=True, text=True,
+        ).stdout
+
+    return json.loads(output.splitlines()[-1])
+
+
+def checks(storage, buckets: int, hits: int = 20000) -> float:
+    # microseconds per hit on one of `buckets` existing buckets
+    from app.ratelimit import Limit
+
+    limit = Limit('1000/second')
+    for index in range(buckets):
+        storage.hit(f'bucket:{index}', limit)
+
+    start = time.perf_counter()
+    for index in range(hits):
+        storage.hit(f'bucket:{index * 7919 % buckets}', limit)
+
+    return (time.perf_counter() - start) / hits * 1e6
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--attackers', type=int, default=8, help='threads flooding the login')
+    parser.add_argument('--rate', type=float, default=50, help='login attempts per second of all attackers')
+    parser.add_argument('--duration', type=float, default=10)
+    parser.add_argument('--interval', type=float, default=0.1, help='seconds between the regular logins')
+    parser.add_argument('--buckets', default='1000,100000', help='existing buckets for the check costs')
+    parser.add_argument('--child', action='store_true', help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.child:
+        print(json.dumps(child(args.attackers, args.rate, args.duration, args.interval)))
+        sys.exit()
+
+    print(f'{args.attackers} attackers flooding the login at {args.rate:g}/s, {args.duration:g} s')
+    print(f"{'limits':<8}{'login p50 ms':>14}{'login p99 ms':>14}{'logins':>8}{'attempts/s':>12}{'limited':>9}")
+    for enabled in (False, True):
+        r = flood(enabled, args)
+        print(f"{'on' if enabled else 'off':<8}{r['p50_ms']:>14.1f}{r['p99_ms']:>14.1f}{r['logins']:>8}"
+              f"{r['attempts_per_second']:>12.0f}{r['limited']:>9}", flush=True)
+
+    from app.ratelimit import LocalLimiter, SQLiteLimiter
+
+    print()
+    print(f"{'storage':<9}{'buckets':>9}{'us/check':>10}")
+    for size in [int(size) for size in args.buckets.split(',')]:
+        with tempfile.TemporaryDirectory() as directory:
+            for storage in (LocalLimiter(), SQLiteLimiter(f"sqlite:///{os.path.join(directory, 'ratelimit.db')}")):
+                print(f'{storage.name:<9}{size:>9}{checks(storage, size):>10.1f}', flush=True)
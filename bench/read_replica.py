@@ -0,0 +1,135 @@
+# Task reads alongside concurrent writers, with every read on the primary
+# session versus reads routed to the read-only engine
+#
+# Several worker processes share a seeded database, as server workers do. In
+# each, reader threads list and get the tasks of a user who does not write (so
+# they are never pinned to the primary) while writer threads create tasks for
+# another user. Requests failing (e.g. `database is locked` after the busy
+# timeout) are counted.
+#
+# Usage: python -m bench.read_replica [--workers 4] [--readers 10] [--writers 2] [--duration 5] [--tasks 10000]
+import argparse
+import json
+import os
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+
+from bench.group_commit import percentile
+
+TASK = {'title': 'Benchmark task', 'description': 'Benchmark task description'}
+
+
+def seed(path: str, tasks: int):
+    from sqlalchemy import create_engine, insert
+
+    from app import db
+    from app.models import Task, User
+
+    engine = create_engine(f'sqlite:///{path}')
+    db.metadata.create_all(engine)
+    with engine.begin() as connection:
+        connection.execute(insert(User), [
+            {'id': 1, 'username': 'bench_reader', 'email': 'reader@bench.local', 'password': 'x'},
+            {'id': 2, 'username': 'bench_writer', 'email': 'writer@bench.local', 'password': 'x'},
+        ])
+        connection.execute(insert(Task), [
+            {'title': f'Task {i}', 'description': 'Benchmark task description', 'user_id': 1} for i in range(tasks)
+        ])
+        connection.exec_driver_sql('PRAGMA journal_mode = WAL')
+    engine.dispose()
+
+
+def child(readers: int, writers: int, duration: float, tasks: int) -> dict:
+    # one worker, runs in a fresh process against the database from the environment
+    from flask_jwt_extended import create_access_token
+
+    from app import app
+
+    with app.app_context():
+        reader = {'Authorization': f'Bearer {create_access_token(identity=1)}'}
+        writer = {'Authorization': f'Bearer {create_access_token(identity=2)}'}
+
+    client = app.test_client()
+    reads, writes, errors = [], [], []
+    stop = threading.Event()
+
+    def read(index: int):
+        times = []
+        paths = ['/api/v1/tasks?limit=50', f'/api/v1/tasks/{index % tasks + 1}']
+        while not stop.is_set():
+            start = time.perf_counter()
+            response = client.get(paths[len(times) % 2], headers=reader)
+            times.append(time.perf_counter() - start)
+            if response.status_code != 200:
+                errors.append('read')
+        reads.extend(times)
+
+    def write():
+        count = 0
+        while not stop.is_set():
+            if client.post('/api/v1/tasks', json=TASK, headers=writer).status_code == 201:
+                count += 1
+            else:
+                errors.append('write')
+        writes.append(count)
+
+    threads = [threading.Thread(target=read, args=(index,)) for index in range(readers)]
+    threads += [threading.Thread(target=write) for _ in range(writers)]
+    for thread in threads:
+        thread.start()
+    time.sleep(duration)
+    stop.set()
+    for thread in threads:
+        thread.join()
+
+    return {'reads': reads, 'writes': sum(writes), 'read_errors': errors.count('read'),
+            'write_errors': errors.count('write'), 'replica_reads': app.extensions['replica'].replica_reads}
+
+
+def run(enabled: bool, args) -> dict:
+    with tempfile.TemporaryDirectory() as directory:
+        path = os.path.join(directory, 'bench.db')
+        seed(path, args.tasks)
+        env = dict(os.environ, FLASK_SQLALCHEMY_DATABASE_URI=f'sqlite:///{path}',
+                   FLASK_READ_REPLICA_ENABLED='true' if enabled else 'false', FLASK_SOCKET_EVENT_WINDOW_MS='0')
+        command = [sys.executable, '-m', 'bench.read_replica', '--child', '--readers', str(args.readers),
+                   '--writers', str(args.writers), '--duration', str(args.duration), '--tasks', str(args.tasks)]
+        workers = [subprocess.Popen(command, env=env, stdout=subprocess.PIPE, text=True) for _ in range(args.workers)]
+        results = [json.loads(worker.communicate()[0].splitlines()[-1]) for worker in workers]
+
+    reads = [seconds for result in results for seconds in result['reads']]
+
+    return {
+        'reads_per_second': len(reads) / args.duration,
+        'p50_ms': percentile(reads, 0.5) * 1000,
+        'p99_ms': percentile(reads, 0.99) * 1000,
+        'writes_per_second': sum(result['writes'] for result in results) / args.duration,
+        'read_errors': sum(result['read_errors'] for result in results),
+        'write_errors': sum(result['write_errors'] for result in results),
+        'replica_reads': sum(result['replica_reads'] for result in results),
+    }
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--workers', type=int, default=4)
+    parser.add_argument('--readers', type=int, default=10, help='reader threads per worker')
+    parser.add_argument('--writers', type=int, default=2, help='writer threads per worker')
+    parser.add_argument('--duration', type=float, default=5)
+    parser.add_argument('--tasks', type=int, default=10000, help='tasks of the reading user')
+    parser.add_argument('--child', action='store_true', help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.child:
+        print(json.dumps(child(args.readers, args.writers, args.duration, args.tasks)))
+        sys.exit()
+
+    print(f'{args.workers} workers x ({args.readers} readers, {args.writers} writers), {args.duration:g} s')
+    print(f"{'reads':<9}{'reads/s':>9}{'p50 ms':>9}{'p99 ms':>9}{'writes/s':>10}{'read errors':>13}{'write errors':>14}{'replica reads':>15}")
+    for enabled in (False, True):
+        r = run(enabled, args)
+        print(f"{'replica' if enabled else 'primary':<9}{r['reads_per_second']:>9.0f}{r['p50_ms']:>9.2f}{r['p99_ms']:>9.2f}"
+              f"{r['writes_per_second']:>10.0f}{r['read_errors']:>13}{r['write_errors']:>14}{r['replica_reads']:>15}", flush=True)
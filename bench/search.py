@@ -0,0 +1,110 @@
+# Benchmark of task search with the FTS5 index against a LIKE scan
+#
+# Usage: python -m bench.search [--sizes 10000,100000,1000000] [--users 10]
+import argparse
+import os
+import random
+import tempfile
+import time
+from datetime import datetime
+
+from sqlalchemy import create_engine, insert, text
+
+from app import db
+from app.models import Task, User
+from app.task_service import search_query
+
+WORDS = [f'word{i}' for i in range(5000)]
+
+# words by frequency (Zipf-like picks, `word1` is in most tasks), a prefix and a
+# word no task contains. LIKE stops at the first 10 matches in ID order, while
+# FTS ranks all of them, so LIKE comes out ahead on frequent words only
+TERMS = {'stopword': 'word1', 'common': 'word30', 'rare': 'word4321', 'prefix': 'word43*', 'missing': 'nothing'}
+
+LIKE = text(
+    'SELECT * FROM task WHERE user_id = :user_id AND (title LIKE :pattern OR description LIKE :pattern) '
+    'ORDER BY id LIMIT 10'
+)
+# same shape as `task_service.search_tasks`
+FTS = text(
+    'SELECT task.*, hits.rank FROM task JOIN ('
+    'SELECT rowid, rank FROM task_fts WHERE task_fts MATCH :query ORDER BY rank, rowid LIMIT 11'
+    ') AS hits ON hits.rowid = task.id ORDER BY hits.rank, task.id LIMIT 11'
+)
+
+
+def sentence(rng, length: int) -> str:
+    return ' '.join(WORDS[min(int(rng.paretovariate(1.0)) - 1, len(WORDS) - 1) if rng.random() < 0.5
+                          else rng.randrange(len(WORDS))] for _ in range(length))
+
+
+def seed(engine, size: int, users: int):
+    # the FTS table and its triggers are created along with the Task table
+    db.metadata.create_all(engine)
+    rng = random.Random(42)
+    now = datetime.now()
+
+    with engine.begin() as connection:
+        connection.execute(insert(User), [
+            {'id': i, 'username': f'user_{i}', 'email': f'user_{i}@bench.local', 'password': 'x'}
+            for i in range(1, users + 1)
+        ])
+
+        chunk = 50_000
+        for start in range(0, size, chunk):
+            connection.execute(insert(Task), [
+                {
+                    'title': sentence(rng, 4),
+                    'description': sentence(rng, 12),
+                    'user_id': rng.randint(1, users),
+                    'date_created': now,
+                    'date_modified': now,
+                }
+                for _ in range(start, min(start + chunk, size))
+            ])
+
+
+def timed(connection, statement, params: list) -> float:
+    start = time.perf_counter()
+    for param in params:
+        connection.execute(statement, param).fetchall()
+
+    return (time.perf_counter() - start) / len(params) * 1000
+
+
+def bench(size: int, users: int, repeat: int):
+    rng = random.Random(7)
+    user_ids = [rng.randint(1, users) for _ in range(repeat)]
+
+    with tempfile.TemporaryDirectory() as directory:
+        engine = create_engine(f"sqlite:///{os.path.join(directory, 'bench.db')}")
+        start = time.perf_counter()
+        seed(engine, size, users)
+        seeded = time.perf_counter() - start
+
+        timings = {}
+        with engine.connect() as connection:
+            for name, term in TERMS.items():
+                pattern = f"%{term.rstrip('*')}%"
+                timings[name] = (
+                    timed(connection, LIKE, [{'user_id': user_id, 'pattern': pattern} for user_id in user_ids]),
+                    timed(connection, FTS, [{'query': search_query(user_id, term)} for user_id in user_ids]),
+                )
+
+        engine.dispose()
+
+    print(f'\n{size} tasks, {users} users, seeded with FTS triggers in {seeded:.1f}s (ms/query, mean of {repeat})')
+    print(f"{'query':<10}{'LIKE':>12}{'FTS5':>12}{'speedup':>10}")
+    for name, (like, fts) in timings.items():
+        print(f'{name:<10}{like:>12.3f}{fts:>12.3f}{like / fts:>9.1f}x')
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--sizes', default='10000,100000,1000000')
+    parser.add_argument('--users', type=int, default=10)
+    parser.add_argument('--repeat', type=int, default=50)
+    args = parser.parse_args()
+
+    for size in map(int, args.sizes.split(',')):
+        bench(size, args.users, args.repeat)
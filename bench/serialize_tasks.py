@@ -0,0 +1,64 @@
+# Micro-benchmark of listing a page of tasks: ORM objects + stdlib JSON versus
+# column tuples + the configured JSON provider (orjson when installed)
+#
+# Usage: python -m bench.serialize_tasks [--sizes 10,100,1000] [--repeat 200]
+import argparse
+import os
+import tempfile
+import time
+
+_directory = tempfile.TemporaryDirectory()
+os.environ.setdefault('FLASK_SQLALCHEMY_DATABASE_URI', f"sqlite:///{os.path.join(_directory.name, 'bench.db')}")
+
+from flask.json.provider import DefaultJSONProvider  # noqa: E402
+
+from app import app, db  # noqa: E402
+from app.models import Task, TASK_COLUMNS, User  # noqa: E402
+
+
+def seed(count: int):
+    db.create_all()
+    db.session.add(User(username='bench_user', email='bench@bench.local', password='x'))
+    db.session.execute(db.insert(Task), [
+        {'title': f'Task {i}', 'description': 'Benchmark task description ' * 4, 'user_id': 1}
+        for i in range(count)
+    ])
+    db.session.commit()
+
+
+def orm_stdlib(provider, size: int):
+    tasks = db.session.scalars(db.select(Task).filter_by(user_id=1).order_by(Task.id).limit(size))
+    provider.response({'message': 'Success', 'data': [task.serialize() for task in tasks]})
+    db.session.expunge_all()
+
+
+def rows_provider(provider, size: int):
+    rows = db.session.execute(db.select(*TASK_COLUMNS).filter(Task.user_id == 1).order_by(Task.id).limit(size))
+    provider.response({'message': 'Success', 'data': [Task.serialize_row(row) for row in rows]})
+
+
+def timeit(fn, provider, size: int, repeat: int) -> float:
+    fn(provider, size)
+    start = time.perf_counter()
+    for _ in range(repeat):
+        fn(provider, size)
+
+    return (time.perf_counter() - start) / repeat * 1000
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--sizes', default='10,100,1000')
+    parser.add_argument('--repeat', type=int, default=200)
+    args = parser.parse_args()
+
+    sizes = list(map(int, args.sizes.split(',')))
+    with app.app_context():
+        seed(max(sizes))
+
+        print(f'provider: {type(app.json).__name__} (ms per page, mean of {args.repeat})')
+        print(f"{'rows':>6}{'orm+stdlib':>14}{'rows+provider':>16}{'speedup':>10}")
+        for size in sizes:
+            before = timeit(orm_stdlib, DefaultJSONProvider(app), size, args.repeat)
+            after = timeit(rows_provider, app.json, size, args.repeat)
+            print(f'{size:>6}{before:>14.3f}{after:>16.3f}{before / after:>9.1f}x')
@@ -0,0 +1,208 @@
+# Concurrent websocket capacity of the development server versus gunicorn
+#
+# For each server setup, opens N websocket connections (same user, so every
+# connection is in the same room), creates tasks over REST and reports how many
+# connections succeeded, connect latency, how many `task_created` events reached
+# the clients, delivery latency and the server's memory.
+#
+# Requires the production and client extras:
+#   pip install -r requirements-prod.txt requests websocket-client
+# Usage: python -m bench.socket_capacity [--connections 250,500,1000] [--setups dev,threading,gevent]
+import argparse
+import json
+import os
+import signal
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+
+import requests
+import websocket
+
+USER = {'username': 'bench_user', 'email': 'bench@bench.local', 'password': 'bench_password'}
+
+# how each setup is started, `{port}` is filled in
+SETUPS = {
+    # run.py: Werkzeug development server with the debugger
+    'dev': ([sys.executable, '-c', 'from app import app; '
+             'app.extensions["socketio"].run(app, port={port}, debug=True, use_reloader=False, allow_unsafe_werkzeug=True, log_output=False)'], {}),
+    'threading': ([sys.executable, '-m', 'gunicorn', '-c', 'gunicorn.conf.py', '-b', '127.0.0.1:{port}', 'wsgi:app'],
+                  {'FLASK_SOCKETIO_ASYNC_MODE': 'threading'}),
+    'gevent': ([sys.executable, '-m', 'gunicorn', '-c', 'gunicorn.conf.py', '-b', '127.0.0.1:{port}', 'wsgi:app'],
+               {'FLASK_SOCKETIO_ASYNC_MODE': 'gevent'}),
+}
+
+
+def percentile(values: list, q: float) -> float:
+    values = sorted(values)
+    return values[min(len(values) - 1, int(len(values) * q))] if values else float('nan')
+
+
+def rss_mb(pid: int) -> float:
+    # resident memory of the server and its children (workers)
+    total = 0
+    pids = [pid] + [int(child) for child in subprocess.run(['pgrep', '-P', str(pid)], capture_output=True, text=True).stdout.split()]
+    for process in pids:
+        try:
+            with open(f'/proc/{process}/status') as f:
+                total += next(int(line.split()[1]) for line in f if line.startswith('VmRSS'))
+        except (OSError, StopIteration):
+            pass
+
+    return total / 1024
+
+
+class Connection(threading.Thread):
+    """Minimal Socket.IO client over a raw websocket (one thread per connection)"""
+
+    def __init__(self, url: str, sent: dict, stop: threading.Event):
+        super().__init__(daemon=True)
+        self.url = url
+        self.sent = sent
+        self.stop = stop
+        self.connect_time = None
+        self.error = None
+        self.latencies = []
+        self.ready = threading.Event()
+
+    def run(self):
+        start = time.perf_counter()
+        try:
+            ws = websocket.create_connection(self.url, timeout=30)
+            ws.recv()  # engine.io open packet
+            ws.send('40')
+            while not ws.recv().startswith('40'):
+                pass
+            self.connect_time = time.perf_counter() - start
+        except Exception as e:
+            self.error = e
+            return
+        finally:
+            self.ready.set()
+
+        ws.settimeout(0.5)
+        while not self.stop.is_set():
+            try:
+                message = ws.recv()
+            except websocket.WebSocketTimeoutException:
+                continue
+            except Exception:
+                break
+            if message == '2':
+                ws.send('3')
+            elif message.startswith('42'):
+                self.on_event(*json.loads(message[2:]))
+        ws.close()
+
+    def on_event(self, event, data):
+        now = time.perf_counter()
+        if event == 'task_events':
+            tasks = [item['data'] for item in data if item['event'] == 'task_created']
+        else:
+            tasks = [data] if event == 'task_created' else []
+        for task in tasks:
+            if task['title'] in self.sent:
+                self.latencies.append(now - self.sent[task['title']])
+
+
+def wait_for(base: str, timeout: float = 30):
+    deadline = time.time() + timeout
+    while time.time() < deadline:
+        try:
+            requests.get(f'{base}/health', timeout=1)
+            return
+        except requests.RequestException:
+            time.sleep(0.2)
+
+    raise RuntimeError(f'{base} did not start')
+
+
+def bench(setup: str, connections: int, tasks: int, parallel: int, port: int) -> dict:
+    directory = tempfile.mkdtemp()
+    command, env = SETUPS[setup]
+    env = dict(os.environ, **env, FLASK_SQLALCHEMY_DATABASE_URI=f"sqlite:///{os.path.join(directory, 'bench.db')}")
+    # the development server does not create the schema on its own
+    subprocess.run([sys.executable, '-m', 'app.migrations'], env=env, check=True)
+    server = subprocess.Popen([part.format(port=port) for part in command], env=env, stdout=subprocess.DEVNULL,
+                              stderr=subprocess.DEVNULL, start_new_session=True)
+
+    base = f'http://127.0.0.1:{port}'
+    sent = {}
+    stop = threading.Event()
+    clients = []
+    try:
+        wait_for(base)
+        requests.post(f'{base}/api/v1/auth/register', json=USER)
+        token = requests.post(f'{base}/api/v1/auth/login', json={'username': USER['username'], 'password': USER['password']}).json()['access_token']
+        idle_mb = rss_mb(server.pid)
+
+        # ramp up, `parallel` handshakes in flight at a time
+        url = f'ws://127.0.0.1:{port}/socket.io/?EIO=4&transport=websocket&token={token}'
+        start = time.perf_counter()
+        for i in range(0, connections, parallel):
+            batch = [Connection(url, sent, stop) for _ in range(min(parallel, connections - i))]
+            for client in batch:
+                client.start()
+            for client in batch:
+                client.ready.wait(35)
+            clients.extend(batch)
+        ramp = time.perf_counter() - start
+        connected = [client for client in clients if client.connect_time is not None]
+        loaded_mb = rss_mb(server.pid)
+
+        # broadcast: every task reaches every connection of the user
+        session = requests.Session()
+        for i in range(tasks):
+            title = f'task-{i}'
+            sent[title] = time.perf_counter()
+            try:
+                session.post(f'{base}/api/v1/tasks', json={'title': title, 'description': 'Capacity benchmark task'},
+                             headers={'Authorization': f'Bearer {token}'}, timeout=10)
+            except requests.RequestException:
+                sent.pop(title)
+            time.sleep(0.1)
+
+        expected = len(sent) * len(connected)
+        deadline = time.time() + 15
+        while sum(len(client.latencies) for client in connected) < expected and time.time() < deadline:
+            time.sleep(0.2)
+    finally:
+        stop.set()
+        os.killpg(server.pid, signal.SIGTERM)
+        server.wait()
+
+    connect_times = [client.connect_time for client in connected]
+    latencies = [latency for client in connected for latency in client.latencies]
+
+    return {
+        'connected': len(connected),
+        'ramp_s': ramp,
+        'connect_p95_ms': percentile(connect_times, 0.95) * 1000,
+        'delivered': len(latencies),
+        'expected': expected,
+        'delivery_p50_ms': percentile(latencies, 0.5) * 1000,
+        'delivery_p95_ms': percentile(latencies, 0.95) * 1000,
+        'idle_mb': idle_mb,
+        'loaded_mb': loaded_mb,
+    }
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--connections', default='250,500,1000')
+    parser.add_argument('--setups', default='dev,threading,gevent')
+    parser.add_argument('--tasks', type=int, default=10)
+    parser.add_argument('--parallel', type=int, default=50, help='handshakes in flight during the ramp up')
+    parser.add_argument('--port', type=int, default=5300)
+    args = parser.parse_args()
+
+    print(f"{'setup':<10}{'conns':>7}{'ok':>7}{'ramp s':>8}{'conn p95':>10}{'events':>9}{'expected':>9}"
+          f"{'p50 ms':>9}{'p95 ms':>9}{'idle MB':>9}{'MB':>7}")
+    for connections in map(int, args.connections.split(',')):
+        for setup in args.setups.split(','):
+            r = bench(setup, connections, args.tasks, args.parallel, args.port)
+            print(f"{setup:<10}{connections:>7}{r['connected']:>7}{r['ramp_s']:>8.1f}{r['connect_p95_ms']:>10.1f}"
+                  f"{r['delivered']:>9}{r['expected']:>9}{r['delivery_p50_ms']:>9.1f}{r['delivery_p95_ms']:>9.1f}"
+                  f"{r['idle_mb']:>9.0f}{r['loaded_mb']:>7.0f}", flush=True)
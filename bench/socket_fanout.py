@@ -0,0 +1,145 @@
+# Multi-worker socket fan-out through the SQLite message queue
+#
+# Starts several server processes sharing a database and message queue, connects
+# socket clients to every worker and creates tasks through the first one only,
+# then reports how many events reached the clients of each worker and how fast.
+#
+# Requires the socket.io client extras: pip install requests websocket-client
+# Usage: python -m bench.socket_fanout [--workers 2] [--clients 20] [--tasks 200]
+import argparse
+import json
+import os
+import signal
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+import urllib.request
+
+USER = {'username': 'bench_user', 'email': 'bench@bench.local', 'password': 'bench_password'}
+
+
+def serve(port: int):
+    from app import app
+
+    app.extensions['socketio'].run(app, port=port, allow_unsafe_werkzeug=True, log_output=False)
+
+
+def request(port: int, path: str, data: dict, token: str = None) -> dict:
+    headers = {'Content-Type': 'application/json'}
+    if token:
+        headers['Authorization'] = f'Bearer {token}'
+
+    req = urllib.request.Request(f'http://127.0.0.1:{port}{path}', json.dumps(data).encode(), headers)
+    with urllib.request.urlopen(req) as response:
+        return json.loads(response.read() or b'{}')
+
+
+def wait_for(port: int, timeout: float = 30):
+    deadline = time.time() + timeout
+    while time.time() < deadline:
+        try:
+            urllib.request.urlopen(f'http://127.0.0.1:{port}/health')
+            return
+        except OSError:
+            time.sleep(0.2)
+
+    raise RuntimeError(f'worker on port {port} did not start')
+
+
+def percentile(values: list, q: float) -> float:
+    values = sorted(values)
+    return values[min(len(values) - 1, int(len(values) * q))] if values else float('nan')
+
+
+def main(args):
+    import socketio
+
+    directory = tempfile.mkdtemp()
+    env = dict(
+        os.environ,
+        FLASK_SQLALCHEMY_DATABASE_URI=f"sqlite:///{os.path.join(directory, 'bench.db')}",
+        FLASK_SOCKETIO_MESSAGE_QUEUE=f"sqlite:///{os.path.join(directory, 'queue.db')}",
+    )
+    os.environ.update(env)
+
+    from app import app, db
+    with app.app_context():
+        db.create_all()
+
+    ports = [args.port + i for i in range(args.workers)]
+    workers = [
+        subprocess.Popen([sys.executable, '-m', 'bench.socket_fanout', '--serve', str(port)], env=env,
+                         stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL, start_new_session=True)
+        for port in ports
+    ]
+
+    try:
+        for port in ports:
+            wait_for(port)
+
+        request(ports[0], '/api/v1/auth/register', USER)
+        token = request(ports[0], '/api/v1/auth/login', {'username': USER['username'], 'password': USER['password']})['access_token']
+
+        sent = {}
+        received = {port: [] for port in ports}
+        lock = threading.Lock()
+
+        def on_tasks(port, tasks):
+            now = time.perf_counter()
+            with lock:
+                for task in tasks:
+                    received[port].append(now - sent[task['title']])
+
+        clients = []
+        for i in range(args.clients):
+            port = ports[i % len(ports)]
+            client = socketio.Client()
+            client.on('task_created', lambda data, port=port: on_tasks(port, [data]))
+            client.on('task_events', lambda data, port=port: on_tasks(port, [m['data'] for m in data if m['event'] == 'task_created']))
+            client.connect(f'http://127.0.0.1:{port}?token={token}', transports=['websocket'])
+            clients.append(client)
+
+        start = time.perf_counter()
+        for i in range(args.tasks):
+            title = f'task-{i}'
+            sent[title] = time.perf_counter()
+            request(ports[0], '/api/v1/tasks', {'title': title, 'description': 'Fan-out benchmark task'}, token)
+
+        # wait for the in-flight events to arrive
+        expected = args.tasks * args.clients
+        deadline = time.time() + 10
+        while sum(map(len, received.values())) < expected and time.time() < deadline:
+            time.sleep(0.1)
+        duration = time.perf_counter() - start
+
+        for client in clients:
+            client.disconnect()
+
+        print(f'{args.workers} workers, {args.clients} clients, {args.tasks} tasks created on worker :{ports[0]} in {duration:.1f}s')
+        print(f"{'worker':<10}{'clients':>8}{'events':>10}{'expected':>10}{'p50 ms':>10}{'p95 ms':>10}")
+        for port in ports:
+            port_clients = len([i for i in range(args.clients) if ports[i % len(ports)] == port])
+            latencies = received[port]
+            print(f':{port:<9}{port_clients:>8}{len(latencies):>10}{port_clients * args.tasks:>10}'
+                  f'{percentile(latencies, 0.5) * 1000:>10.1f}{percentile(latencies, 0.95) * 1000:>10.1f}')
+    finally:
+        # also stops the password hashing pool of each worker
+        for worker in workers:
+            os.killpg(worker.pid, signal.SIGTERM)
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--serve', type=int, help=argparse.SUPPRESS)
+    parser.add_argument('--workers', type=int, default=2)
+    parser.add_argument('--clients', type=int, default=20)
+    parser.add_argument('--tasks', type=int, default=200)
+    parser.add_argument('--port', type=int, default=5100)
+    args = parser.parse_args()
+
+    if args.serve:
+        serve(args.serve)
+    else:
+        main(args)
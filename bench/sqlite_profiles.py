@@ -0,0 +1,90 @@
+# Mixed read/write concurrency benchmark of the SQLite storage profiles
+#
+# Usage: python -m bench.sqlite_profiles [--readers 8] [--writers 4] [--duration 5]
+import argparse
+import os
+import tempfile
+import threading
+import time
+
+from sqlalchemy import create_engine, insert, select
+
+from app import db, storage
+from app.models import ChangeSequence, Task, TaskTombstone, TASK_COLUMNS, User
+
+
+def percentile(values: list, q: float) -> float:
+    values = sorted(values)
+    return values[min(len(values) - 1, int(len(values) * q))] * 1000 if values else float('nan')
+
+
+def run(profile: str, readers: int, writers: int, duration: float, seed: int) -> dict:
+    with tempfile.TemporaryDirectory() as directory:
+        engine = create_engine(f"sqlite:///{os.path.join(directory, 'bench.db')}", **storage.POOL_OPTIONS)
+        storage.configure_engine(engine, storage.PROFILES[profile])
+        db.metadata.create_all(engine, tables=[
+            User.__table__, Task.__table__, TaskTombstone.__table__, ChangeSequence.__table__,
+        ])
+
+        with engine.begin() as connection:
+            connection.execute(insert(User), [{'id': 1, 'username': 'u', 'email': 'e', 'password': 'p'}])
+            connection.execute(insert(Task), [
+                {'title': f'Task {i}', 'description': 'Benchmark task description', 'user_id': 1}
+                for i in range(seed)
+            ])
+
+        results = {'read': [], 'write': []}
+        errors = []
+        stop = time.perf_counter() + duration
+
+        def reader():
+            statement = select(*TASK_COLUMNS).filter(Task.user_id == 1).order_by(Task.id.desc()).limit(20)
+            while time.perf_counter() < stop:
+                start = time.perf_counter()
+                with engine.connect() as connection:
+                    connection.execute(statement).all()
+                results['read'].append(time.perf_counter() - start)
+
+        def writer():
+            while time.perf_counter() < stop:
+                start = time.perf_counter()
+                try:
+                    with engine.begin() as connection:
+                        connection.execute(insert(Task), {'title': 'New', 'description': 'Written', 'user_id': 1})
+                except Exception as e:
+                    errors.append(e)
+                    continue
+                results['write'].append(time.perf_counter() - start)
+
+        threads = [threading.Thread(target=reader) for _ in range(readers)]
+        threads += [threading.Thread(target=writer) for _ in range(writers)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+        engine.dispose()
+
+    return {
+        'reads_per_sec': len(results['read']) / duration,
+        'read_p95_ms': percentile(results['read'], 0.95),
+        'writes_per_sec': len(results['write']) / duration,
+        'write_p95_ms': percentile(results['write'], 0.95),
+        'errors': len(errors),
+    }
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--readers', type=int, default=8)
+    parser.add_argument('--writers', type=int, default=4)
+    parser.add_argument('--duration', type=float, default=5)
+    parser.add_argument('--seed', type=int, default=10000)
+    args = parser.parse_args()
+
+    print(f'{args.readers} readers, {args.writers} writers, {args.duration}s per profile')
+    print(f"{'profile':<10}{'reads/s':>10}{'read p95':>10}{'writes/s':>10}{'write p95':>11}{'errors':>8}")
+    for profile in storage.PROFILES:
+        r = run(profile, args.readers, args.writers, args.duration, args.seed)
+        print(f"{profile:<10}{r['reads_per_sec']:>10.0f}{r['read_p95_ms']:>10.2f}"
+              f"{r['writes_per_sec']:>10.0f}{r['write_p95_ms']:>11.2f}{r['errors']:>8}")
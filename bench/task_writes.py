@@ -0,0 +1,104 @@
+# Single task update/delete: SELECT + ORM object + flush (the previous
+# implementation) versus one UPDATE/DELETE ... RETURNING
+#
+# Usage: python -m bench.task_writes [--tasks 20000] [--repeat 2000]
+import argparse
+from datetime import datetime
+import os
+import tempfile
+import time
+
+_directory = tempfile.TemporaryDirectory()
+os.environ.setdefault('FLASK_SQLALCHEMY_DATABASE_URI', f"sqlite:///{os.path.join(_directory.name, 'bench.db')}")
+
+from sqlalchemy import event  # noqa: E402
+
+from app import app, db, task_service  # noqa: E402
+from app.socket_events import emit_task  # noqa: E402
+from app.models import Task, User  # noqa: E402
+
+DATA = {'title': 'Benchmark update', 'description': 'Benchmark task description'}
+
+
+def seed(count: int):
+    db.create_all()
+    db.session.add(User(username='bench_user', email='bench@bench.local', password='x'))
+    db.session.execute(db.insert(Task), [
+        {'title': f'Task {i}', 'description': 'Benchmark task description', 'user_id': 1} for i in range(count)
+    ])
+    db.session.commit()
+
+
+def orm_update(task_id: int, index: int):
+    task = db.session.execute(db.select(Task).filter_by(id=task_id, user_id=1)).scalar_one_or_none()
+    task.title = f'{DATA["title"]} {index}'
+    task.description = DATA['description']
+    task.date_modified = datetime.now()
+    db.session.commit()
+    emit_task('task_updated', task, task.user_id)
+    task.serialize()
+
+
+def returning_update(task_id: int, index: int):
+    task_service.update_task(1, task_id, {'title': f'{DATA["title"]} {index}', 'description': DATA['description']})
+
+
+def returning_patch(task_id: int, index: int):
+    task_service.patch_task(1, task_id, {'title': f'Benchmark patch {index}'})
+
+
+def unchanged_patch(task_id: int, index: int):
+    task_service.patch_task(1, task_id, {'description': DATA['description']})
+
+
+def orm_delete(task_id: int, index: int):
+    task = db.session.execute(db.select(Task).filter_by(id=task_id, user_id=1)).scalar_one_or_none()
+    user_id = task.user_id
+    db.session.delete(task)
+    db.session.commit()
+    emit_task('task_removed', task, user_id)
+
+
+def returning_delete(task_id: int, index: int):
+    task_service.delete_task(1, task_id)
+
+
+def timeit(fn, task_ids: list) -> tuple:
+    statements = []
+    listener = lambda *args: statements.append(1)  # noqa: E731
+    event.listen(db.engine, 'before_cursor_execute', listener)
+    start = time.perf_counter()
+    for index, task_id in enumerate(task_ids):
+        fn(task_id, index)
+    elapsed = (time.perf_counter() - start) / len(task_ids) * 1000
+    event.remove(db.engine, 'before_cursor_execute', listener)
+
+    return elapsed, len(statements) / len(task_ids)
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--tasks', type=int, default=20000)
+    parser.add_argument('--repeat', type=int, default=2000)
+    args = parser.parse_args()
+
+    # deletes use their own ranges of IDs
+    updates = list(range(1, args.repeat + 1))
+    orm_deletes = list(range(args.tasks - 2 * args.repeat + 1, args.tasks - args.repeat + 1))
+    returning_deletes = list(range(args.tasks - args.repeat + 1, args.tasks + 1))
+
+    with app.test_request_context():
+        seed(args.tasks)
+
+        print(f'ms per call and SQL statements per call, mean of {args.repeat}')
+        print(f"{'operation':<28}{'ms':>8}{'statements':>12}")
+        for name, fn, task_ids in [
+            ('update: select + ORM', orm_update, updates),
+            ('update: UPDATE RETURNING', returning_update, updates),
+            ('patch: UPDATE RETURNING', returning_patch, updates),
+            ('patch: unchanged', unchanged_patch, updates),
+            ('delete: select + ORM', orm_delete, orm_deletes),
+            ('delete: DELETE RETURNING', returning_delete, returning_deletes),
+        ]:
+            elapsed, statements = timeit(fn, task_ids)
+            print(f'{name:<28}{elapsed:>8.3f}{statements:>12.1f}')
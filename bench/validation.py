@@ -0,0 +1,56 @@
+# Micro-benchmark of request validation: a schema built per request and
+# `validate` versus the schemas compiled once in `app.validation` (fast path for
+# valid payloads, marshmallow for the ones it rejects)
+#
+# Usage: python -m bench.validation [--repeat 2000]
+import argparse
+import os
+import tempfile
+import time
+
+_directory = tempfile.TemporaryDirectory()
+os.environ.setdefault('FLASK_SQLALCHEMY_DATABASE_URI', f"sqlite:///{os.path.join(_directory.name, 'bench.db')}")
+
+from app import validation  # noqa: E402
+from app.models import LoginUserSchema, RegisterUserSchema, TaskBatchUpdateSchema, TaskIdsSchema, TaskSchema  # noqa: E402
+
+TASK = {'title': 'Benchmark task', 'description': 'Benchmark task description'}
+
+# name, schema class, `many`, compiled schema, payload
+CASES = [
+    ('register', RegisterUserSchema, False, validation.register_user,
+     {'username': 'bench_user', 'email': 'bench@bench.local', 'password': 'bench_password'}),
+    ('login', LoginUserSchema, False, validation.login_user, {'username': 'bench_user', 'password': 'bench_password'}),
+    ('task', TaskSchema, False, validation.task, TASK),
+    ('task ids x100', TaskIdsSchema, False, validation.task_ids, {'ids': list(range(1, 101))}),
+    ('tasks x100', TaskSchema, True, validation.tasks, [TASK] * 100),
+    ('tasks x1000', TaskSchema, True, validation.tasks, [TASK] * 1000),
+    ('task updates x1000', TaskBatchUpdateSchema, True, validation.task_updates,
+     [dict(TASK, id=i) for i in range(1, 1001)]),
+    ('task (invalid)', TaskSchema, False, validation.task, {'title': '', 'description': 'short'}),
+    ('tasks x1000 (invalid)', TaskSchema, True, validation.tasks, [TASK] * 999 + [{'title': 'Benchmark task'}]),
+]
+
+
+def timeit(fn, repeat: int) -> float:
+    fn()
+    start = time.perf_counter()
+    for _ in range(repeat):
+        fn()
+
+    return (time.perf_counter() - start) / repeat * 1000000
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--repeat', type=int, default=2000)
+    args = parser.parse_args()
+
+    print(f'us per request, mean of {args.repeat}')
+    print(f"{'payload':<24}{'per request':>13}{'compiled':>11}{'speedup':>10}")
+    for name, schema_class, many, compiled, payload in CASES:
+        # large batches are slow on the per request path, scale the repeats down
+        repeat = max(10, args.repeat // len(payload)) if many else args.repeat
+        before = timeit(lambda: schema_class(many=many).validate(payload), repeat)
+        after = timeit(lambda: compiled.load(payload), repeat)
+        print(f'{name:<24}{before:>13.1f}{after:>11.1f}{before / after:>9.1f}x')
@@ -0,0 +1,47 @@
+# Production server settings: gunicorn -c gunicorn.conf.py wsgi:app
+#
+# FLASK_SOCKETIO_ASYNC_MODE picks the worker type, `gevent` (default) and
+# `eventlet` serve thousands of websockets per worker on green threads while
+# `threading` uses a thread per connection. WEB_CONCURRENCY sets the number of
+# workers, more than one requires a message queue (FLASK_SOCKETIO_MESSAGE_QUEUE)
+# and serves websocket connections only, as polling needs sticky sessions.
+import os
+import subprocess
+import sys
+
+WORKER_CLASSES = {
+    'gevent': 'gevent',
+    'eventlet': 'eventlet',
+    'threading': 'gthread',
+}
+
+async_mode = os.environ.setdefault('FLASK_SOCKETIO_ASYNC_MODE', 'gevent')
+if async_mode not in WORKER_CLASSES:
+    raise ValueError(f'Unknown async mode: {async_mode}')
+
+bind = os.environ.get('BIND', '0.0.0.0:5000')
+workers = int(os.environ.get('WEB_CONCURRENCY', 1))
+worker_class = WORKER_CLASSES[async_mode]
+# concurrent connections per worker (websockets included), in threading mode
+# every open websocket holds one of the threads
+worker_connections = 10000
+threads = 2000 if async_mode == 'threading' else 1
+
+# websockets are long lived, keep-alive covers the remaining HTTP requests
+keepalive = 5
+timeout = 60
+graceful_timeout = 30
+
+# rate limits on in production, shared by the workers through the message queue
+os.environ.setdefault('FLASK_RATELIMIT_ENABLED', 'true')
+
+if workers > 1:
+    if not os.environ.get('FLASK_SOCKETIO_MESSAGE_QUEUE'):
+        raise ValueError('Running several workers requires FLASK_SOCKETIO_MESSAGE_QUEUE')
+    os.environ.setdefault('FLASK_SOCKETIO_TRANSPORTS', '["websocket"]')
+
+
+def on_starting(server):
+    # create/upgrade the schema once, in a separate process so the master does
+    # not import the app before the workers apply their monkey patching
+    subprocess.run([sys.executable, '-m', 'app.migrations'], check=True)
@@ -1,7 +1,8 @@
-from app import app, db, socketio
+from app import app
+from app.migrations import create_schema
 
 if __name__ == '__main__':
-    with app.app_context():
-        db.create_all()
+    create_schema()
 
-    socketio.run(app=app, debug=True, allow_unsafe_werkzeug=True)
+    # development server, see gunicorn.conf.py for production
+    app.extensions['socketio'].run(app=app, debug=True, allow_unsafe_werkzeug=True)
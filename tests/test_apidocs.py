@@ -0,0 +1,11 @@
+# Swagger spec built from the route docstrings
+from app import create_app
+
+
+def test_apispec_builds_from_docstrings(tmp_path):
+    app = create_app({'SQLALCHEMY_DATABASE_URI': f"sqlite:///{tmp_path / 'tasks.db'}"})
+
+    response = app.test_client().get('/apispec_1.json')
+
+    assert response.status_code == 200
+    assert '/api/v1/tasks/import' in response.json['paths']
@@ -0,0 +1,76 @@
+# Apps built by `create_app` keep their state apart
+from app import create_app, db
+from app.migrations import create_schema
+from app.models import Task, User
+
+
+def build(path, **config):
+    app = create_app({
+        'SQLALCHEMY_DATABASE_URI': f'sqlite:///{path}',
+        'PASSWORD_HASH_EXECUTOR': 'inline',
+        'PASSWORD_HASH_METHOD': 'pbkdf2:sha256:1',
+        **config,
+    })
+    create_schema(app)
+
+    return app
+
+
+def login(client) -> dict:
+    user = {'username': 'apps_user', 'email': 'apps@example.com', 'password': 'apps_password'}
+    client.post('/api/v1/auth/register', json=user)
+    login = {'username': user['username'], 'password': user['password']}
+    token = client.post('/api/v1/auth/login', json=login).json['access_token']
+
+    return {'Authorization': f'Bearer {token}'}
+
+
+def test_group_commit_writes_to_its_own_database(tmp_path):
+    first = build(tmp_path / 'first.db', GROUP_COMMIT_ENABLED=True)
+    second = build(tmp_path / 'second.db', GROUP_COMMIT_ENABLED=True)
+
+    client = first.test_client()
+    response = client.post('/api/v1/tasks', json={'title': 'First', 'description': 'Task of the first app'},
+                           headers=login(client))
+    assert response.status_code == 201
+
+    for app, count in ((first, 1), (second, 0)):
+        with app.app_context():
+            assert db.session.execute(db.select(db.func.count()).select_from(Task)).scalar() == count
+            assert app.extensions['group_commit'].operations == count
+
+
+def test_rate_limits_are_per_app(tmp_path):
+    limited = build(tmp_path / 'limited.db', RATELIMIT_ENABLED=True, RATELIMIT_LIMITS={'auth.login': '1/minute'})
+    unlimited = build(tmp_path / 'unlimited.db')
+
+    login = {'username': 'nobody', 'password': 'wrong_password'}
+    assert [limited.test_client().post('/api/v1/auth/login', json=login).status_code for _ in range(2)] == [401, 429]
+    assert [unlimited.test_client().post('/api/v1/auth/login', json=login).status_code for _ in range(2)] == [401, 401]
+
+
+def test_password_hashing_uses_the_settings_of_its_app(tmp_path):
+    first = build(tmp_path / 'first.db')
+    second = build(tmp_path / 'second.db', PASSWORD_HASH_METHOD='pbkdf2:sha256:2')
+
+    for app, method in ((first, 'pbkdf2:sha256:1'), (second, 'pbkdf2:sha256:2')):
+        client = app.test_client()
+        login(client)
+        with app.app_context():
+            assert db.session.execute(db.select(User.password)).scalar().startswith(f'{method}$')
+
+
+def test_socket_events_reach_the_clients_of_their_app(tmp_path):
+    first = build(tmp_path / 'first.db')
+    second = build(tmp_path / 'second.db')
+
+    clients = []
+    for app in (first, second):
+        headers = login(app.test_client())
+        token = headers['Authorization'].split()[1]
+        clients.append(app.extensions['socketio'].test_client(app, query_string=f'token={token}'))
+
+    for client in clients:
+        assert client.is_connected()
+        client.emit('get_tasks')
+        assert [message['name'] for message in client.get_received()] == ['tasks']
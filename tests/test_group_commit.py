@@ -0,0 +1,58 @@
+# The group commit writer answers or gives up on every write
+import threading
+
+import pytest
+from flask import Flask
+from sqlalchemy import create_engine, text
+from werkzeug.exceptions import ServiceUnavailable
+
+from app.group_commit import GroupCommitWriter
+
+
+@pytest.fixture
+def writer(tmp_path):
+    engine = create_engine(f"sqlite:///{tmp_path / 'writes.db'}")
+    with engine.begin() as connection:
+        connection.execute(text('CREATE TABLE write (value INTEGER)'))
+
+    return GroupCommitWriter(Flask(__name__), engine, True, timeout=0.2)
+
+
+def insert(value: int):
+    return lambda connection: connection.execute(text('INSERT INTO write (value) VALUES (:value)'), {'value': value})
+
+
+def count(writer) -> int:
+    return writer.submit(lambda connection: connection.execute(text('SELECT count(*) FROM write')).scalar())
+
+
+def test_write_not_committed_in_time_is_answered_with_503_and_dropped(writer):
+    started, release = threading.Event(), threading.Event()
+
+    def block(connection):
+        started.set()
+        release.wait()
+
+    blocking = threading.Thread(target=lambda: pytest.raises(ServiceUnavailable, writer.submit, block))
+    blocking.start()
+    started.wait()
+
+    # queued behind the blocked batch
+    with pytest.raises(ServiceUnavailable):
+        writer.submit(insert(1))
+    release.set()
+    blocking.join()
+
+    assert writer.stats()['timeouts'] == 2
+    assert count(writer) == 0
+
+
+def test_writer_is_restarted_when_its_thread_died(writer):
+    writer.submit(insert(1))
+    writer._thread = threading.Thread(target=lambda: None)
+    writer._thread.start()
+    writer._thread.join()
+
+    writer.submit(insert(2))
+
+    assert count(writer) == 2
@@ -0,0 +1,42 @@
+# Sessions of the current process (`presence.LocalPresence`)
+from app.presence import LocalPresence
+
+
+def test_user_stays_online_until_their_last_session_leaves():
+    registry = LocalPresence()
+    registry.add(1, 'tab')
+    registry.add(1, 'phone')
+    registry.add(2, 'other')
+
+    assert registry.sessions(1) == {'tab', 'phone'}
+    assert (registry.online_count(), registry.session_count()) == (2, 3)
+
+    assert registry.remove('tab') == 1
+    assert registry.is_online(1)
+    assert registry.sessions(1) == {'phone'}
+
+    assert registry.remove('phone') == 1
+    assert not registry.is_online(1)
+    assert registry.sessions(1) == set()
+    assert (registry.online_count(), registry.session_count()) == (1, 1)
+
+
+def test_removing_an_unknown_session_changes_nothing():
+    registry = LocalPresence()
+    registry.add(1, 'tab')
+
+    assert registry.remove('unknown') is None
+    assert registry.remove('tab') == 1
+    assert registry.remove('tab') is None
+    assert (registry.online_count(), registry.session_count()) == (0, 0)
+
+
+def test_users_sharing_a_shard_are_counted_apart():
+    registry = LocalPresence(shards=1)
+    for user_id in range(1, 11):
+        registry.add(user_id, f'sid-{user_id}')
+    registry.remove('sid-5')
+
+    assert (registry.online_count(), registry.session_count()) == (9, 9)
+    assert not registry.is_online(5)
+    assert registry.is_online(6)
@@ -0,0 +1,49 @@
+# Coalescing of the task socket events (`socket_events.EventDispatcher`)
+import pytest
+
+from app import socket_events
+from app.socket_events import EventDispatcher
+
+
+class FakeSocketIO:
+    def __init__(self):
+        self.frames = []
+
+    def emit(self, event, payload, room=None):
+        self.frames.append((event, payload, room))
+
+    def start_background_task(self, target):
+        pass
+
+
+@pytest.fixture
+def socketio(monkeypatch):
+    socketio = FakeSocketIO()
+    monkeypatch.setattr(socket_events, 'socketio', socketio)
+    return socketio
+
+
+def test_coalesced_update_is_sent_after_a_batch_queued_before_it(socketio):
+    dispatcher = EventDispatcher(None, window=1)
+    dispatcher.dispatch('task_updated', {'id': 1, 'title': 'A'}, room='1', key=1)
+    dispatcher.dispatch('tasks_batch', {'action': 'updated', 'data': [{'id': 1, 'title': 'B'}]}, room='1')
+    dispatcher.dispatch('task_updated', {'id': 1, 'title': 'C'}, room='1', key=1)
+
+    dispatcher.flush()
+
+    (event, messages, room), = socketio.frames
+    assert event == 'task_events' and room == '1'
+    assert [(message['event'], message['data']) for message in messages] == [
+        ('tasks_batch', {'action': 'updated', 'data': [{'id': 1, 'title': 'B'}]}),
+        ('task_updated', {'id': 1, 'title': 'C'}),
+    ]
+
+
+def test_created_then_updated_task_is_announced_as_created(socketio):
+    dispatcher = EventDispatcher(None, window=1)
+    dispatcher.dispatch('task_created', {'id': 1, 'title': 'A'}, room='1', key=1)
+    dispatcher.dispatch('task_updated', {'id': 1, 'title': 'B'}, room='1', key=1)
+
+    dispatcher.flush()
+
+    assert socketio.frames == [('task_created', {'id': 1, 'title': 'B'}, '1')]
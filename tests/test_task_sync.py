@@ -0,0 +1,34 @@
+# Delta sync of the tasks (`task_service.get_task_changes`)
+import pytest
+
+from app import create_app, db, task_service
+from app.migrations import create_schema
+from app.models import Task, User
+
+
+@pytest.fixture
+def app(tmp_path):
+    app = create_app({'SQLALCHEMY_DATABASE_URI': f"sqlite:///{tmp_path / 'tasks.db'}", 'PASSWORD_HASH_EXECUTOR': 'thread'})
+    create_schema(app)
+
+    with app.app_context():
+        db.session.add(User(username='sync_user', email='sync@example.com', password='x'))
+        db.session.commit()
+        yield app
+
+
+def create_tasks(*titles: str):
+    db.session.execute(db.insert(Task), [{'title': title, 'description': 'Sync task', 'user_id': 1} for title in titles])
+    db.session.commit()
+
+
+def test_deleted_task_id_is_not_reused(app):
+    create_tasks('first', 'second', 'third')
+    db.session.execute(db.delete(Task).filter(Task.id == 3))
+    db.session.commit()
+    create_tasks('fourth')
+
+    changes = task_service.get_task_changes(1, None)
+
+    assert [task['id'] for task in changes['updated']] == [1, 2, 4]
+    assert changes['deleted'] == [3]